@@ -0,0 +1,61 @@
+import json
+
+
+class Admission:
+    """In-flight request count against a limit, shared by the middleware and the metrics"""
+
+    def __init__(self, max_inflight, retry_after=1):
+        self.max_inflight = max_inflight   # 0 = unlimited
+        self.retry_after = retry_after
+        self.inflight = 0
+        self.shed = 0
+
+    def stats(self):
+        return {"inflight": self.inflight, "max_inflight": self.max_inflight, "shed": self.shed}
+
+
+class LoadShedder:
+    """ASGI middleware capping concurrent requests on the given paths.
+
+    Past `max_inflight`, requests get an immediate 503 with Retry-After
+    instead of queueing behind work the server can't keep up with: the
+    admitted requests keep their latency and the rest fail fast enough for
+    clients to back off or try another replica. Requests are counted from
+    arrival until their response (streamed or not) has been sent.
+    """
+
+    def __init__(self, app, paths, admission):
+        self.app = app
+        self.paths = set(paths)
+        self.admission = admission
+
+    async def __call__(self, scope, receive, send):
+        admission = self.admission
+        if scope["type"] != "http" or scope["path"] not in self.paths or admission.max_inflight <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        if admission.inflight >= admission.max_inflight:
+            admission.shed += 1
+            await self.reject(send)
+            return
+
+        admission.inflight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            admission.inflight -= 1
+
+    async def reject(self, send):
+        admission = self.admission
+        body = json.dumps({"detail": f"Server at capacity ({admission.max_inflight} requests in flight)"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(admission.retry_after).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
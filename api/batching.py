@@ -0,0 +1,172 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+
+class QueueFullError(Exception):
+    """Raised when the batcher queue is at capacity"""
+
+
+class DeadlineExceededError(Exception):
+    """Raised when an item's deadline passes, or can no longer be met, before its result is ready"""
+
+
+class MicroBatcher:
+    """Coalesce concurrent requests into micro-batches processed off the event loop.
+
+    A batch is flushed as soon as it holds `max_batch_size` items or the oldest
+    item has waited `max_wait_ms`, whichever comes first. While another
+    worker is idle, waiting buys nothing (it could take the next request
+    straight away), so whatever is queued is flushed immediately; the wait
+    applies once this is the last free worker. `process_batch` is a
+    blocking callable taking a list of items and returning one result per item;
+    it runs on a thread pool of `num_workers` threads.
+
+    Items may carry a deadline (event loop time). An item still queued when
+    its deadline is closer than a typical batch takes is dropped rather than
+    processed for a caller that will have given up by the time it finishes.
+    """
+
+    def __init__(self, process_batch, max_batch_size=32, max_wait_ms=5.0,
+                 max_queue_size=1024, num_workers=1):
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue_size = max_queue_size
+        self.num_workers = num_workers
+
+        self.batches_processed = 0
+        self.items_processed = 0
+        self.rejected = 0
+        self.expired = 0
+        self.service_time = 0.0   # Moving average of seconds per batch
+
+        self._queue = None
+        self._executor = None
+        self._slots = None
+        self._task = None
+        self._busy = 0            # Workers running a batch, from dispatch through completion
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._executor = ThreadPoolExecutor(max_workers=self.num_workers, thread_name_prefix="batcher")
+        # One slot per worker: while all workers are busy, new arrivals keep
+        # accumulating in the queue and are flushed as a larger batch.
+        self._slots = asyncio.Semaphore(self.num_workers)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._executor:
+            self._executor.shutdown(wait=True)
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize() if self._queue else 0
+
+    async def submit(self, item, deadline=None):
+        """Queue an item and wait for its result, at most until `deadline` (loop.time())"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        try:
+            self._queue.put_nowait((item, future, deadline))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise QueueFullError(f"Batch queue is full ({self.max_queue_size} pending)")
+        if deadline is None:
+            return await future
+        try:
+            # Cancels the future on timeout, so a batch not yet started skips the item
+            return await asyncio.wait_for(future, max(0.0, deadline - loop.time()))
+        except asyncio.TimeoutError:
+            raise DeadlineExceededError("Deadline exceeded while waiting for the batch") from None
+
+    async def _collect(self):
+        batch = [await self._queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            # Drain whatever is already queued before waiting on the deadline
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            if self._busy < self.num_workers - 1:
+                # Another worker is free for whatever arrives next; don't hold this batch back
+                break
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _run(self):
+        while True:
+            await self._slots.acquire()
+            try:
+                batch = await self._collect()
+            except asyncio.CancelledError:
+                self._slots.release()
+                raise
+            self._busy += 1
+            asyncio.create_task(self._dispatch(batch))
+
+    async def _dispatch(self, batch):
+        try:
+            # Skip requests whose callers already gave up, or that would finish too late
+            loop = asyncio.get_running_loop()
+            finish = loop.time() + self.service_time
+            live = []
+            for item, future, deadline in batch:
+                if future.done():
+                    continue
+                if deadline is not None and deadline < finish:
+                    self.expired += 1
+                    future.set_exception(DeadlineExceededError("Deadline can't be met; dropped from the queue"))
+                    continue
+                live.append((item, future))
+            if not live and any(deadline is not None and deadline > loop.time() for _, _, deadline in batch):
+                # Dropped on the estimate alone; let it recover should one slow batch have inflated it
+                self.service_time *= 0.5
+            batch = live
+            if not batch:
+                return
+
+            items = [item for item, _ in batch]
+            start = loop.time()
+            try:
+                results = await loop.run_in_executor(self._executor, self.process_batch, items)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+            elapsed = loop.time() - start
+            self.service_time = elapsed if not self.batches_processed else 0.9 * self.service_time + 0.1 * elapsed
+            self.batches_processed += 1
+            self.items_processed += len(items)
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            self._busy -= 1
+            self._slots.release()
+
+    def stats(self):
+        return {
+            "queue_depth": self.queue_depth,
+            "batches_processed": self.batches_processed,
+            "items_processed": self.items_processed,
+            "avg_batch_size": round(self.items_processed / self.batches_processed, 2) if self.batches_processed else 0.0,
+            "rejected": self.rejected,
+            "expired": self.expired,
+            "service_time_ms": round(self.service_time * 1000, 3),
+        }
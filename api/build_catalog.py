@@ -0,0 +1,18 @@
+from pathlib import Path
+
+from catalog import Catalog, source_stamp
+from records import iter_records
+
+BASE_DIR = Path(__file__).parent
+DATA_PATH = BASE_DIR.parent / "data_process" / "processed_dataset.jsonl"
+CATALOG_DIR = BASE_DIR / "data" / "catalog"
+
+def build_catalog():
+    catalog = Catalog.from_assessments(list(iter_records(DATA_PATH)))
+    catalog.save(CATALOG_DIR, source=source_stamp(DATA_PATH))
+
+    size = sum(p.stat().st_size for p in CATALOG_DIR.iterdir())
+    print(f"Built compact catalog with {len(catalog)} assessments at {CATALOG_DIR} ({size / 1024:.1f} KiB)")
+
+if __name__ == "__main__":
+    build_catalog()
@@ -0,0 +1,209 @@
+"""Versioned artifact bundles: everything the API serves, in one directory.
+
+    cd api
+    python bundle.py build            # package the current artifacts and activate them
+    python bundle.py verify [VERSION] # re-check every checksum
+    python bundle.py activate VERSION
+
+A bundle holds the encoder weights and tokenizer (model/ for
+sentence-transformers, onnx/ when export_onnx.py has been run), the compact
+catalog, embeddings with their manifest, the FAISS index and the BM25
+postings, plus bundle.json listing every file with its size and sha256.
+The bundle version is derived from those checksums, so the same artifacts
+get the same version on every host. data/bundles/CURRENT names the bundle
+the API serves; the API loads it from local disk and never needs network.
+
+Artifacts are only ever replaced by rename, so files are hard-linked into
+the bundle rather than copied when the filesystem allows it.
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+
+from catalog import Catalog, is_current
+from records import replaced_atomically
+from snapshot import ArtifactPaths, SnapshotError, load_snapshot
+
+BASE_DIR = Path(__file__).parent
+DATA_DIR = BASE_DIR / "data"
+DATA_PATH = BASE_DIR.parent / "data_process" / "processed_dataset.jsonl"
+BUNDLES_DIR = DATA_DIR / "bundles"
+MANIFEST_NAME = "bundle.json"
+
+# Snapshot artifacts, relative to api/data and to the bundle alike
+ARTIFACT_FILES = ["faiss_index.bin", "faiss_index.json", "embeddings.npy", "embeddings_manifest.json"]
+ARTIFACT_DIRS = ["catalog", "sparse_index", "canonical"]
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def link_or_copy(source, target):
+    target.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+def bundle_paths(directory):
+    """ArtifactPaths for a bundle; it carries no dataset, so the catalog is taken as built"""
+    directory = Path(directory)
+    return ArtifactPaths(directory / "processed_dataset.jsonl", directory / "catalog", directory / "faiss_index.bin",
+                         directory / "faiss_index.json", directory / "embeddings.npy",
+                         directory / "embeddings_manifest.json", directory / "sparse_index", directory / "canonical")
+
+
+def load_manifest(directory):
+    with open(Path(directory) / MANIFEST_NAME, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def verify_bundle(directory, checksums=True):
+    """Check every file listed in bundle.json; sizes only unless `checksums`"""
+    directory = Path(directory)
+    manifest = load_manifest(directory)
+    for name, expected in manifest["files"].items():
+        path = directory / name
+        if not path.exists():
+            raise SnapshotError(f"Bundle {manifest['version']} is missing {name}")
+        if path.stat().st_size != expected["bytes"]:
+            raise SnapshotError(f"Bundle {manifest['version']}: {name} is {path.stat().st_size} bytes, "
+                                f"expected {expected['bytes']}")
+        if checksums and file_sha256(path) != expected["sha256"]:
+            raise SnapshotError(f"Bundle {manifest['version']}: checksum mismatch for {name}")
+    return manifest
+
+
+def current_bundle(bundles_dir=BUNDLES_DIR):
+    """Directory of the active bundle, or None when no bundle has been activated"""
+    pointer = Path(bundles_dir) / "CURRENT"
+    if not pointer.exists():
+        return None
+    return Path(bundles_dir) / pointer.read_text(encoding="utf-8").strip()
+
+
+def activate(version, bundles_dir=BUNDLES_DIR):
+    if not (Path(bundles_dir) / version / MANIFEST_NAME).exists():
+        raise SnapshotError(f"No bundle {version} in {bundles_dir}")
+    with replaced_atomically(Path(bundles_dir) / "CURRENT") as tmp_path:
+        tmp_path.write_text(version + "\n", encoding="utf-8")
+    print(f"Activated bundle {version}")
+
+
+def encoder_digest(manifest, backend):
+    """Checksum over the bundle's files for one encoder backend, None if it has none"""
+    prefix = "model/" if backend == "sentence-transformers" else "onnx/"
+    files = {name: entry["sha256"] for name, entry in manifest["files"].items() if name.startswith(prefix)}
+    if not files:
+        return None
+    return hashlib.sha256(json.dumps(files, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+
+def save_encoder(target):
+    """Write the sentence-transformers model (weights, tokenizer, pooling config) to `target`"""
+    from sentence_transformers import SentenceTransformer
+    from embeddings import MODEL_NAME
+
+    SentenceTransformer(MODEL_NAME, device="cpu").save(str(target))
+
+
+def build_bundle(bundles_dir=BUNDLES_DIR, include_model=True, activate_bundle=True):
+    """Package api/data's artifacts and the encoder into a new bundle directory"""
+    from embeddings import MODEL_NAME
+    from onnx_encoder import ONNX_DIR
+
+    catalog_dir = DATA_DIR / "catalog"
+    if not (catalog_dir / "catalog.json").exists():
+        raise SnapshotError(f"No compact catalog in {catalog_dir}; run build_catalog.py first")
+    if DATA_PATH.exists() and not is_current(Catalog.load(catalog_dir), DATA_PATH):
+        raise SnapshotError(f"Compact catalog is older than {DATA_PATH}; run build_catalog.py first")
+
+    bundles_dir = Path(bundles_dir)
+    staging = bundles_dir / f".build-{os.getpid()}"
+    if staging.exists():
+        shutil.rmtree(staging)
+    staging.mkdir(parents=True)
+    try:
+        for name in ARTIFACT_FILES:
+            if (DATA_DIR / name).exists():
+                link_or_copy(DATA_DIR / name, staging / name)
+        for name in ARTIFACT_DIRS:
+            for source in sorted((DATA_DIR / name).glob("*")):
+                if source.is_file() and not source.name.endswith(".tmp"):
+                    link_or_copy(source, staging / name / source.name)
+        # Cross-check the artifacts exactly as the API will load them
+        bundle_snapshot = load_snapshot(bundle_paths(staging))
+        if include_model:
+            save_encoder(staging / "model")
+        if (ONNX_DIR / "encoder.json").exists():
+            for source in sorted(ONNX_DIR.glob("*")):
+                if source.is_file():
+                    link_or_copy(source, staging / "onnx" / source.name)
+
+        files = {
+            path.relative_to(staging).as_posix(): {"bytes": path.stat().st_size, "sha256": file_sha256(path)}
+            for path in sorted(staging.rglob("*")) if path.is_file()
+        }
+        version = hashlib.sha256(json.dumps(files, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+        manifest = {
+            "version": version,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "model_name": MODEL_NAME,
+            "encoders": [name for name, present in
+                         (("sentence-transformers", include_model), ("onnx", (staging / "onnx").exists())) if present],
+            "assessments": len(bundle_snapshot.catalog),
+            "files": files,
+        }
+        with open(staging / MANIFEST_NAME, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+
+        target = bundles_dir / version
+        if target.exists():
+            print(f"Bundle {version} already exists")
+            shutil.rmtree(staging)
+        else:
+            os.rename(staging, target)
+            size = sum(entry["bytes"] for entry in files.values())
+            print(f"Built bundle {version}: {len(files)} files, {size / 1024 / 1024:.1f} MiB at {target}")
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    if activate_bundle:
+        activate(version, bundles_dir)
+    return target
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Package the current artifacts and encoder")
+    build.add_argument("--no-model", dest="model", action="store_false",
+                       help="Leave out the PyTorch encoder (ONNX-only deployments)")
+    build.add_argument("--no-activate", dest="activate", action="store_false")
+    verify = commands.add_parser("verify", help="Re-check sizes and checksums")
+    verify.add_argument("version", nargs="?", help="Defaults to the active bundle")
+    activate_command = commands.add_parser("activate", help="Serve this bundle from now on")
+    activate_command.add_argument("version")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build_bundle(include_model=args.model, activate_bundle=args.activate)
+    elif args.command == "verify":
+        directory = BUNDLES_DIR / args.version if args.version else current_bundle()
+        if directory is None:
+            parser.error("No active bundle; pass a version")
+        manifest = verify_bundle(directory)
+        print(f"Bundle {manifest['version']}: {len(manifest['files'])} files OK")
+    else:
+        activate(args.version)
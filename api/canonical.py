@@ -0,0 +1,183 @@
+"""Precomputed results for canonical role queries ("Java developer", "bank teller", ...).
+
+    cd api
+    python canonical.py --queries canonical_roles.txt --top-n 20 --evaluate ../evaluation/benchmark_queries.json
+
+Encodes the canonical queries in one batch, searches them against the
+served index and stores their top-N rows in api/data/canonical/, along
+with a flat FAISS index over the canonical embeddings. The table records
+which index and embeddings it was computed from and is ignored once those
+change, so rebuild it after create_faiss_index.py. At request time, a
+plain query (no filters, fusion, re-ranking, chunking or diversification)
+whose text is a canonical query is answered from the table; so is one whose
+embedding is within CANONICAL_THRESHOLD cosine similarity of one, when that
+is set (off by default).
+
+--evaluate reports, for a list of queries, how many would be matched at
+several thresholds and how much of their own top-k the canonical results
+keep, to pick the threshold.
+"""
+import argparse
+import hashlib
+import json
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+from cache import normalize_text
+from records import replaced_atomically, save_array
+
+BASE_DIR = Path(__file__).parent
+CANONICAL_DIR = BASE_DIR / "data" / "canonical"
+CANONICAL_QUERIES_PATH = BASE_DIR / "canonical_roles.txt"
+
+
+def index_key(paths):
+    """Identifies the embeddings and index a table was computed against"""
+    digest = hashlib.sha256()
+    for path in (paths.manifest_path, paths.index_meta_path):
+        if path.exists():
+            digest.update(path.read_bytes())
+    digest.update(str(paths.embeddings_path.stat().st_size).encode())
+    return digest.hexdigest()[:16]
+
+
+class CanonicalTable:
+    """Top-N catalog rows per canonical query, looked up by text or by embedding"""
+
+    def __init__(self, queries, embeddings, rows, scores, index_key):
+        self.queries = queries
+        self.embeddings = embeddings    # float32 (n_queries, dimension), normalized
+        self.rows = rows                # int64 (n_queries, top_n), -1 padded
+        self.scores = scores            # float32 (n_queries, top_n)
+        self.index_key = index_key
+        self.by_text = {normalize_text(q): i for i, q in enumerate(queries)}
+        self.index = faiss.IndexFlatIP(embeddings.shape[1])
+        self.index.add(np.ascontiguousarray(embeddings, dtype=np.float32))
+
+    @property
+    def top_n(self):
+        return self.rows.shape[1]
+
+    def lookup(self, text):
+        """Canonical query with this exact (normalized) text, or None"""
+        return self.by_text.get(normalize_text(text))
+
+    def match(self, query_embeddings, threshold):
+        """Nearest canonical query per embedding, -1 where below `threshold`; and the similarities"""
+        if len(query_embeddings) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        similarity, nearest = self.index.search(np.ascontiguousarray(query_embeddings, dtype=np.float32), 1)
+        similarity, nearest = similarity[:, 0], nearest[:, 0]
+        return np.where(similarity >= threshold, nearest, -1), similarity
+
+    def results(self, i):
+        keep = self.rows[i] != -1
+        return self.rows[i][keep], self.scores[i][keep]
+
+    def save(self, directory=CANONICAL_DIR):
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        save_array(directory / "embeddings.npy", self.embeddings)
+        save_array(directory / "rows.npy", self.rows)
+        save_array(directory / "scores.npy", self.scores)
+        # Written last: its presence marks a complete table
+        with replaced_atomically(directory / "canonical.json") as tmp_path, open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"index_key": self.index_key, "top_n": self.top_n, "queries": self.queries}, f,
+                      indent=2, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, directory):
+        directory = Path(directory)
+        with open(directory / "canonical.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        return cls(
+            queries=meta["queries"],
+            embeddings=np.load(directory / "embeddings.npy"),
+            rows=np.load(directory / "rows.npy"),
+            scores=np.load(directory / "scores.npy"),
+            index_key=meta["index_key"],
+        )
+
+
+def load_queries(path):
+    """Canonical queries, one per line; blank lines and # comments skipped, duplicates dropped"""
+    queries, seen = [], set()
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            text = line.split("#", 1)[0].strip()
+            if text and normalize_text(text) not in seen:
+                seen.add(normalize_text(text))
+                queries.append(text)
+    return queries
+
+
+def top_rows(snap, embeddings, k):
+    """Unfiltered dense top-k, exactly as search_queries() runs a plain query"""
+    from filters import filtered_search
+    return filtered_search(snap.index, snap.embeddings, snap.row_ids, embeddings, k)
+
+
+def build_canonical_table(main, queries, top_n):
+    embeddings = main.model.encode(queries, normalize_embeddings=True, show_progress_bar=False,
+                                   batch_size=main.ENCODE_BATCH_SIZE).astype(np.float32)
+    scores, rows = top_rows(main.snapshot, embeddings, top_n)
+    return CanonicalTable(queries, embeddings, rows.astype(np.int64), scores.astype(np.float32),
+                          index_key(main.ARTIFACTS))
+
+
+def evaluate(main, table, queries, k, thresholds):
+    """Match rate per threshold, and overlap@k between canonical and own results of matched queries"""
+    embeddings = main.model.encode(queries, normalize_embeddings=True, show_progress_bar=False,
+                                   batch_size=main.ENCODE_BATCH_SIZE).astype(np.float32)
+    _, own = top_rows(main.snapshot, embeddings, k)
+    nearest, similarity = table.match(embeddings, threshold=-1.0)
+    overlap = np.array([
+        len(set(own[q][own[q] != -1]) & set(table.rows[c][:k][table.rows[c][:k] != -1])) / k
+        for q, c in enumerate(nearest)
+    ])
+
+    print(f"{len(queries)} queries, {len(table.queries)} canonical, overlap@{k} of served vs own results")
+    print(f"{'threshold':>9} {'matched':>8} {'rate':>6} {'overlap':>8}")
+    report = []
+    for threshold in thresholds:
+        matched = similarity >= threshold
+        rate = matched.mean()
+        mean_overlap = overlap[matched].mean() if matched.any() else float("nan")
+        print(f"{threshold:>9.2f} {int(matched.sum()):>8} {rate:>6.1%} {mean_overlap:>8.3f}")
+        report.append({"threshold": threshold, "matched": int(matched.sum()), "match_rate": round(float(rate), 4),
+                       "overlap": round(float(mean_overlap), 4)})
+    return report
+
+
+def read_evaluation_queries(path):
+    """Plain-text list, or a JSON list of strings or {"query": ...} objects (the benchmark format)"""
+    path = Path(path)
+    if path.suffix != ".json":
+        return load_queries(path)
+    with open(path, "r", encoding="utf-8") as f:
+        items = json.load(f)
+    return [item["query"] if isinstance(item, dict) else item for item in items]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=Path, default=CANONICAL_QUERIES_PATH)
+    parser.add_argument("--top-n", type=int, default=20, help="Results stored per canonical query")
+    parser.add_argument("--evaluate", type=Path, help="Queries to report match rate and overlap for")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.8, 0.85, 0.9, 0.95])
+    parser.add_argument("--k", type=int, default=10, help="k for the overlap report")
+    args = parser.parse_args()
+
+    import main
+    # Build against the loose artifacts in api/data; bundle.py packages the table with them
+    main.ARTIFACT_BUNDLE = "off"
+    main.load_assets(warm=False)
+
+    table = build_canonical_table(main, load_queries(args.queries), args.top_n)
+    table.save()
+    print(f"Stored top {args.top_n} results for {len(table.queries)} canonical queries at {CANONICAL_DIR}")
+
+    if args.evaluate:
+        evaluate(main, table, read_evaluation_queries(args.evaluate), args.k, args.thresholds)
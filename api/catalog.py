@@ -0,0 +1,195 @@
+import hashlib
+import json
+from pathlib import Path
+
+import numpy as np
+
+from filters import CatalogColumns
+from records import iter_records, replaced_atomically, save_array
+
+CATALOG_FORMAT_VERSION = 1
+
+# Multi-valued filter fields, stored as one bitmap row per distinct value
+BITMAP_FIELDS = ("test_types", "job_levels", "languages")
+
+
+def format_assessment(assessment):
+    """Shape a catalog entry for frontend compatibility"""
+    return {
+        "Assessment Name": assessment["Assessment_name"],
+        "URL": assessment["URL"],
+        "Remote Testing": "Yes" if assessment["Remote_testing_support"] else "No",
+        "Adaptive Support": assessment.get("Adaptive/IRT Support", "No"),
+        "Duration": f"{assessment['Duration_minutes']} minutes",
+        "Test Types": ", ".join(assessment["Test_types"])
+    }
+
+
+class StringColumn:
+    """Variable-length UTF-8 strings stored as one blob plus an (n + 1) offset array"""
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    @classmethod
+    def from_strings(cls, strings):
+        encoded = [s.encode("utf-8") for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        return cls(np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets)
+
+    @classmethod
+    def load(cls, directory, name):
+        directory = Path(directory)
+        offsets = np.load(directory / f"{name}_offsets.npy", mmap_mode="r")
+        blob_path = directory / f"{name}.bin"
+        # np.memmap refuses empty files
+        if blob_path.stat().st_size:
+            blob = np.memmap(blob_path, dtype=np.uint8, mode="r")
+        else:
+            blob = np.zeros(0, dtype=np.uint8)
+        return cls(blob, offsets)
+
+    def save(self, directory, name):
+        directory = Path(directory)
+        save_array(directory / f"{name}_offsets.npy", self.offsets)
+        with replaced_atomically(directory / f"{name}.bin") as tmp_path:
+            np.asarray(self.blob).tofile(tmp_path)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def raw(self, row):
+        return bytes(self.blob[self.offsets[row]:self.offsets[row + 1]])
+
+    def __getitem__(self, row):
+        return self.raw(row).decode("utf-8")
+
+    def take(self, rows):
+        """Decoded strings of several rows, with one vectorized offset lookup"""
+        rows = np.asarray(rows, dtype=np.int64)
+        blob = memoryview(self.blob)
+        return [str(blob[start:end], "utf-8")
+                for start, end in zip(self.offsets[rows].tolist(), self.offsets[rows + 1].tolist())]
+
+
+class Catalog:
+    """Compact, column-oriented catalog.
+
+    Numeric/boolean fields are fixed-width arrays, strings live in
+    offset-indexed blobs and every row's API result is pre-rendered as JSON.
+    Loaded from disk, every array is memory-mapped, so workers share the
+    pages through the OS page cache and only the rows actually returned
+    are touched.
+    """
+
+    def __init__(self, columns, names, urls, texts, payloads, source=None):
+        self.columns = columns
+        self.names = names
+        self.urls = urls
+        self.texts = texts          # embedding_text, for retrieval stages that need raw text
+        self.payloads = payloads    # JSON of format_assessment() per row
+        self.source = source        # source_stamp() of the JSON it was built from
+
+    @classmethod
+    def from_assessments(cls, assessments):
+        return cls(
+            columns=CatalogColumns.from_assessments(assessments),
+            names=StringColumn.from_strings([a["Assessment_name"] for a in assessments]),
+            urls=StringColumn.from_strings([a["URL"] for a in assessments]),
+            texts=StringColumn.from_strings([a.get("embedding_text", "") for a in assessments]),
+            payloads=StringColumn.from_strings(
+                [json.dumps(format_assessment(a), ensure_ascii=False) for a in assessments]
+            ),
+        )
+
+    def __len__(self):
+        return len(self.payloads)
+
+    def result(self, row):
+        """API result dict for one row, decoded from its pre-rendered payload"""
+        return json.loads(self.payloads.raw(row))
+
+    def save(self, directory, source=None):
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+
+        c = self.columns
+        save_array(directory / "duration.npy", c.duration)
+        save_array(directory / "remote.npy", c.remote)
+        save_array(directory / "adaptive.npy", c.adaptive)
+        vocab = {}
+        for field in BITMAP_FIELDS:
+            bitmaps = getattr(c, field)
+            vocab[field] = list(bitmaps)
+            matrix = np.stack(list(bitmaps.values())) if bitmaps else np.zeros((0, c.size), dtype=bool)
+            save_array(directory / f"{field}.npy", matrix)
+
+        for name in ("names", "urls", "texts", "payloads"):
+            getattr(self, name).save(directory, name)
+
+        # Written last: its presence marks a complete catalog
+        meta = {
+            "format_version": CATALOG_FORMAT_VERSION,
+            "size": len(self),
+            "vocab": vocab,
+            "source": source,
+        }
+        with replaced_atomically(directory / "catalog.json") as tmp_path, open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, directory):
+        directory = Path(directory)
+        with open(directory / "catalog.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("format_version") != CATALOG_FORMAT_VERSION:
+            raise ValueError(f"Unsupported catalog format {meta.get('format_version')} in {directory}")
+
+        def column(name):
+            return np.load(directory / f"{name}.npy", mmap_mode="r")
+
+        bitmaps = {}
+        for field in BITMAP_FIELDS:
+            matrix = column(field)
+            bitmaps[field] = {value: matrix[i] for i, value in enumerate(meta["vocab"][field])}
+
+        columns = CatalogColumns(
+            duration=column("duration"),
+            remote=column("remote"),
+            adaptive=column("adaptive"),
+            **bitmaps
+        )
+        strings = [StringColumn.load(directory, name) for name in ("names", "urls", "texts", "payloads")]
+        return cls(columns, *strings, source=meta.get("source"))
+
+
+def source_stamp(path):
+    """Identifies the dataset a compact catalog was built from"""
+    path = Path(path)
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return {"path": path.name, "size": path.stat().st_size, "sha256": digest.hexdigest()}
+
+
+def is_current(catalog, data_path):
+    """True when the catalog was built from the dataset currently at data_path"""
+    source = catalog.source or {}
+    if source.get("size") != Path(data_path).stat().st_size:
+        return False
+    return source == source_stamp(data_path)
+
+
+def load_catalog(catalog_dir, data_path):
+    """Memory-map the compact catalog, falling back to the dataset when it is missing or stale"""
+    catalog_dir, data_path = Path(catalog_dir), Path(data_path)
+    if (catalog_dir / "catalog.json").exists():
+        catalog = Catalog.load(catalog_dir)
+        if not data_path.exists() or is_current(catalog, data_path):
+            return catalog
+        print(f"Compact catalog in {catalog_dir} is older than {data_path}; run build_catalog.py")
+
+    return Catalog.from_assessments(list(iter_records(data_path)))
@@ -0,0 +1,88 @@
+import argparse
+import json
+import sys
+from itertools import islice
+from pathlib import Path
+
+import numpy as np
+
+from embeddings import EMBEDDINGS_PATH, MODEL_NAME, PROCESSED_DATA_PATH
+from onnx_encoder import ONNX_DIR, OnnxEncoder
+from records import iter_records
+
+BENCHMARK_PATH = Path(__file__).parent.parent / "evaluation" / "benchmark_queries.json"
+
+# Used when evaluation/benchmark_queries.json has no queries
+FALLBACK_QUERIES = [
+    "Java developer who can collaborate with business teams",
+    "Entry level sales role, assessment under 30 minutes",
+    "Bank teller with numerical ability",
+    "Senior data analyst with SQL and Python",
+    "Customer service agent for a call center",
+    "Graduate management trainee with leadership potential",
+]
+
+
+def load_queries(path=BENCHMARK_PATH):
+    if Path(path).exists() and Path(path).stat().st_size:
+        with open(path, "r", encoding="utf-8") as f:
+            queries = [item["query"] for item in json.load(f)]
+        if queries:
+            return queries
+    return FALLBACK_QUERIES
+
+
+def top_k(query_embeddings, corpus, k):
+    return np.argsort(-(query_embeddings @ corpus.T), axis=1)[:, :k]
+
+
+def check_parity(quantized=True, k=10, catalog_sample=200, min_cosine=0.98, min_overlap=0.9, num_threads=None):
+    """Compare ONNX embeddings and top-k results against the PyTorch SentenceTransformer"""
+    from sentence_transformers import SentenceTransformer
+
+    queries = load_queries()
+    catalog_texts = [entry["embedding_text"] for entry in islice(iter_records(PROCESSED_DATA_PATH), catalog_sample)]
+    texts = queries + catalog_texts
+
+    reference = SentenceTransformer(MODEL_NAME, device="cpu").encode(
+        texts, normalize_embeddings=True, convert_to_numpy=True, show_progress_bar=False
+    )
+    candidate = OnnxEncoder(ONNX_DIR, quantized=quantized, num_threads=num_threads).encode(
+        texts, normalize_embeddings=True
+    )
+
+    cosine = (reference * candidate).sum(axis=1)
+    corpus = np.load(EMBEDDINGS_PATH)
+    k = min(k, len(corpus))
+    ref_top = top_k(reference[:len(queries)], corpus, k)
+    cand_top = top_k(candidate[:len(queries)], corpus, k)
+    overlap = np.mean([len(set(a) & set(b)) / k for a, b in zip(ref_top, cand_top)])
+    top1 = np.mean(ref_top[:, 0] == cand_top[:, 0])
+
+    label = "int8" if quantized else "fp32"
+    print(f"ONNX {label} vs PyTorch over {len(texts)} texts ({len(queries)} queries)")
+    print(f"  cosine: min={cosine.min():.4f} mean={cosine.mean():.4f}")
+    print(f"  top-{k} overlap on queries: {overlap:.3f}, top-1 agreement: {top1:.3f}")
+
+    passed = cosine.min() >= min_cosine and overlap >= min_overlap
+    print("  PASS" if passed else f"  FAIL (need min cosine >= {min_cosine}, overlap >= {min_overlap})")
+    return passed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check ONNX encoder parity with the PyTorch model")
+    parser.add_argument("--fp32", action="store_true", help="Check the unquantized export instead of int8")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--min-cosine", type=float, default=0.98)
+    parser.add_argument("--min-overlap", type=float, default=0.9)
+    parser.add_argument("--threads", type=int)
+    args = parser.parse_args()
+
+    ok = check_parity(
+        quantized=not args.fp32,
+        k=args.k,
+        min_cosine=args.min_cosine,
+        min_overlap=args.min_overlap,
+        num_threads=args.threads,
+    )
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,89 @@
+import re
+from typing import Literal
+
+import numpy as np
+from pydantic import BaseModel
+
+# Sentence ends, and line breaks (job descriptions are full of bullet lists)
+SENTENCE_BREAK = re.compile(r"(?<=[.!?;:])\s+|\s*\n\s*")
+
+
+class Chunking(BaseModel):
+    """Per-request long-query settings: search with windows of the text and merge the rankings"""
+    aggregate: Literal["max", "sum", "weighted"] = "max"
+    chunk_words: int = 64    # Well under MiniLM's sequence limit, so nothing is truncated
+    overlap_words: int = 16  # Carried over from the previous chunk
+    max_chunks: int = 16     # Longer texts are sampled evenly down to this many chunks
+
+
+def chunking_key(chunking):
+    if chunking is None:
+        return None
+    return (chunking.aggregate, chunking.chunk_words, chunking.overlap_words, chunking.max_chunks)
+
+
+def check_chunking(chunking, max_chunks):
+    if chunking.chunk_words < 1 or not 0 <= chunking.overlap_words < chunking.chunk_words:
+        raise ValueError("chunking needs chunk_words >= 1 and 0 <= overlap_words < chunk_words")
+    if not 1 <= chunking.max_chunks <= max_chunks:
+        raise ValueError(f"chunking.max_chunks must be between 1 and {max_chunks}")
+
+
+def chunk_text(text, chunking):
+    """Split text into windows of whole sentences, at most chunk_words words each.
+
+    Sentences longer than a window are cut into pieces; consecutive windows
+    share overlap_words words. Texts of one window or less come back as-is.
+    """
+    if len(text.split()) <= chunking.chunk_words:
+        return [text]
+
+    step = chunking.chunk_words - chunking.overlap_words
+    pieces = []
+    for sentence in SENTENCE_BREAK.split(text):
+        words = sentence.split()
+        pieces.extend(words[start:start + step] for start in range(0, len(words), step))
+
+    chunks, current = [], []
+    for piece in pieces:
+        if current and len(current) + len(piece) > chunking.chunk_words:
+            chunks.append(current)
+            current = current[-chunking.overlap_words:] if chunking.overlap_words else []
+        current = current + piece
+    if current:
+        chunks.append(current)
+
+    if len(chunks) > chunking.max_chunks:
+        # Keep the beginning, the end and an even spread in between
+        keep = np.unique(np.linspace(0, len(chunks) - 1, chunking.max_chunks).round().astype(int))
+        chunks = [chunks[i] for i in keep]
+    return [" ".join(chunk) for chunk in chunks]
+
+
+def aggregate(chunk_embeddings, chunks, scores, rows, embeddings, method, k):
+    """Merge the per-chunk results of one multi-row search into a top-k ranking.
+
+    "max" and "weighted" re-score every candidate any chunk found against
+    every chunk from the stored embeddings, then take the best chunk or the
+    mean weighted by chunk length; "sum" adds up the scores from the chunks
+    whose own top-k contains the row, favouring rows many chunks agree on.
+    Returns (rows, scores) like one row of a FAISS search, without padding.
+    """
+    found = rows != -1
+    candidates = np.unique(rows[found])
+    if len(candidates) == 0:
+        return candidates, np.zeros(0, dtype=np.float32)
+
+    if method == "sum":
+        combined = np.zeros(len(candidates), dtype=np.float32)
+        np.add.at(combined, np.searchsorted(candidates, rows[found]), scores[found])
+    else:
+        exact = chunk_embeddings @ np.asarray(embeddings[candidates]).T
+        if method == "max":
+            combined = exact.max(axis=0)
+        else:
+            weights = np.array([len(chunk.split()) for chunk in chunks], dtype=np.float32)
+            combined = weights @ exact / weights.sum()
+
+    order = np.argsort(-combined, kind="stable")[:k]
+    return candidates[order], combined[order]
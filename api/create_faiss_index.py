@@ -1,23 +1,283 @@
+import argparse
+import json
+import time
+
 import faiss
 import numpy as np
 from pathlib import Path
+from embeddings import manifest_ids
+from records import replaced_atomically
+from sparse_index import build_sparse_index
+
+BASE_DIR = Path(__file__).parent
+EMBEDDINGS_PATH = BASE_DIR / "data" / "embeddings.npy"
+INDEX_PATH = BASE_DIR / "data" / "faiss_index.bin"
+INDEX_META_PATH = BASE_DIR / "data" / "faiss_index.json"
+
+ADD_CHUNK_SIZE = 65536       # Vectors copied into the index per add call
+MAX_TRAIN_POINTS = 262144    # Sample size for IVF/PQ training
+
+# Search-time knob swept by the tuner for each index family
+TUNABLE_PARAMS = {
+    "ivf": "nprobe",
+    "ivfpq": "nprobe",
+    "hnsw": "efSearch",
+}
+
+
+def default_nlist(n):
+    """IVF list count: ~4*sqrt(n), keeping at least 39 training points per list"""
+    return max(1, min(int(4 * np.sqrt(n)), n // 39))
+
+
+def factory_string(spec, dimension, n, nlist=None, pq_m=None, hnsw_m=32):
+    """Translate a named index spec into a faiss.index_factory string.
+
+    IVF indexes store ids natively; the others are wrapped in IDMap2 so
+    every index carries the stable ids from the embeddings manifest.
+    """
+    nlist = nlist or default_nlist(n)
+    pq_m = pq_m or dimension // 8
+    specs = {
+        "flat": "IDMap2,Flat",
+        "ivf": f"IVF{nlist},Flat",
+        "ivfpq": f"IVF{nlist},PQ{pq_m}x8",
+        "hnsw": f"IDMap2,HNSW{hnsw_m},Flat",
+        "sq8": "IDMap2,SQ8",
+    }
+    if spec not in specs:
+        raise ValueError(f"Unknown index spec '{spec}', expected one of {sorted(specs)}")
+    return specs[spec]
+
+
+def apply_search_params(index, search_params):
+    """Set search-time parameters such as nprobe/efSearch on a loaded index"""
+    params = faiss.ParameterSpace()
+    for name, value in (search_params or {}).items():
+        params.set_index_parameter(index, name, value)
+
+
+def load_index_metadata(meta_path=INDEX_META_PATH):
+    """Metadata written next to the index binary, or None for legacy indexes"""
+    meta_path = Path(meta_path)
+    if not meta_path.exists():
+        return None
+    with open(meta_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def training_sample(embeddings, seed=0):
+    """All vectors for small catalogs, a random subset (read in row order) for large ones"""
+    n = len(embeddings)
+    if n <= MAX_TRAIN_POINTS:
+        return np.ascontiguousarray(embeddings, dtype=np.float32)
+    rows = np.sort(np.random.default_rng(seed).choice(n, MAX_TRAIN_POINTS, replace=False))
+    return np.ascontiguousarray(embeddings[rows], dtype=np.float32)
+
+
+def build_index(embeddings, factory, ids=None):
+    """Build an index from an array or a memory-mapped .npy, one chunk of rows at a time"""
+    index = faiss.index_factory(embeddings.shape[1], factory, faiss.METRIC_INNER_PRODUCT)
+    if not index.is_trained:
+        index.train(training_sample(embeddings))
+    if ids is None:
+        ids = np.arange(len(embeddings), dtype=np.int64)
+    for start in range(0, len(embeddings), ADD_CHUNK_SIZE):
+        end = start + ADD_CHUNK_SIZE
+        index.add_with_ids(np.ascontiguousarray(embeddings[start:end], dtype=np.float32), ids[start:end])
+    return index
+
+
+def supports_in_place_update(index):
+    """IVF and IDMap-wrapped flat/SQ indexes can remove and re-add ids; HNSW cannot"""
+    if faiss.try_extract_index_ivf(index) is not None:
+        return True
+    index = faiss.downcast_index(index)
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        return not isinstance(faiss.downcast_index(index.index), faiss.IndexHNSW)
+    return False
+
+
+def sample_queries(embeddings, n_queries, noise=0.05, seed=0):
+    """Perturbed catalog vectors stand in for real queries near the data"""
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(embeddings), size=min(n_queries, len(embeddings)), replace=False)
+    queries = embeddings[rows] + rng.normal(0, noise, (len(rows), embeddings.shape[1])).astype(np.float32)
+    faiss.normalize_L2(queries)
+    return queries
+
+
+def measure(index, queries, k, ground_truth):
+    """Recall@k against exact results plus single-query latency percentiles"""
+    latencies = []
+    found = []
+    for q in queries:
+        start = time.perf_counter()
+        _, ids = index.search(q[None, :], k)
+        latencies.append(time.perf_counter() - start)
+        found.append(ids[0])
+
+    recall = np.mean([
+        len(set(row[row != -1]) & set(truth)) / len(truth)
+        for row, truth in zip(found, ground_truth)
+    ])
+    latencies_ms = np.array(latencies) * 1000
+    return recall, np.percentile(latencies_ms, 50), np.percentile(latencies_ms, 99)
+
+
+def tune_index(index, spec, embeddings, ids, k=10, n_queries=200, target_recall=0.95):
+    """Sweep nprobe/efSearch against an exact Flat index and pick an operating point.
+
+    Returns the search params of the fastest setting (by p99) that reaches
+    `target_recall`, or the most accurate one if none does.
+    """
+    k = min(k, len(embeddings))
+    queries = sample_queries(embeddings, n_queries)
+    exact = faiss.IndexFlatIP(embeddings.shape[1])
+    for start in range(0, len(embeddings), ADD_CHUNK_SIZE):
+        exact.add(np.ascontiguousarray(embeddings[start:start + ADD_CHUNK_SIZE], dtype=np.float32))
+    _, ground_truth = exact.search(queries, k)
+    ground_truth = ids[ground_truth]
+
+    param = TUNABLE_PARAMS.get(spec)
+    if param == "nprobe":
+        nlist = faiss.extract_index_ivf(index).nlist
+        values = [v for v in (1, 2, 4, 8, 16, 32, 64, 128, 256, 512) if v < nlist] + [nlist]
+    elif param == "efSearch":
+        values = [16, 32, 64, 128, 256, 512]
+    else:
+        values = [None]
+
+    print(f"{param or 'params':>10} {'recall@' + str(k):>10} {'p50_ms':>8} {'p99_ms':>8}")
+    rows = []
+    for value in values:
+        search_params = {param: value} if param else {}
+        apply_search_params(index, search_params)
+        recall, p50, p99 = measure(index, queries, k, ground_truth)
+        rows.append((search_params, recall, p50, p99))
+        print(f"{str(value if param else '-'):>10} {recall:>10.4f} {p50:>8.3f} {p99:>8.3f}")
+
+    meeting = [r for r in rows if r[1] >= target_recall]
+    best = min(meeting, key=lambda r: r[3]) if meeting else max(rows, key=lambda r: r[1])
+    search_params, recall, p50, p99 = best
+    print(f"Selected {search_params or 'defaults'}: recall@{k}={recall:.4f}, p50={p50:.3f}ms, p99={p99:.3f}ms")
+    apply_search_params(index, search_params)
+    return search_params, {"k": k, "recall": float(recall), "p50_ms": float(p50), "p99_ms": float(p99)}
+
+
+def write_index(index, metadata):
+    # Renamed into place: servers may be reading the old file through mmap
+    with replaced_atomically(INDEX_PATH) as tmp_path:
+        faiss.write_index(index, str(tmp_path))
+    with replaced_atomically(INDEX_META_PATH) as tmp_path, open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(metadata, f, indent=2)
+
+
+def create_faiss_index(spec="flat", nlist=None, pq_m=None, hnsw_m=32, search_params=None,
+                       tune=False, tune_k=10, target_recall=0.95, factory=None, embeddings=None, ids=None):
+    # Load embeddings and their stable ids (row numbers when there is no manifest),
+    # unless given ones that aren't saved yet
+    if embeddings is None:
+        embeddings = np.load(EMBEDDINGS_PATH, mmap_mode="r")
+        ids = manifest_ids()
+    n, dimension = embeddings.shape
+    if ids is None:
+        ids = np.arange(n, dtype=np.int64)
+
+    # Create FAISS index (inner product for cosine similarity on normalized vectors)
+    factory = factory or factory_string(spec, dimension, n, nlist=nlist, pq_m=pq_m, hnsw_m=hnsw_m)
+    index = build_index(embeddings, factory, ids)
+
+    search_params = dict(search_params or {})
+    tuning = None
+    if tune:
+        search_params, tuning = tune_index(index, spec, embeddings, ids, k=tune_k, target_recall=target_recall)
+    else:
+        apply_search_params(index, search_params)
+
+    # Save index and metadata
+    metadata = {
+        "spec": spec,
+        "factory": factory,
+        "metric": "inner_product",
+        "dimension": dimension,
+        "ntotal": index.ntotal,
+        "search_params": search_params,
+        "tuning": tuning,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    write_index(index, metadata)
+    print(f"Created FAISS index ({factory}) with {index.ntotal} vectors at {INDEX_PATH}")
+
+    # The BM25 side of hybrid retrieval is cheap enough to rebuild with every index
+    build_sparse_index()
+    return index
+
+
+def update_faiss_index(upsert_ids, upsert_vectors, removed_ids, rebuild=False, embeddings=None, ids=None):
+    """Apply an embeddings change set to the saved index without rebuilding it.
+
+    Changed and removed ids are dropped, then new/changed vectors are added
+    under their stable ids. Falls back to a full rebuild with the same
+    factory string and search params when the index type can't be updated
+    in place (e.g. HNSW) or predates the embeddings manifest; a rebuild
+    uses `embeddings` and `ids` when given, else the saved ones.
+    """
+    metadata = load_index_metadata()
+    index = faiss.read_index(str(INDEX_PATH)) if INDEX_PATH.exists() and metadata else None
+
+    if rebuild or index is None or not supports_in_place_update(index):
+        print("Rebuilding FAISS index")
+        if metadata:
+            return create_faiss_index(spec=metadata["spec"], factory=metadata["factory"],
+                                      search_params=metadata.get("search_params"), embeddings=embeddings, ids=ids)
+        return create_faiss_index(embeddings=embeddings, ids=ids)
+
+    stale = np.concatenate([upsert_ids, removed_ids]).astype(np.int64)
+    if len(stale):
+        index.remove_ids(faiss.IDSelectorBatch(stale))
+    if len(upsert_ids):
+        index.add_with_ids(np.ascontiguousarray(upsert_vectors, dtype=np.float32), upsert_ids)
+
+    metadata["ntotal"] = index.ntotal
+    metadata["updated_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    write_index(index, metadata)
+    print(f"Updated FAISS index in place: {len(upsert_ids)} upserted, {len(removed_ids)} removed, "
+          f"{index.ntotal} vectors")
+
+    build_sparse_index()
+    return index
+
+
+def parse_search_params(values):
+    """Parse ["nprobe=16", ...] into {"nprobe": 16, ...}"""
+    params = {}
+    for item in values or []:
+        name, value = item.split("=", 1)
+        params[name] = int(value)
+    return params
 
-def create_faiss_index():
-    base_dir = Path(__file__).parent
-    embeddings_path = base_dir / "data" / "embeddings.npy"
-    index_path = base_dir / "data" / "faiss_index.bin"
-
-    # Load embeddings
-    embeddings = np.load(embeddings_path)
-    
-    # Create FAISS index
-    dimension = embeddings.shape[1]
-    index = faiss.IndexFlatIP(dimension)  # Inner product for cosine similarity
-    index.add(embeddings)
-    
-    # Save index
-    faiss.write_index(index, str(index_path))
-    print(f"Created FAISS index with {index.ntotal} vectors at {index_path}")
 
 if __name__ == "__main__":
-    create_faiss_index()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Build the FAISS index over api/data/embeddings.npy")
+    parser.add_argument("--spec", default="flat", choices=["flat", "ivf", "ivfpq", "hnsw", "sq8"])
+    parser.add_argument("--nlist", type=int, help="IVF list count (default ~4*sqrt(n))")
+    parser.add_argument("--pq-m", type=int, help="PQ sub-quantizers (default dimension/8)")
+    parser.add_argument("--hnsw-m", type=int, default=32, help="HNSW graph degree")
+    parser.add_argument("--param", action="append", metavar="NAME=VALUE",
+                        help="Search param stored with the index, e.g. nprobe=16 or efSearch=64")
+    parser.add_argument("--tune", action="store_true", help="Sweep nprobe/efSearch and store the chosen setting")
+    parser.add_argument("--k", type=int, default=10, help="k used for recall@k while tuning")
+    parser.add_argument("--target-recall", type=float, default=0.95)
+    args = parser.parse_args()
+
+    create_faiss_index(
+        spec=args.spec,
+        nlist=args.nlist,
+        pq_m=args.pq_m,
+        hnsw_m=args.hnsw_m,
+        search_params=parse_search_params(args.param),
+        tune=args.tune,
+        tune_k=args.k,
+        target_recall=args.target_recall,
+    )
@@ -0,0 +1,75 @@
+import numpy as np
+from pydantic import BaseModel
+
+
+class Diversify(BaseModel):
+    """Per-request result diversification: MMR over the candidates' stored embeddings"""
+    mmr_lambda: float = 0.7          # 1 = relevance only, 0 = novelty only
+    candidates: int = 30             # First-stage rows the results are picked from
+    cover_test_types: bool = False   # Prefer rows adding a test type not yet in the results
+
+
+def diversify_key(diversify):
+    if diversify is None:
+        return None
+    return (diversify.mmr_lambda, diversify.candidates, diversify.cover_test_types)
+
+
+def check_diversify(diversify):
+    if not 0 <= diversify.mmr_lambda <= 1:
+        raise ValueError("diversify.mmr_lambda must be between 0 and 1")
+    if diversify.candidates < 1:
+        raise ValueError("diversify.candidates must be at least 1")
+
+
+def _minmax(scores):
+    low, high = scores.min(), scores.max()
+    return (scores - low) / (high - low) if high > low else np.ones_like(scores)
+
+
+def mmr(rows, scores, embeddings, k, mmr_lambda, test_types=None):
+    """Positions of the k candidate rows picked by Maximal Marginal Relevance, in pick order.
+
+    Each step takes the row maximizing
+    lambda * relevance - (1 - lambda) * (highest similarity to a row already taken),
+    with relevance the min-max normalized scores of whichever stage ranked
+    the candidates and similarity the cosine of their stored embeddings, so
+    language/level variants of one product stop crowding each other out.
+    With `test_types` (rows x types, bool), rows adding a type the picks
+    don't cover yet win while any such row is left.
+    """
+    n = len(rows)
+    k = min(k, n)
+    if k == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    vectors = np.asarray(embeddings[rows], dtype=np.float32)
+    similarity = vectors @ vectors.T
+    relevance = _minmax(np.asarray(scores, dtype=np.float32))
+
+    available = np.ones(n, dtype=bool)
+    max_similarity = np.zeros(n, dtype=np.float32)
+    uncovered = np.ones(test_types.shape[1], dtype=bool) if test_types is not None else None
+    picked = []
+    for step in range(k):
+        gain = mmr_lambda * relevance - (1 - mmr_lambda) * max_similarity if step else relevance.copy()
+        gain[~available] = -np.inf
+        if uncovered is not None and uncovered.any():
+            adds_type = available & test_types[:, uncovered].any(axis=1)
+            if adds_type.any():
+                gain[~adds_type] = -np.inf
+        best = int(np.argmax(gain))
+        picked.append(best)
+        available[best] = False
+        np.maximum(max_similarity, similarity[best], out=max_similarity)
+        if uncovered is not None:
+            uncovered &= ~test_types[best]
+    return np.array(picked, dtype=np.int64)
+
+
+def test_type_matrix(columns, rows):
+    """(rows x test types) membership from the catalog's filter bitmaps"""
+    bitmaps = list(columns.test_types.values())
+    if not bitmaps:
+        return np.zeros((len(rows), 0), dtype=bool)
+    return np.stack([bitmap[rows] for bitmap in bitmaps], axis=1)
@@ -1,39 +1,170 @@
-from sentence_transformers import SentenceTransformer
 import numpy as np
+import argparse
+import hashlib
 import json
+import os
 from tqdm import tqdm
 from pathlib import Path
 
-def preprocess_data():
-    base_dir = Path(__file__).parent.parent
-    processed_data_path = base_dir / "data_process" / "processed_dataset.json"
-    embeddings_path = base_dir / "api" / "data" / "embeddings.npy"
-    
+from records import count_records, iter_chunks, iter_records, replaced_atomically
+
+MODEL_NAME = 'all-MiniLM-L6-v2'
+
+BASE_DIR = Path(__file__).parent.parent
+PROCESSED_DATA_PATH = BASE_DIR / "data_process" / "processed_dataset.jsonl"
+EMBEDDINGS_PATH = BASE_DIR / "api" / "data" / "embeddings.npy"
+MANIFEST_PATH = BASE_DIR / "api" / "data" / "embeddings_manifest.json"
+
+ENCODE_CHUNK_SIZE = 4096  # Entries read, hashed and encoded per step
+
+def content_hash(text, model_name=MODEL_NAME):
+    """Hash of everything that determines an item's embedding"""
+    return hashlib.sha256(f"{model_name}\n{text}".encode("utf-8")).hexdigest()
+
+def load_manifest(manifest_path=MANIFEST_PATH):
+    """Manifest rows are aligned with embeddings.npy: [{"id", "key", "hash"}, ...]"""
+    manifest_path = Path(manifest_path)
+    if not manifest_path.exists():
+        return None
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def manifest_ids(manifest_path=MANIFEST_PATH):
+    """Stable FAISS id of each embeddings.npy row, or None when no manifest exists"""
+    manifest = load_manifest(manifest_path)
+    if manifest is None:
+        return None
+    return np.array([item["id"] for item in manifest["items"]], dtype=np.int64)
+
+def preprocess_data(full=False, chunk_size=ENCODE_CHUNK_SIZE):
+    """Encode only new or changed catalog entries, reusing the rest from the last run.
+
+    The dataset is streamed in chunks of `chunk_size` entries and written
+    straight into a preallocated memory-mapped .npy, so memory stays flat
+    however large the catalog. Returns the change set needed to update the
+    FAISS index in place (ids/vectors to (re)insert and ids to drop), along
+    with the new embeddings and manifest. Nothing is replaced on disk until
+    commit_embeddings(), so a failed index update leaves the previous run
+    intact for the next incremental run to diff against.
+    """
     # Create directory if needed
-    embeddings_path.parent.mkdir(parents=True, exist_ok=True)
-
-    print(f"Loading data from: {processed_data_path}")
-    with open(processed_data_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-
-    # Initialize model
-    model = SentenceTransformer('all-MiniLM-L6-v2')
-    
-    # Extract preprocessed embedding texts
-    embedding_texts = [item["embedding_text"] for item in tqdm(data, desc="Loading assessments")]
-    
-    # Generate embeddings
-    embeddings = model.encode(
-        embedding_texts,
-        show_progress_bar=True,
-        convert_to_numpy=True,
-        normalize_embeddings=True,
-        batch_size=32  # Optimized for typical GPU memory
-    )
-    
-    # Save embeddings
-    np.save(embeddings_path, embeddings.astype(np.float32))  # Reduced precision for efficiency
-    print(f"Saved {len(embeddings)} embeddings to {embeddings_path}")
+    EMBEDDINGS_PATH.parent.mkdir(parents=True, exist_ok=True)
+
+    # Previous run, reusable only if produced by the same model
+    manifest = None if full else load_manifest()
+    if manifest and manifest.get("model") == MODEL_NAME and EMBEDDINGS_PATH.exists():
+        old_embeddings = np.load(EMBEDDINGS_PATH, mmap_mode="r")
+        previous = {item["key"]: (row, item) for row, item in enumerate(manifest["items"])}
+    else:
+        old_embeddings = None
+        previous = {}
+    next_id = max((item["id"] for _, item in previous.values()), default=-1) + 1
+
+    # Deferred so index tooling can read the manifest without importing torch
+    from sentence_transformers import SentenceTransformer
+    model = SentenceTransformer(MODEL_NAME)
+    dimension = model.get_sentence_embedding_dimension()
+
+    # Counting lines is cheap and lets the output be allocated once, on disk
+    print(f"Streaming data from: {PROCESSED_DATA_PATH}")
+    n = count_records(PROCESSED_DATA_PATH)
+    tmp_path = EMBEDDINGS_PATH.with_name(EMBEDDINGS_PATH.name + ".tmp")
+    embeddings = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float32, shape=(n, dimension))
+
+    # Match each entry to the previous run by URL and compare content hashes
+    items = []
+    changed_rows = []
+    reused = 0
+    row = 0
+    with tqdm(total=n, desc="Embedding assessments") as bar:
+        for chunk in iter_chunks(iter_records(PROCESSED_DATA_PATH), chunk_size):
+            to_encode = []  # (row, embedding_text)
+            reuse_rows = []  # (row, old_row)
+            for entry in chunk:
+                key = entry["URL"]
+                digest = content_hash(entry["embedding_text"])
+                old = previous.get(key)
+                if old is not None:
+                    item_id = old[1]["id"]
+                    if old[1]["hash"] == digest:
+                        reuse_rows.append((row, old[0]))
+                    else:
+                        to_encode.append((row, entry["embedding_text"]))
+                else:
+                    item_id = next_id
+                    next_id += 1
+                    to_encode.append((row, entry["embedding_text"]))
+                items.append({"id": item_id, "key": key, "hash": digest})
+                row += 1
+
+            if reuse_rows:
+                rows, old_rows = map(list, zip(*reuse_rows))
+                embeddings[rows] = old_embeddings[old_rows]
+
+            # Generate embeddings for new/changed entries only
+            if to_encode:
+                rows, texts = map(list, zip(*to_encode))
+                embeddings[rows] = model.encode(
+                    texts,
+                    convert_to_numpy=True,
+                    normalize_embeddings=True,
+                    batch_size=32  # Optimized for typical GPU memory
+                )
+                changed_rows.extend(rows)
+
+            reused += len(reuse_rows)
+            bar.update(len(chunk))
+
+    if row != n:
+        raise RuntimeError(f"{PROCESSED_DATA_PATH} changed while it was being read ({n} then {row} entries)")
+
+    current_keys = {item["key"] for item in items}
+    removed_ids = [item["id"] for key, (_, item) in previous.items() if key not in current_keys]
+
+    embeddings.flush()
+    del embeddings, old_embeddings
+    print(f"Encoded {n} embeddings: {reused} reused, {len(changed_rows)} recomputed, {len(removed_ids)} removed")
+
+    # A full run rebuilds the index from the file, so only incremental runs hand over vectors
+    full_run = not previous
+    saved = np.load(tmp_path, mmap_mode="r")
+    return {
+        "upsert_ids": np.array([items[r]["id"] for r in changed_rows], dtype=np.int64),
+        "upsert_vectors": np.zeros((0, dimension), dtype=np.float32) if full_run else saved[changed_rows],
+        "removed_ids": np.array(removed_ids, dtype=np.int64),
+        "full": full_run,
+        "embeddings": saved,
+        "embeddings_tmp_path": tmp_path,
+        "manifest": {"model": MODEL_NAME, "items": items},
+    }
+
+def commit_embeddings(changes):
+    """Move the new embeddings and manifest into place, once the index built from them is saved.
+
+    The manifest goes last: it is what the next incremental run trusts.
+    """
+    os.replace(changes["embeddings_tmp_path"], EMBEDDINGS_PATH)  # float32 for efficiency
+    with replaced_atomically(MANIFEST_PATH) as tmp_path, open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(changes["manifest"], f)
+    print(f"Saved {len(changes['manifest']['items'])} embeddings to {EMBEDDINGS_PATH}")
 
 if __name__ == "__main__":
-    preprocess_data()   
\ No newline at end of file
+    from build_catalog import build_catalog
+    from create_faiss_index import update_faiss_index
+
+    parser = argparse.ArgumentParser(description="Encode the catalog and update the FAISS index")
+    parser.add_argument("--full", action="store_true", help="Ignore the manifest and re-encode everything")
+    args = parser.parse_args()
+
+    changes = preprocess_data(full=args.full)
+    update_faiss_index(
+        changes["upsert_ids"],
+        changes["upsert_vectors"],
+        changes["removed_ids"],
+        rebuild=changes["full"],
+        embeddings=changes["embeddings"],
+        ids=np.array([item["id"] for item in changes["manifest"]["items"]], dtype=np.int64)
+    )
+    # Keep the compact catalog in step with the index rows
+    build_catalog()
+    commit_embeddings(changes)
@@ -0,0 +1,71 @@
+import argparse
+import json
+from pathlib import Path
+
+from embeddings import MODEL_NAME
+from onnx_encoder import ONNX_DIR
+
+INPUT_NAMES = ["input_ids", "attention_mask", "token_type_ids"]
+
+
+def export_onnx(output_dir=ONNX_DIR, opset=14):
+    """Export the query encoder to ONNX and write an int8 dynamically-quantized copy"""
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from sentence_transformers import SentenceTransformer
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    st_model = SentenceTransformer(MODEL_NAME, device="cpu")
+    transformer = st_model[0].auto_model.eval()
+    tokenizer = st_model.tokenizer
+    pooling = "cls" if st_model[1].get_pooling_mode_str() == "cls" else "mean"
+
+    # Export with dynamic batch and sequence axes; pooling/normalization run in numpy
+    dummy = tokenizer(["Java developer with SQL experience"], return_tensors="pt")
+    model_path = output_dir / "model.onnx"
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            tuple(dummy[name] for name in INPUT_NAMES),
+            str(model_path),
+            input_names=INPUT_NAMES,
+            output_names=["last_hidden_state", "pooler_output"],
+            dynamic_axes={
+                **{name: {0: "batch", 1: "sequence"} for name in INPUT_NAMES},
+                "last_hidden_state": {0: "batch", 1: "sequence"},
+                "pooler_output": {0: "batch"},
+            },
+            opset_version=opset,
+        )
+
+    quantized_path = output_dir / "model_int8.onnx"
+    quantize_dynamic(str(model_path), str(quantized_path), weight_type=QuantType.QInt8)
+
+    # tokenizer.json lets the runtime use the `tokenizers` library without transformers
+    tokenizer.save_pretrained(str(output_dir))
+    config = {
+        "model_name": MODEL_NAME,
+        "model": model_path.name,
+        "quantized_model": quantized_path.name,
+        "dimension": st_model.get_sentence_embedding_dimension(),
+        "max_seq_length": st_model.max_seq_length,
+        "pooling": pooling,
+        "pad_token": tokenizer.pad_token,
+        "pad_token_id": tokenizer.pad_token_id,
+    }
+    with open(output_dir / "encoder.json", "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2)
+
+    for path in (model_path, quantized_path):
+        print(f"Wrote {path} ({path.stat().st_size / 1024 / 1024:.1f} MiB)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the query encoder to ONNX (fp32 + int8)")
+    parser.add_argument("--output-dir", default=str(ONNX_DIR))
+    parser.add_argument("--opset", type=int, default=14)
+    args = parser.parse_args()
+
+    export_onnx(args.output_dir, args.opset)
@@ -0,0 +1,211 @@
+from typing import List, Optional
+
+import faiss
+import numpy as np
+from pydantic import BaseModel
+
+# Single-letter codes used on the SHL catalog pages
+TEST_TYPE_CODES = {
+    "A": "Ability & Aptitude",
+    "B": "Biodata & Situational Judgement",
+    "C": "Competencies",
+    "D": "Development & 360",
+    "E": "Assessment Exercises",
+    "K": "Knowledge & Skills",
+    "P": "Personality & Behavior",
+    "S": "Simulations"
+}
+
+# Below this many eligible rows, scoring them directly beats a selector search
+EXACT_SEARCH_THRESHOLD = 2048
+
+
+class Filters(BaseModel):
+    max_duration: Optional[int] = None        # minutes, inclusive
+    min_duration: Optional[int] = None        # minutes, inclusive
+    remote_testing: Optional[bool] = None
+    adaptive_support: Optional[bool] = None
+    test_types: Optional[List[str]] = None    # any of; full names or letter codes
+    job_levels: Optional[List[str]] = None    # any of
+    languages: Optional[List[str]] = None     # any of
+
+
+def filter_key(filters):
+    """Hashable, order-insensitive form of a Filters object (None when unfiltered)"""
+    if filters is None:
+        return None
+    items = []
+    for name, value in sorted(filters.__dict__.items()):
+        if value is None:
+            continue
+        if isinstance(value, list):
+            value = tuple(sorted(v.strip().lower() for v in value))
+        items.append((name, value))
+    return tuple(items) or None
+
+
+def _flag(value):
+    return str(value).strip().lower() in ("yes", "true", "1")
+
+
+def _split(value):
+    if isinstance(value, list):
+        return [v.strip() for v in value if v.strip()]
+    return [v.strip() for v in str(value or "").split(",") if v.strip()]
+
+
+class CatalogColumns:
+    """Columnar view of the catalog used to evaluate filters as boolean masks.
+
+    Numeric/boolean fields are stored as arrays; multi-valued fields
+    (test types, job levels, languages) as one bitmap per distinct value.
+    """
+
+    def __init__(self, duration, remote, adaptive, test_types, job_levels, languages):
+        self.size = len(duration)
+        self.duration = duration      # float32, NaN when unknown
+        self.remote = remote          # bool
+        self.adaptive = adaptive      # bool
+        self.test_types = test_types  # {lowercased value: bool bitmap}
+        self.job_levels = job_levels
+        self.languages = languages
+
+    @classmethod
+    def from_assessments(cls, assessments):
+        size = len(assessments)
+
+        def bitmaps(values):
+            result = {}
+            for row, value in enumerate(values):
+                for v in _split(value):
+                    result.setdefault(v.lower(), np.zeros(size, dtype=bool))[row] = True
+            return result
+
+        return cls(
+            duration=np.array(
+                [a["Duration_minutes"] if a.get("Duration_minutes") is not None else np.nan for a in assessments],
+                dtype=np.float32
+            ),
+            remote=np.array([_flag(a.get("Remote_testing_support")) for a in assessments], dtype=bool),
+            adaptive=np.array([_flag(a.get("Adaptive/IRT Support")) for a in assessments], dtype=bool),
+            test_types=bitmaps(a.get("Test_types") for a in assessments),
+            job_levels=bitmaps(a.get("Job_levels") for a in assessments),
+            languages=bitmaps(a.get("Languages") for a in assessments),
+        )
+
+    def _any_of(self, bitmaps, wanted):
+        mask = np.zeros(self.size, dtype=bool)
+        for value in wanted:
+            bitmap = bitmaps.get(value.strip().lower())
+            if bitmap is not None:
+                mask |= bitmap
+        return mask
+
+    def mask(self, filters):
+        """Boolean mask of rows matching every set filter, or None when unfiltered"""
+        if filter_key(filters) is None:
+            return None
+
+        mask = np.ones(self.size, dtype=bool)
+        # NaN durations never satisfy a duration bound
+        if filters.max_duration is not None:
+            mask &= self.duration <= filters.max_duration
+        if filters.min_duration is not None:
+            mask &= self.duration >= filters.min_duration
+        if filters.remote_testing is not None:
+            mask &= self.remote == filters.remote_testing
+        if filters.adaptive_support is not None:
+            mask &= self.adaptive == filters.adaptive_support
+        if filters.test_types:
+            wanted = [TEST_TYPE_CODES.get(t.strip().upper(), t) for t in filters.test_types]
+            mask &= self._any_of(self.test_types, wanted)
+        if filters.job_levels:
+            mask &= self._any_of(self.job_levels, filters.job_levels)
+        if filters.languages:
+            mask &= self._any_of(self.languages, filters.languages)
+        return mask
+
+
+def search_parameters(index, selector):
+    """SearchParameters carrying `selector` while keeping the index's own nprobe/efSearch"""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+    hnsw = faiss.downcast_index(index)
+    if isinstance(hnsw, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        hnsw = faiss.downcast_index(hnsw.index)
+    if isinstance(hnsw, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=hnsw.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+
+def exact_search(embeddings, query_embeddings, k, rows):
+    """Brute-force inner product over the given catalog rows"""
+    scores = query_embeddings @ embeddings[rows].T
+    k = min(k, len(rows))
+    top = np.argsort(-scores, axis=1)[:, :k]
+    return np.take_along_axis(scores, top, axis=1), rows[top]
+
+
+class RowIds:
+    """Translate between catalog rows and the stable ids stored in the FAISS index"""
+
+    def __init__(self, ids):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.rows = np.full(int(self.ids.max(initial=-1)) + 1, -1, dtype=np.int64)
+        self.rows[self.ids] = np.arange(len(self.ids))
+
+    @classmethod
+    def identity(cls, size):
+        return cls(np.arange(size, dtype=np.int64))
+
+    def to_rows(self, labels):
+        """Map FAISS labels to catalog rows; unknown labels and -1 padding become -1"""
+        valid = (labels >= 0) & (labels < len(self.rows))
+        return np.where(valid, self.rows[np.where(valid, labels, 0)], -1)
+
+    def id_mask(self, mask):
+        """Row mask re-expressed over the id space, for an IDSelectorBitmap"""
+        id_mask = np.zeros(len(self.rows), dtype=bool)
+        id_mask[self.ids[mask]] = True
+        return id_mask
+
+
+def filtered_search(index, embeddings, row_ids, query_embeddings, k, mask=None):
+    """Top-k search restricted to rows where `mask` is True.
+
+    Returns (scores, rows) shaped (n_queries, k), padded with -1 rows. Only
+    eligible rows are scored, and whenever at least k rows are eligible k
+    results come back even if an approximate index misses some of them.
+    """
+    if mask is None:
+        scores, labels = index.search(query_embeddings, k)
+        return scores, row_ids.to_rows(labels)
+
+    n_queries = len(query_embeddings)
+    scores = np.full((n_queries, k), -np.inf, dtype=np.float32)
+    found = np.full((n_queries, k), -1, dtype=np.int64)
+
+    rows = np.flatnonzero(mask)
+    if len(rows) == 0:
+        return scores, found
+
+    if len(rows) <= EXACT_SEARCH_THRESHOLD:
+        exact_scores, exact_rows = exact_search(embeddings, query_embeddings, k, rows)
+        scores[:, :exact_rows.shape[1]] = exact_scores
+        found[:, :exact_rows.shape[1]] = exact_rows
+        return scores, found
+
+    id_mask = row_ids.id_mask(mask)
+    bitmap = np.packbits(id_mask, bitorder="little")
+    selector = faiss.IDSelectorBitmap(len(id_mask), faiss.swig_ptr(bitmap))
+    scores, labels = index.search(query_embeddings, k, params=search_parameters(index, selector))
+    found = row_ids.to_rows(labels)
+
+    # Approximate indexes can come back short under a selective filter
+    wanted = min(k, len(rows))
+    for i in np.flatnonzero((found != -1).sum(axis=1) < wanted):
+        exact_scores, exact_rows = exact_search(embeddings, query_embeddings[i:i + 1], k, rows)
+        scores[i, :exact_rows.shape[1]] = exact_scores[0]
+        found[i, :exact_rows.shape[1]] = exact_rows[0]
+    return scores, found
@@ -0,0 +1,59 @@
+from typing import Literal
+
+import numpy as np
+from pydantic import BaseModel
+
+
+class Fusion(BaseModel):
+    """Per-request hybrid retrieval settings: BM25 fused with dense results"""
+    method: Literal["rrf", "weighted"] = "rrf"
+    dense_weight: float = 1.0
+    sparse_weight: float = 1.0
+    rrf_k: int = 60          # RRF rank offset
+    candidates: int = 50     # Depth taken from each retriever before fusing
+
+
+def fusion_key(fusion):
+    if fusion is None:
+        return None
+    return (fusion.method, fusion.dense_weight, fusion.sparse_weight, fusion.rrf_k, fusion.candidates)
+
+
+def check_fusion(fusion):
+    if fusion.candidates < 1:
+        raise ValueError("fusion.candidates must be at least 1")
+    if fusion.rrf_k <= 0:
+        raise ValueError("fusion.rrf_k must be positive")
+
+
+def _minmax(scores):
+    if len(scores) == 0:
+        return scores
+    low, high = scores.min(), scores.max()
+    return (scores - low) / (high - low) if high > low else np.ones_like(scores)
+
+
+def fuse(dense_rows, dense_scores, sparse_rows, sparse_scores, fusion, k):
+    """Merge two ranked row lists into one top-k list of catalog rows.
+
+    "rrf" sums weight / (rrf_k + rank) over the lists a row appears in;
+    "weighted" sums min-max normalized scores times their weights.
+    """
+    keep = dense_rows != -1
+    dense_rows, dense_scores = dense_rows[keep], dense_scores[keep]
+
+    if fusion.method == "rrf":
+        dense_part = fusion.dense_weight / (fusion.rrf_k + 1 + np.arange(len(dense_rows)))
+        sparse_part = fusion.sparse_weight / (fusion.rrf_k + 1 + np.arange(len(sparse_rows)))
+    else:
+        dense_part = fusion.dense_weight * _minmax(dense_scores)
+        sparse_part = fusion.sparse_weight * _minmax(sparse_scores)
+
+    rows = np.concatenate([dense_rows, sparse_rows]).astype(np.int64)
+    contributions = np.concatenate([dense_part, sparse_part])
+    unique_rows, inverse = np.unique(rows, return_inverse=True)
+    fused = np.zeros(len(unique_rows))
+    np.add.at(fused, inverse, contributions)
+
+    order = np.argsort(-fused, kind="stable")[:k]
+    return unique_rows[order], fused[order]
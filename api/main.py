@@ -1,15 +1,58 @@
-from fastapi import FastAPI, HTTPException
+import time
+IMPORT_START = time.perf_counter()
+
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
+from typing import List, Optional
+import asyncio
+import hmac
 import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-import faiss
 from pathlib import Path
-from sentence_transformers import SentenceTransformer
 from fastapi.middleware.cors import CORSMiddleware
-import time
+from admission import Admission, LoadShedder
+from batching import DeadlineExceededError, MicroBatcher, QueueFullError
+from bundle import bundle_paths, current_bundle, encoder_digest, verify_bundle
+from cache import LRUCache, normalize_text
+from chunking import Chunking, aggregate, check_chunking, chunk_text, chunking_key
+from diversify import Diversify, check_diversify, diversify_key, mmr, test_type_matrix
+from filters import Filters, filter_key, filtered_search
+from fusion import Fusion, check_fusion, fuse, fusion_key
+from rerank import DEFAULT_MODEL, Rerank, Reranker, rerank_key
+from responses import (MEDIA_TYPES, CompressResponses, batch_records, encode, encode_arrow, negotiate, parse_fields,
+                       result_columns)
+from snapshot import ArtifactPaths, SnapshotError, load_snapshot
+from telemetry import Registry, RequestMetrics, StageTimer, process_memory
 
 app = FastAPI()
 
+metrics = Registry()
+REQUESTS = metrics.counter("shl_requests_total", "HTTP requests by route and status", ["endpoint", "status"])
+REQUEST_SECONDS = metrics.histogram("shl_request_seconds", "HTTP request latency by route", ["endpoint"])
+ERRORS = metrics.counter("shl_errors_total", "Failed recommendation requests by reason", ["endpoint", "reason"])
+STAGE_SECONDS = metrics.histogram(
+    "shl_stage_seconds",
+    "Time per pipeline stage; search stages are per micro-batch, queue, hydrate and serialize per request",
+    ["stage"]
+)
+SEARCH_BATCH_SIZE = metrics.histogram(
+    "shl_search_batch_size", "Queries encoded and searched together", buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 1024)
+)
+# Bodies of COMPRESS_MIN_BYTES or more go out brotli- (when installed) or gzip-compressed, as
+# the client accepts; COMPRESSION="" turns this off. Inside RequestMetrics, so latency includes it
+app.add_middleware(CompressResponses, minimum_size=int(os.getenv("COMPRESS_MIN_BYTES", "4096")),
+                   encodings=[e.strip() for e in os.getenv("COMPRESSION", "br,gzip").split(",") if e.strip()])
+app.add_middleware(RequestMetrics, requests=REQUESTS, latency=REQUEST_SECONDS)
+
+# Load shedding: past MAX_INFLIGHT concurrent search requests, answer 503 + Retry-After right away
+admission = Admission(int(os.getenv("MAX_INFLIGHT", "256")), retry_after=int(os.getenv("SHED_RETRY_AFTER", "1")))
+app.add_middleware(LoadShedder, paths=["/recommend", "/recommend/batch"], admission=admission)
+
 # CORS setup
 app.add_middleware(
     CORSMiddleware,
@@ -20,75 +63,743 @@ app.add_middleware(
 
 # Configuration
 BASE_DIR = Path(__file__).parent
-DATA_PATH = BASE_DIR.parent / "data_process" / "processed_dataset.json"
+DATA_PATH = BASE_DIR.parent / "data_process" / "processed_dataset.jsonl"
+CATALOG_DIR = BASE_DIR / "data" / "catalog"
 FAISS_INDEX_PATH = BASE_DIR / "data" / "faiss_index.bin"
+FAISS_INDEX_META_PATH = BASE_DIR / "data" / "faiss_index.json"
+EMBEDDINGS_PATH = BASE_DIR / "data" / "embeddings.npy"
+EMBEDDINGS_MANIFEST_PATH = BASE_DIR / "data" / "embeddings_manifest.json"
+SPARSE_INDEX_DIR = BASE_DIR / "data" / "sparse_index"
+CANONICAL_DIR = BASE_DIR / "data" / "canonical"
+ARTIFACTS = ArtifactPaths(DATA_PATH, CATALOG_DIR, FAISS_INDEX_PATH, FAISS_INDEX_META_PATH, EMBEDDINGS_PATH,
+                          EMBEDDINGS_MANIFEST_PATH, SPARSE_INDEX_DIR, CANONICAL_DIR)
+ENCODE_BATCH_SIZE = 64     # SentenceTransformer batch size for multi-query encoding
+
+# Query encoder: "sentence-transformers" (PyTorch), "onnx" or "onnx-int8" (see export_onnx.py)
+ENCODER_BACKEND = os.getenv("ENCODER_BACKEND", "sentence-transformers")
+ENCODER_THREADS = int(os.getenv("ENCODER_THREADS", "0"))  # 0 = library default
+STREAM_CHUNK_SIZE = 256    # Queries encoded/searched per step when streaming NDJSON
+MAX_QUERY_CHUNKS = int(os.getenv("MAX_QUERY_CHUNKS", "32"))  # Upper bound on a request's chunking.max_chunks
+
+# Plain queries this similar (cosine) to a canonical role query get its precomputed results
+# (canonical.py). 0 = exact text matches only; pick a value with canonical.py --evaluate
+CANONICAL_THRESHOLD = float(os.getenv("CANONICAL_THRESHOLD", "0"))
+
+# Time a search request may take unless it asks for less (X-Request-Deadline-Ms or
+# deadline_ms); the Streamlit client gives up after 10s
+REQUEST_DEADLINE_MS = float(os.getenv("REQUEST_DEADLINE_MS", "10000"))
+
+# Micro-batching for concurrent /recommend traffic
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "32"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "5"))
+BATCH_QUEUE_SIZE = int(os.getenv("BATCH_QUEUE_SIZE", "1024"))
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "1"))
+
+# Query embedding and result caches (each gets its own memory budget; TTL 0 = no expiry)
+EMBEDDING_CACHE_ENTRIES = int(os.getenv("EMBEDDING_CACHE_ENTRIES", "10000"))
+RESULT_CACHE_ENTRIES = int(os.getenv("RESULT_CACHE_ENTRIES", "10000"))
+CACHE_MAX_MB = float(os.getenv("CACHE_MAX_MB", "64"))
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "0"))
+
+# Serve the active bundle built by bundle.py ("current"; loose api/data files if none
+# has been built), a given bundle directory, or "off" for the loose files
+ARTIFACT_BUNDLE = os.getenv("ARTIFACT_BUNDLE", "current")
+BUNDLE_VERIFY = os.getenv("BUNDLE_VERIFY", "size")  # "size", or "checksum" to hash every file on load
+
+# Searches run end to end before the app reports ready
+WARMUP_QUERIES = ["Java developer", "sales manager with team leadership", "bank teller",
+                  "entry level customer service representative with good communication skills"]
+WARMUP_ROUNDS = int(os.getenv("WARMUP_ROUNDS", "2"))
+
+# Memory-map embeddings and FAISS storage instead of reading them into each
+# process (serve.py turns this on for its pre-forked workers)
+INDEX_MMAP = os.getenv("INDEX_MMAP", "0") == "1"
+
+# Cross-encoder second stage, opted into per request; only these models may be asked for
+RERANK_MODELS = [m.strip() for m in os.getenv("RERANK_MODELS", DEFAULT_MODEL).split(",") if m.strip()]
+RERANK_MAX_CANDIDATES = int(os.getenv("RERANK_MAX_CANDIDATES", "100"))
+RERANK_CACHE_ENTRIES = int(os.getenv("RERANK_CACHE_ENTRIES", "100000"))  # (query, item) pair scores
+
+# Hot reload: poll artifact files every RELOAD_WATCH_INTERVAL seconds (0 = only via /admin/reload)
+RELOAD_WATCH_INTERVAL = float(os.getenv("RELOAD_WATCH_INTERVAL", "0"))
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")  # Required as X-Admin-Token on admin endpoints; unset disables them
+
+# BM25 scoring for hybrid queries runs here, in parallel with encoding and FAISS
+sparse_executor = ThreadPoolExecutor(max_workers=int(os.getenv("SPARSE_WORKERS", "2")), thread_name_prefix="bm25")
+
+embedding_cache = LRUCache(EMBEDDING_CACHE_ENTRIES, int(CACHE_MAX_MB * 1024 * 1024), CACHE_TTL_SECONDS or None)
+result_cache = LRUCache(RESULT_CACHE_ENTRIES, int(CACHE_MAX_MB * 1024 * 1024), CACHE_TTL_SECONDS or None)
+rerank_cache = LRUCache(RERANK_CACHE_ENTRIES, int(CACHE_MAX_MB * 1024 * 1024), CACHE_TTL_SECONDS or None)
+reranker = Reranker(RERANK_MODELS, rerank_cache, max_candidates=RERANK_MAX_CANDIDATES)
+
+# Catalog, embeddings and index currently being served; replaced as a whole on reload
+snapshot = None
+reload_lock = threading.Lock()
+batcher = None
+model = None
+model_digest = None  # Checksum of the bundle files the encoder was loaded from
+ready = False
+startup = StageTimer()
+canonical_outcomes = {"exact": 0, "similar": 0, "miss": 0}
+startup.add("imports", time.perf_counter() - IMPORT_START)
+
+# Exported from the state the app already keeps, read when /metrics is scraped
+def cache_samples(read):
+    return [({"cache": "embeddings"}, read(embedding_cache)), ({"cache": "results"}, read(result_cache)),
+            ({"cache": "rerank"}, read(rerank_cache))]
+
+metrics.callback("shl_cache_hits_total", "Cache hits", "counter", lambda: cache_samples(lambda c: c.hits))
+metrics.callback("shl_cache_misses_total", "Cache misses", "counter", lambda: cache_samples(lambda c: c.misses))
+metrics.callback("shl_cache_evictions_total", "Cache evictions", "counter", lambda: cache_samples(lambda c: c.evictions))
+metrics.callback("shl_cache_entries", "Entries currently cached", "gauge", lambda: cache_samples(len))
+metrics.callback("shl_batches_total", "Micro-batches processed", "counter",
+                 lambda: batcher.batches_processed if batcher else None)
+metrics.callback("shl_batch_rejected_total", "Requests rejected with a full batch queue", "counter",
+                 lambda: batcher.rejected if batcher else None)
+metrics.callback("shl_batch_queue_depth", "Requests waiting for a micro-batch", "gauge",
+                 lambda: batcher.queue_depth if batcher else None)
+metrics.callback("shl_rerank_queries_total",
+                 "Re-ranked queries by outcome: reranked, cached (no model pass), fallback (budget exceeded)",
+                 "counter", lambda: [({"outcome": k}, v) for k, v in reranker.outcomes.items()])
+metrics.callback("shl_batch_expired_total", "Queued requests dropped because their deadline could not be met",
+                 "counter", lambda: batcher.expired if batcher else None)
+metrics.callback("shl_shed_total", "Search requests rejected with 503 over the in-flight limit", "counter",
+                 lambda: admission.shed)
+metrics.callback("shl_inflight_requests", "Search requests currently in flight", "gauge",
+                 lambda: admission.inflight)
+metrics.callback("shl_ready", "1 once startup and warm-up are done, 0 while starting or shutting down", "gauge",
+                 lambda: int(ready))
+metrics.callback("shl_canonical_lookups_total",
+                 "Plain queries checked against the canonical table: exact, similar (above threshold) or miss",
+                 "counter", lambda: [({"outcome": k}, v) for k, v in canonical_outcomes.items()])
+metrics.callback("shl_index_vectors", "Vectors in the served FAISS index", "gauge",
+                 lambda: snapshot.index.ntotal if snapshot else None)
+metrics.callback("shl_catalog_assessments", "Assessments in the served catalog", "gauge",
+                 lambda: len(snapshot.catalog) if snapshot else None)
+metrics.callback("shl_process_memory_bytes",
+                 "Memory of this worker: rss, pss (shared pages split between processes), uss (private)", "gauge",
+                 lambda: [({"kind": kind}, value) for kind, value in (process_memory() or {}).items()])
+metrics.callback("shl_startup_seconds", "Time spent in each startup phase of this process", "gauge",
+                 lambda: [({"phase": phase}, seconds) for phase, seconds in startup.stages.items()])
+metrics.callback("shl_snapshot_info", "Served snapshot version and index type", "gauge",
+                 lambda: [({"version": snapshot.version, "index_type": snapshot.stats()["faiss_index_type"]}, 1)]
+                 if snapshot else None)
+
+def bundle_dir():
+    """Directory of the bundle to serve, or None for the loose files in api/data"""
+    if ARTIFACT_BUNDLE == "off":
+        return None
+    if ARTIFACT_BUNDLE == "current":
+        return current_bundle()
+    return Path(ARTIFACT_BUNDLE)
+
+def artifact_paths():
+    directory = bundle_dir()
+    return bundle_paths(directory) if directory else ARTIFACTS
+
+def reload_snapshot():
+    """Load artifacts from disk, validate them and atomically swap them in.
 
-# Load resources once at startup
+    In-flight requests keep the snapshot they started with; a failed load
+    leaves the current snapshot in place. Without an encoder loaded yet
+    (serve.py's ONNX preload) the dimension check is left to load_assets().
+    """
+    global snapshot
+    with reload_lock:
+        directory = bundle_dir()
+        version = None
+        if directory is not None:
+            manifest = verify_bundle(directory, checksums=BUNDLE_VERIFY == "checksum")
+            version = manifest["version"]
+            if model_digest and encoder_digest(manifest, ENCODER_BACKEND) != model_digest:
+                raise SnapshotError(f"Bundle {version} ships a different encoder; restart to switch to it")
+        new_snapshot = load_snapshot(
+            bundle_paths(directory) if directory else ARTIFACTS,
+            dimension=model.get_sentence_embedding_dimension() if model else None,
+            mmap=INDEX_MMAP,
+            version=version
+        )
+        previous, snapshot = snapshot, new_snapshot
+
+        # Anything cached was computed against the previous index/catalog
+        result_cache.clear()
+
+    print(f"Serving snapshot {new_snapshot.version} ({len(new_snapshot.catalog)} assessments)")
+    return previous, new_snapshot
+
+def load_encoder(directory=None):
+    """Query encoder for the configured backend; the ONNX ones never import torch.
+
+    From a bundle, weights and tokenizer are read from local disk only;
+    otherwise the model is fetched by name (and cached) as before.
+    """
+    if ENCODER_BACKEND in ("onnx", "onnx-int8"):
+        from onnx_encoder import ONNX_DIR, OnnxEncoder
+        return OnnxEncoder(model_dir=directory / "onnx" if directory else ONNX_DIR,
+                           quantized=ENCODER_BACKEND == "onnx-int8", num_threads=ENCODER_THREADS or None)
+    if ENCODER_BACKEND != "sentence-transformers":
+        raise ValueError(f"Unknown ENCODER_BACKEND '{ENCODER_BACKEND}'")
+
+    if directory is not None:
+        if not (directory / "model").exists():
+            raise SnapshotError(f"Bundle {directory.name} has no sentence-transformers model (built with --no-model)")
+        # Read when huggingface_hub is first imported, so set before the import below
+        os.environ.setdefault("HF_HUB_OFFLINE", "1")
+    from sentence_transformers import SentenceTransformer
+    if ENCODER_THREADS:
+        import torch
+        torch.set_num_threads(ENCODER_THREADS)
+    if directory is not None:
+        return SentenceTransformer(str(directory / "model"), device="cpu")
+    return SentenceTransformer('all-MiniLM-L6-v2')
+
+def warm_up():
+    """Run a few searches end to end, so the first real requests don't pay for
+    lazily initialized kernels, allocator pools and page faults on the index"""
+    queries = [Query(text=text, max_results=10) for text in WARMUP_QUERIES]
+    for _ in range(WARMUP_ROUNDS):
+        model.encode(WARMUP_QUERIES, normalize_embeddings=True, show_progress_bar=False,
+                     batch_size=ENCODE_BATCH_SIZE)
+        model.encode(WARMUP_QUERIES[:1], normalize_embeddings=True, show_progress_bar=False)
+    search_queries(queries, snapshot, check_result_cache=False)
+    # Keep the warm-up queries out of the cache and canonical-lookup statistics
+    embedding_cache.clear()
+    result_cache.clear()
+    for outcome in canonical_outcomes:
+        canonical_outcomes[outcome] = 0
+
+# Load resources once at startup; whatever serve.py loaded before forking is kept
 @app.on_event("startup")
-def load_assets():
-    global assessments, index, model
+def load_assets(warm=True):
+    global model, model_digest, ready
     
     try:
-        # Load assessment data
-        with open(DATA_PATH, "r", encoding="utf-8") as f:
-            assessments = json.load(f)
-        
-        # Load FAISS index
-        index = faiss.read_index(str(FAISS_INDEX_PATH))
-        
-        # Load embedding model
-        model = SentenceTransformer('all-MiniLM-L6-v2')
-        
-        print("Successfully loaded all resources")
+        # Load embedding model, from the bundle when serving one
+        if model is None:
+            directory = bundle_dir()
+            with startup.stage("bundle"):
+                manifest = verify_bundle(directory, checksums=BUNDLE_VERIFY == "checksum") if directory else None
+            with startup.stage("encoder"):
+                model = load_encoder(directory)
+            model_digest = encoder_digest(manifest, ENCODER_BACKEND) if manifest else None
+            embedding_cache.clear()
+
+        # Load assessment data, embeddings and FAISS index
+        if snapshot is None:
+            with startup.stage("snapshot"):
+                reload_snapshot()
+        elif snapshot.index.d != model.get_sentence_embedding_dimension():
+            raise SnapshotError(
+                f"Dimension mismatch: index {snapshot.index.d}, model {model.get_sentence_embedding_dimension()}"
+            )
+
+        if warm and not ready:
+            with startup.stage("warmup"):
+                warm_up()
+            ready = True
+
+        phases = ", ".join(f"{phase} {ms:.0f}ms" for phase, ms in startup.milliseconds().items())
+        print(f"Successfully loaded all resources ({phases})")
     except Exception as e:
         print(f"Failed to initialize: {str(e)}")
         raise e
 
+async def watch_artifacts():
+    """Reload once artifact files have changed and stayed unchanged for one interval"""
+    pending = rejected = None
+    while True:
+        await asyncio.sleep(RELOAD_WATCH_INTERVAL)
+        fingerprint = artifact_paths().fingerprint()
+        if fingerprint in (snapshot.fingerprint, rejected):
+            pending = None
+            continue
+        if fingerprint != pending:
+            # Files are possibly still being written; check again next tick
+            pending = fingerprint
+            continue
+        try:
+            await run_in_threadpool(reload_snapshot)
+        except Exception as e:
+            # Don't retry the same broken files until they change again
+            rejected = fingerprint
+            print(f"Reload failed, still serving snapshot {snapshot.version}: {e}")
+        pending = None
+
+@app.on_event("startup")
+async def start_batcher():
+    global batcher, watcher
+    batcher = MicroBatcher(
+        search_current_snapshot,
+        max_batch_size=BATCH_MAX_SIZE,
+        max_wait_ms=BATCH_MAX_WAIT_MS,
+        max_queue_size=BATCH_QUEUE_SIZE,
+        num_workers=BATCH_WORKERS
+    )
+    await batcher.start()
+    watcher = asyncio.create_task(watch_artifacts()) if RELOAD_WATCH_INTERVAL > 0 else None
+
+@app.on_event("shutdown")
+async def stop_batcher():
+    global ready
+    ready = False
+    if watcher:
+        watcher.cancel()
+    await batcher.stop()
+
 class Query(BaseModel):
     text: str
     max_results: int = 5
+    filters: Optional[Filters] = None
+    fusion: Optional[Fusion] = None  # Set to fuse BM25 with dense results
+    rerank: Optional[Rerank] = None  # Set to re-score the top candidates with a cross-encoder
+    chunking: Optional[Chunking] = None  # Set to search long texts (whole job descriptions) chunk by chunk
+    diversify: Optional[Diversify] = None  # Set to pick results by MMR instead of plain relevance order
+    deadline_ms: Optional[float] = None  # Give up (504) after this long; also X-Request-Deadline-Ms
+
+class BatchQuery(BaseModel):
+    queries: List[Query]
+    stream: bool = False  # Emit NDJSON, one line per query, instead of a single JSON body
+    deadline_ms: Optional[float] = None  # For the whole batch; per-query deadlines are ignored
+
+def request_deadline(*budgets_ms):
+    """Absolute deadline (time.monotonic()) from the tightest of the given budgets and the server's"""
+    budget = min([REQUEST_DEADLINE_MS] + [b for b in budgets_ms if b is not None])
+    return time.monotonic() + budget / 1000
+
+def result_cache_key(query, version):
+    return (version, normalize_text(query.text), query.max_results, filter_key(query.filters),
+            fusion_key(query.fusion), rerank_key(query.rerank), chunking_key(query.chunking),
+            diversify_key(query.diversify))
+
+def check_queries(queries):
+    """Reject settings the server won't run, before anything is queued"""
+    for query in queries:
+        try:
+            if query.max_results < 1:
+                raise ValueError("max_results must be at least 1")
+            if query.fusion is not None:
+                check_fusion(query.fusion)
+            if query.rerank is not None:
+                reranker.check(query.rerank)
+            if query.chunking is not None:
+                check_chunking(query.chunking, MAX_QUERY_CHUNKS)
+            if query.diversify is not None:
+                check_diversify(query.diversify)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+def search_depth(query):
+    """How many dense candidates a query needs before any fusion or re-ranking"""
+    if query.fusion is not None:
+        return fusion_depth(query)
+    return result_depth(query)
+
+def fusion_depth(query):
+    """Rows taken from each retriever of a hybrid query: its candidates, but never fewer than it keeps"""
+    return max(query.fusion.candidates, result_depth(query))
+
+def result_depth(query):
+    """How many first-stage rows a query keeps: its results, or the re-ranker's or MMR's candidates.
+
+    When both are set, MMR picks from the re-ranked candidates.
+    """
+    if query.rerank is not None:
+        return max(query.max_results, query.rerank.candidates)
+    if query.diversify is not None:
+        return max(query.max_results, query.diversify.candidates)
+    return query.max_results
+
+def canonical_eligible(query, snap):
+    """Only plain queries, asking for no more than the table stores, can be answered from it"""
+    return (snap.canonical is not None and query.max_results <= snap.canonical.top_n and query.filters is None
+            and query.fusion is None and query.rerank is None and query.chunking is None
+            and query.diversify is None)
+
+def encode_queries(texts):
+    """Encode query texts, reusing cached embeddings and encoding the misses in one batch"""
+    keys = [normalize_text(text) for text in texts]
+    embeddings = [embedding_cache.get(key) for key in keys]
+    missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+
+    if missing:
+        encoded = model.encode(
+            [texts[i] for i in missing],
+            normalize_embeddings=True,
+            show_progress_bar=False,
+            batch_size=ENCODE_BATCH_SIZE
+        ).astype(np.float32)
+        for i, embedding in zip(missing, encoded):
+            embeddings[i] = embedding.copy()  # Don't pin the whole batch array in the cache
+            embedding_cache.put(keys[i], embeddings[i])
+
+    return np.stack(embeddings)
+
+def search_queries(queries, snap, check_result_cache=True, timer=None):
+    """Encode all uncached query texts (or their chunks) in one batch and run a single multi-row FAISS search.
+
+    Returns each query's (rows, scores): catalog rows best first, with the
+    scores of the last stage that ranked them; hydrate() turns them into
+    response results. Stage timings are recorded in `timer` (a StageTimer)
+    when given, and always exported to the stage histograms.
+    """
+    timer = timer or StageTimer()
+    if check_result_cache:
+        with timer.stage("cache"):
+            results = [result_cache.get(result_cache_key(q, snap.version)) for q in queries]
+    else:
+        results = [None] * len(queries)
+    pending = [i for i, r in enumerate(results) if r is None]
+    if not pending:
+        return results
+    SEARCH_BATCH_SIZE.observe(len(pending))
+
+    # Queries sharing the same filters share one eligibility mask and one
+    # multi-row FAISS search
+    with timer.stage("filter"):
+        groups = {}
+        for i in pending:
+            groups.setdefault(filter_key(queries[i].filters), []).append(i)
+        masks = {key: snap.catalog.columns.mask(queries[members[0]].filters) for key, members in groups.items()}
+
+    # BM25 for hybrid queries runs on its own threads while the dense side encodes and searches
+    sparse_futures = {}
+    if snap.sparse is not None:
+        for i in pending:
+            q = queries[i]
+            if q.fusion is not None:
+                sparse_futures[i] = sparse_executor.submit(
+                    snap.sparse.search, q.text, fusion_depth(q), masks[filter_key(q.filters)]
+                )
+
+    # Canonical role queries by their exact text skip encoding altogether
+    first_stage = {}
+    eligible = [i for i in pending if canonical_eligible(queries[i], snap)]
+    if eligible:
+        with timer.stage("canonical"):
+            for i in eligible:
+                match = snap.canonical.lookup(queries[i].text)
+                if match is not None:
+                    first_stage[i] = snap.canonical.results(match)
+                    canonical_outcomes["exact"] += 1
+
+    # Chunked queries contribute one embedding row per chunk, all encoded in this one batch
+    to_encode = [i for i in pending if i not in first_stage]
+    with timer.stage("chunk"):
+        chunks = {i: chunk_text(queries[i].text, queries[i].chunking) if queries[i].chunking else [queries[i].text]
+                  for i in to_encode}
+    embedding_rows = {}
+    texts = []
+    for i in to_encode:
+        embedding_rows[i] = list(range(len(texts), len(texts) + len(chunks[i])))
+        texts.extend(chunks[i])
+    with timer.stage("encode"):
+        query_embeddings = encode_queries(texts) if texts else None
+
+    # The rest of them by the nearest canonical query, in one search of the small canonical index
+    similar = [i for i in eligible if i not in first_stage]
+    if similar and CANONICAL_THRESHOLD > 0:
+        with timer.stage("canonical"):
+            matches, _ = snap.canonical.match(query_embeddings[[embedding_rows[i][0] for i in similar]],
+                                              CANONICAL_THRESHOLD)
+            for i, match in zip(similar, matches):
+                if match != -1:
+                    first_stage[i] = snap.canonical.results(match)
+                canonical_outcomes["similar" if match != -1 else "miss"] += 1
+    else:
+        canonical_outcomes["miss"] += len(similar)
+
+    for key, members in groups.items():
+        members = [i for i in members if i not in first_stage]
+        if not members:
+            continue
+        # Search once with the largest k and trim each row to what its query needs
+        k = max(search_depth(queries[i]) for i in members)
+        search_rows = [row for i in members for row in embedding_rows[i]]
+        with timer.stage("search"):
+            scores, indices = filtered_search(
+                snap.index, snap.embeddings, snap.row_ids, query_embeddings[search_rows], k, masks[key]
+            )
+
+        offset = 0
+        for i in members:
+            q = queries[i]
+            n_chunks = len(embedding_rows[i])
+            if n_chunks == 1:
+                row_scores, row = scores[offset], indices[offset]
+            else:
+                with timer.stage("aggregate"):
+                    row, row_scores = aggregate(
+                        query_embeddings[embedding_rows[i]], chunks[i], scores[offset:offset + n_chunks],
+                        indices[offset:offset + n_chunks], snap.embeddings, q.chunking.aggregate, k
+                    )
+            offset += n_chunks
+            if i in sparse_futures:
+                # Only the part of BM25 not hidden behind encode/search shows up here
+                with timer.stage("sparse"):
+                    sparse_scores, sparse_rows = sparse_futures[i].result()
+                with timer.stage("fuse"):
+                    depth = fusion_depth(q)
+                    rows, row_scores = fuse(row[:depth], row_scores[:depth], sparse_rows, sparse_scores, q.fusion,
+                                            result_depth(q))
+            else:
+                rows, row_scores = row[:result_depth(q)], row_scores[:result_depth(q)]
+            first_stage[i] = (rows[rows != -1], row_scores[rows != -1])
+
+    # One cross-encoder pass for every re-ranked query in the batch
+    reranked = [i for i in pending if queries[i].rerank is not None]
+    fallbacks = set()
+    if reranked:
+        with timer.stage("rerank"):
+            items = [(queries[i].text, first_stage[i][0], queries[i].rerank) for i in reranked]
+            for i, rerank_scores in zip(reranked, reranker.rerank(items, snap.catalog.texts, snap.version)):
+                if rerank_scores is None:
+                    fallbacks.add(i)
+                    continue
+                order = np.argsort(-rerank_scores, kind="stable")
+                first_stage[i] = (first_stage[i][0][order], rerank_scores[order])
+
+    # MMR over each diversified query's candidates, using the scores of the last stage that ranked them
+    for i in pending:
+        q = queries[i]
+        if q.diversify is not None:
+            with timer.stage("diversify"):
+                rows, row_scores = first_stage[i]
+                test_types = test_type_matrix(snap.catalog.columns, rows) if q.diversify.cover_test_types else None
+                picked = mmr(rows, row_scores, snap.embeddings, q.max_results, q.diversify.mmr_lambda, test_types)
+                first_stage[i] = (rows[picked], row_scores[picked])
+
+    for i in pending:
+        q = queries[i]
+        # Copies, so cached results don't pin the candidate arrays they were cut from
+        rows, row_scores = first_stage[i]
+        results[i] = (rows[:q.max_results].copy(), row_scores[:q.max_results].astype(np.float32))
+        # A first-stage fallback is not what this key asks for; let the next request re-rank
+        if i not in fallbacks:
+            result_cache.put(result_cache_key(q, snap.version), results[i])
+
+    for stage, seconds in timer.stages.items():
+        STAGE_SECONDS.observe(seconds, stage=stage)
+    return results
+
+def search_current_snapshot(queries):
+    """Batcher entry point: search a micro-batch and tag each result with the snapshot its rows belong to.
+
+    Each item also gets the batch's stage timings, for recommend()'s debug output.
+    """
+    snap = snapshot
+    timer = StageTimer()
+    # recommend() has already checked the result cache before queueing
+    results = search_queries(queries, snap, check_result_cache=False, timer=timer)
+    return [(snap, r, timer) for r in results]
+
+def response_format(accept, fields, allowed):
+    """Negotiated format (406 if none fits) and the typed fields it should carry"""
+    try:
+        fmt = negotiate(accept, allowed)
+    except ValueError as e:
+        raise HTTPException(status_code=406, detail=str(e))
+    if fmt == "json":
+        if fields is not None:
+            raise HTTPException(status_code=400,
+                                detail=f"fields needs a typed format, e.g. Accept: {MEDIA_TYPES['compact']}")
+        return fmt, None
+    try:
+        return fmt, parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def hydrate(snap, hits, fmt, fields):
+    """Results of each query's (rows, scores) as sent: display-formatted dicts for JSON, typed records
+    otherwise. Only the returned rows are read from the catalog."""
+    if fmt == "json":
+        return [[snap.catalog.result(row) for row in rows] for rows, _ in hits]
+    return batch_records(snap, hits, fields)
 
 @app.post("/recommend")
-async def recommend(query: Query):
+async def recommend(query: Query, debug: bool = False, fields: Optional[str] = None,
+                    accept: Optional[str] = Header(None), x_request_deadline_ms: Optional[float] = Header(None)):
     start_time = time.time()
-    
+    fmt, fields = response_format(accept, fields, ("json", "compact", "msgpack"))
+    check_queries([query])
+    # The event loop's clock is time.monotonic()
+    deadline = request_deadline(query.deadline_ms, x_request_deadline_ms)
+    timer = StageTimer()
+    batch_timer = None
+
     try:
-        # Generate query embedding
-        query_embedding = model.encode(
-            [query.text],
-            normalize_embeddings=True,
-            show_progress_bar=False
-        ).astype(np.float32)
+        # Repeated queries are answered straight from the cache; everything
+        # else is encoded and searched on the batcher's worker threads,
+        # coalesced with other in-flight requests
+        snap = snapshot
+        with timer.stage("cache"):
+            hits = result_cache.get(result_cache_key(query, snap.version))
+        if hits is None:
+            submitted = time.perf_counter()
+            snap, hits, batch_timer = await batcher.submit(query, deadline=deadline)
+            # Whatever the batch itself didn't account for was spent waiting for it
+            timer.add("queue", max(0.0, time.perf_counter() - submitted - batch_timer.total()))
+        with timer.stage("hydrate"):
+            results = hydrate(snap, [hits], fmt, fields)[0]
+    except QueueFullError as e:
+        ERRORS.inc(endpoint="/recommend", reason="queue_full")
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+    except DeadlineExceededError as e:
+        ERRORS.inc(endpoint="/recommend", reason="deadline")
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        ERRORS.inc(endpoint="/recommend", reason=type(e).__name__)
+        raise HTTPException(status_code=500, detail=str(e))
 
-        # FAISS search
-        scores, indices = index.search(query_embedding, query.max_results)
-        
-        # Process results for frontend compatibility
-        results = []
-        for idx in indices[0]:
-            assessment = assessments[idx]
-            results.append({
-                "Assessment Name": assessment["Assessment_name"],
-                "URL": assessment["URL"],
-                "Remote Testing": "Yes" if assessment["Remote_testing_support"] else "No",
-                "Adaptive Support": assessment.get("Adaptive/IRT Support", "No"),
-                "Duration": f"{assessment['Duration_minutes']} minutes",
-                "Test Types": ", ".join(assessment["Test_types"])
-            })
-
-        return {
-            "query": query.text,
-            "processing_time": f"{(time.time() - start_time)*1000:.2f}ms",
-            "results": results
-        }
-    
+    # Batch stages were exported by search_queries(); these are per request
+    for stage, seconds in timer.stages.items():
+        STAGE_SECONDS.observe(seconds, stage=stage)
+
+    elapsed_ms = (time.time() - start_time) * 1000
+    response = {"query": query.text, "snapshot_version": snap.version}
+    if fmt == "json":
+        response["processing_time"] = f"{elapsed_ms:.2f}ms"
+    else:
+        response["processing_time_ms"] = round(elapsed_ms, 2)
+    response["results"] = results
+    if debug:
+        # Search stages are those of the micro-batch this query was part of
+        response["stages_ms"] = {**(batch_timer.milliseconds() if batch_timer else {}), **timer.milliseconds()}
+
+    serialize_start = time.perf_counter()
+    body = json.dumps(response, ensure_ascii=False) if fmt == "json" else encode(fmt, response)
+    STAGE_SECONDS.observe(time.perf_counter() - serialize_start, stage="serialize")
+    return Response(body, media_type=MEDIA_TYPES[fmt], headers={"Vary": "Accept"})
+
+def stream_batch(queries, snap, deadline, fmt="json", fields=None):
+    """Yield NDJSON lines chunk by chunk so large batches are never fully buffered"""
+    def dumps(line):
+        if fmt == "json":
+            return json.dumps(line, ensure_ascii=False) + "\n"
+        return encode(fmt, line) + b"\n"
+
+    for offset in range(0, len(queries), STREAM_CHUNK_SIZE):
+        if time.monotonic() > deadline:
+            ERRORS.inc(endpoint="/recommend/batch", reason="deadline")
+            yield dumps({"index": offset, "error": "Deadline exceeded; remaining queries skipped"})
+            return
+        chunk = queries[offset:offset + STREAM_CHUNK_SIZE]
+        results = hydrate(snap, search_queries(chunk, snap), fmt, fields)
+        for i, (query, query_results) in enumerate(zip(chunk, results)):
+            yield dumps({"index": offset + i, "query": query.text, "snapshot_version": snap.version,
+                         "results": query_results})
+
+def arrow_batch(snap, hits, fields, metadata):
+    """All queries' results as one Arrow table, a row per result keyed by query_index and rank"""
+    counts = [len(rows) for rows, _ in hits]
+    columns = result_columns(snap, np.concatenate([rows for rows, _ in hits]),
+                             np.concatenate([scores for _, scores in hits]), fields)
+    columns["query_index"] = np.repeat(np.arange(len(hits)), counts).tolist()
+    columns["rank"] = np.concatenate([np.arange(n) for n in counts]).tolist()
+    return encode_arrow(columns, ("query_index", "rank") + fields, metadata)
+
+@app.post("/recommend/batch")
+def recommend_batch(batch: BatchQuery, fields: Optional[str] = None, accept: Optional[str] = Header(None),
+                    x_request_deadline_ms: Optional[float] = Header(None)):
+    if not batch.queries:
+        raise HTTPException(status_code=400, detail="No queries provided")
+    # Streamed lines are JSON, display-formatted or compact
+    fmt, fields = response_format(accept, fields, ("json", "compact") if batch.stream else tuple(MEDIA_TYPES))
+    check_queries(batch.queries)
+    deadline = request_deadline(batch.deadline_ms, x_request_deadline_ms)
+
+    # The whole batch is served from one snapshot, even across a reload
+    snap = snapshot
+    if batch.stream:
+        return StreamingResponse(stream_batch(batch.queries, snap, deadline, fmt, fields),
+                                 media_type="application/x-ndjson", headers={"Vary": "Accept"})
+
+    start_time = time.time()
+    try:
+        # Chunk by chunk, so a batch that can't finish in time stops early
+        hits = []
+        for offset in range(0, len(batch.queries), STREAM_CHUNK_SIZE):
+            if time.monotonic() > deadline:
+                raise DeadlineExceededError(f"Deadline exceeded after {offset} of {len(batch.queries)} queries")
+            hits.extend(search_queries(batch.queries[offset:offset + STREAM_CHUNK_SIZE], snap))
+    except DeadlineExceededError as e:
+        ERRORS.inc(endpoint="/recommend/batch", reason="deadline")
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
+        ERRORS.inc(endpoint="/recommend/batch", reason=type(e).__name__)
         raise HTTPException(status_code=500, detail=str(e))
 
+    elapsed_ms = (time.time() - start_time) * 1000
+    if fmt == "arrow":
+        body = arrow_batch(snap, hits, fields, {"snapshot_version": snap.version,
+                                                "processing_time_ms": round(elapsed_ms, 2)})
+        return Response(body, media_type=MEDIA_TYPES[fmt], headers={"Vary": "Accept"})
+
+    results = [
+        {"query": query.text, "results": query_results}
+        for query, query_results in zip(batch.queries, hydrate(snap, hits, fmt, fields))
+    ]
+    if fmt == "json":
+        body = json.dumps({"snapshot_version": snap.version, "processing_time": f"{elapsed_ms:.2f}ms",
+                           "results": results}, ensure_ascii=False)
+    else:
+        body = encode(fmt, {"snapshot_version": snap.version, "processing_time_ms": round(elapsed_ms, 2),
+                            "results": results})
+    return Response(body, media_type=MEDIA_TYPES[fmt], headers={"Vary": "Accept"})
+
+@app.post("/admin/reload")
+async def admin_reload(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled; set ADMIN_TOKEN to enable them")
+    if not hmac.compare_digest((x_admin_token or "").encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+    try:
+        previous, current = await run_in_threadpool(reload_snapshot)
+    except SnapshotError as e:
+        raise HTTPException(status_code=409, detail=f"Artifacts rejected, still serving {snapshot.version}: {e}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Reload failed, still serving {snapshot.version}: {e}")
+
+    return {
+        "previous_version": previous.version if previous else None,
+        "snapshot": current.stats()
+    }
+
+@app.get("/metrics")
+def metrics_endpoint():
+    """Prometheus text exposition of request, stage, cache, batcher and snapshot metrics"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/livez")
+def liveness():
+    """The process is up and its event loop is responsive; depends on nothing else"""
+    return {"status": "alive"}
+
+@app.get("/readyz")
+def readiness():
+    """Whether this worker should get traffic: loaded, warmed up and not shutting down"""
+    if not ready or snapshot is None or batcher is None:
+        return JSONResponse({"status": "not ready", "startup_ms": startup.milliseconds()}, status_code=503)
+    return {"status": "ready", "snapshot_version": snapshot.version}
+
 @app.get("/")
 def health_check():
+    if snapshot is None:
+        return JSONResponse({"status": "starting", "ready": False}, status_code=503)
     return {
         "status": "active",
-        "assessments_loaded": len(assessments),
-        "faiss_index_size": index.ntotal if index else 0
-    }
\ No newline at end of file
+        **snapshot.stats(),
+        "batcher": batcher.stats() if batcher else None,
+        "admission": admission.stats(),
+        "cache": {
+            "embeddings": embedding_cache.stats(),
+            "results": result_cache.stats(),
+            "rerank": rerank_cache.stats()
+        },
+        "rerank": reranker.stats(),
+        "encoder_backend": ENCODER_BACKEND,
+        "bundle": snapshot.version if bundle_dir() else None,
+        "ready": ready,
+        "startup_ms": startup.milliseconds(),
+        "worker_pid": os.getpid()
+    }
@@ -0,0 +1,78 @@
+import json
+import os
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+
+def iter_records(path):
+    """Stream records from a JSON Lines file, one object per line.
+
+    Legacy `.json` files holding a single array are still accepted, but are
+    necessarily loaded whole.
+    """
+    path = Path(path)
+    with open(path, "r", encoding="utf-8") as f:
+        if path.suffix == ".json":
+            yield from json.load(f)
+            return
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def count_records(path):
+    path = Path(path)
+    if path.suffix == ".json":
+        return sum(1 for _ in iter_records(path))
+    with open(path, "r", encoding="utf-8") as f:
+        return sum(1 for line in f if line.strip())
+
+
+def iter_chunks(records, size):
+    """Group an iterable into lists of at most `size` items"""
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def write_records(path, records):
+    """Stream records to a JSON Lines file; readers only ever see a complete file"""
+    path = Path(path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    count = 0
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            count += 1
+    os.replace(tmp_path, path)
+    return count
+
+
+@contextmanager
+def replaced_atomically(path):
+    """Yield a temporary path beside `path`, renamed over it once the block succeeds.
+
+    Servers memory-map the artifacts; a rename leaves them reading the old
+    inode, whereas rewriting the file in place would truncate pages under them.
+    """
+    path = Path(path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+def save_array(path, array):
+    """np.save() that replaces the file atomically"""
+    with replaced_atomically(path) as tmp_path, open(tmp_path, "wb") as f:
+        np.save(f, np.asarray(array))
@@ -0,0 +1,114 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+import numpy as np
+from pydantic import BaseModel
+
+from cache import normalize_text
+
+DEFAULT_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+
+class Rerank(BaseModel):
+    """Per-request second stage: re-score the top candidates with a cross-encoder"""
+    model: str = DEFAULT_MODEL
+    candidates: int = 20     # First-stage rows re-scored
+    budget_ms: float = 150   # Past this, the first-stage order is returned
+
+
+def rerank_key(rerank):
+    # The budget only decides whether a result is re-ranked, not what it is
+    if rerank is None:
+        return None
+    return (rerank.model, rerank.candidates)
+
+
+class Reranker:
+    """Cross-encoder second stage with a pair-score cache and a latency budget.
+
+    Scores for (query, row) pairs are cached per model and snapshot version,
+    so a repeated query re-ranks without running the model. The uncached
+    pairs of a whole micro-batch go through the model in one batched forward
+    pass on a dedicated thread; each query waits for it at most its own
+    budget and otherwise keeps its first-stage order. A pass that finishes
+    late still fills the cache, so the next identical query is re-ranked.
+    Models load lazily on that thread, so a cold model falls back too
+    instead of stalling the batch.
+    """
+
+    def __init__(self, models, cache, max_candidates=100, batch_size=64, max_length=256):
+        self.allowed = tuple(models)
+        self.cache = cache
+        self.max_candidates = max_candidates
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.models = {}
+        self.outcomes = {"reranked": 0, "cached": 0, "fallback": 0}
+        self._lock = threading.Lock()
+        # One pass at a time; the cross-encoder uses all intra-op threads itself
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rerank")
+
+    def check(self, rerank):
+        if rerank.model not in self.allowed:
+            raise ValueError(f"Unknown rerank model '{rerank.model}'; available: {', '.join(self.allowed)}")
+        if not 1 <= rerank.candidates <= self.max_candidates:
+            raise ValueError(f"rerank.candidates must be between 1 and {self.max_candidates}")
+
+    def load(self, name):
+        with self._lock:
+            if name not in self.models:
+                from sentence_transformers import CrossEncoder
+                self.models[name] = CrossEncoder(name, max_length=self.max_length, device="cpu")
+            return self.models[name]
+
+    def _predict(self, name, pairs, keys):
+        scores = self.load(name).predict(pairs, batch_size=self.batch_size, show_progress_bar=False)
+        for key, score in zip(keys, scores):
+            self.cache.put(key, float(score))
+        return scores
+
+    def rerank(self, items, texts, version):
+        """Cross-encoder scores for a list of (query text, rows, Rerank) items.
+
+        Returns one score array per item, aligned with its rows, or None
+        when the item ran out of budget and keeps its first-stage order.
+        """
+        start = time.perf_counter()
+        scores = []
+        groups = {}   # model -> {"pairs", "keys", "members": [(item, missing positions, offset)]}
+        for i, (text, rows, settings) in enumerate(items):
+            query = normalize_text(text)
+            keys = [(settings.model, query, version, int(row)) for row in rows]
+            cached = [self.cache.get(key) for key in keys]
+            scores.append(np.array([np.nan if s is None else s for s in cached], dtype=np.float64))
+            missing = np.flatnonzero(np.isnan(scores[i]))
+            if len(missing):
+                group = groups.setdefault(settings.model, {"pairs": [], "keys": [], "members": []})
+                group["members"].append((i, missing, len(group["pairs"])))
+                group["pairs"].extend((text, texts[int(rows[j])]) for j in missing)
+                group["keys"].extend(keys[j] for j in missing)
+            else:
+                self.outcomes["cached"] += 1
+
+        futures = {name: self._executor.submit(self._predict, name, group["pairs"], group["keys"])
+                   for name, group in groups.items()}
+        for name, group in groups.items():
+            # Tightest budget first, so every wait below is the query's own remainder
+            for i, missing, offset in sorted(group["members"], key=lambda m: items[m[0]][2].budget_ms):
+                remaining = items[i][2].budget_ms / 1000 - (time.perf_counter() - start)
+                try:
+                    predicted = futures[name].result(timeout=max(0.0, remaining))
+                except Exception as e:
+                    if not isinstance(e, TimeoutError):
+                        print(f"Re-ranking with {name} failed, keeping first-stage order: {e}")
+                    scores[i] = None
+                    self.outcomes["fallback"] += 1
+                    continue
+                scores[i][missing] = predicted[offset:offset + len(missing)]
+                self.outcomes["reranked"] += 1
+
+        return scores
+
+    def stats(self):
+        return {"models_loaded": sorted(self.models), **self.outcomes}
@@ -0,0 +1,229 @@
+"""Response formats for the search endpoints, and response compression.
+
+The default application/json body keeps the display-formatted results the
+frontend shows ("Duration": "45 minutes"). The other formats carry typed
+values straight from the catalog columns instead (duration_minutes: 45,
+remote_testing: true, test types as their catalog letter codes), limited to
+the fields a client asks for:
+
+    application/vnd.shl.compact+json    orjson-encoded JSON
+    application/msgpack                 MessagePack (needs msgpack)
+    application/vnd.apache.arrow.stream one columnar Arrow table, batch calls only (needs pyarrow)
+"""
+import gzip
+import importlib.util
+import math
+
+import numpy as np
+import orjson
+
+from filters import TEST_TYPE_CODES
+
+MEDIA_TYPES = {
+    "json": "application/json",
+    "compact": "application/vnd.shl.compact+json",
+    "msgpack": "application/msgpack",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+MEDIA_TYPE_ALIASES = {"application/x-msgpack": "msgpack", "application/x-ndjson": "json",
+                      "*/*": "json", "application/*": "json"}
+
+# Formats whose encoder is an optional dependency
+FORMAT_MODULES = {"msgpack": "msgpack", "arrow": "pyarrow"}
+AVAILABLE_FORMATS = [fmt for fmt in MEDIA_TYPES
+                     if fmt not in FORMAT_MODULES or importlib.util.find_spec(FORMAT_MODULES[fmt])]
+
+# Typed result fields in output order; id (the stable FAISS id) and score only when asked for
+RESULT_FIELDS = ("id", "name", "url", "duration_minutes", "remote_testing", "adaptive_support", "test_types",
+                 "score")
+DEFAULT_FIELDS = ("name", "url", "duration_minutes", "remote_testing", "adaptive_support", "test_types")
+
+TEST_TYPE_CODE_BY_NAME = {name.lower(): code for code, name in TEST_TYPE_CODES.items()}
+
+
+def accepted(header):
+    """Values of an Accept or Accept-Encoding header, most preferred first; q=0 ones dropped"""
+    values = []
+    for position, part in enumerate(header.split(",")):
+        value, *params = [p.strip() for p in part.split(";")]
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if value and quality > 0:
+            values.append((-quality, position, value.lower()))
+    return [value for _, _, value in sorted(values)]
+
+
+def negotiate(accept, allowed):
+    """The format to answer with: the client's most preferred media type among `allowed` formats this
+    server can produce. A missing Accept header means JSON; raises ValueError when nothing fits."""
+    for media_type in accepted(accept or "*/*"):
+        fmt = MEDIA_TYPE_ALIASES.get(media_type) or next(
+            (name for name, known in MEDIA_TYPES.items() if known == media_type), None)
+        if fmt in allowed and fmt in AVAILABLE_FORMATS:
+            return fmt
+    supported = ", ".join(MEDIA_TYPES[fmt] for fmt in allowed if fmt in AVAILABLE_FORMATS)
+    raise ValueError(f"Cannot produce {accept}; this endpoint serves {supported}")
+
+
+def parse_fields(fields):
+    """Requested result fields ("id,name,score") in output order; the defaults when not given"""
+    if fields is None:
+        return DEFAULT_FIELDS
+    requested = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = requested - set(RESULT_FIELDS)
+    if unknown or not requested:
+        raise ValueError(f"fields must be a comma-separated subset of {', '.join(RESULT_FIELDS)}")
+    return tuple(f for f in RESULT_FIELDS if f in requested)
+
+
+def result_columns(snap, rows, scores, fields):
+    """Typed values of the given catalog rows, one list per field"""
+    catalog, columns = snap.catalog, snap.catalog.columns
+    values = {}
+    for field in fields:
+        if field == "id":
+            values[field] = snap.row_ids.ids[rows].tolist()
+        elif field == "name":
+            values[field] = catalog.names.take(rows)
+        elif field == "url":
+            values[field] = catalog.urls.take(rows)
+        elif field == "duration_minutes":
+            # Whole minutes in the catalog; NaN marks an unknown duration
+            values[field] = [None if math.isnan(d) else int(d) for d in columns.duration[rows].tolist()]
+        elif field == "remote_testing":
+            values[field] = columns.remote[rows].tolist()
+        elif field == "adaptive_support":
+            values[field] = columns.adaptive[rows].tolist()
+        elif field == "test_types":
+            # Each row's set of types as a bit pattern; rows sharing one share the decoded list
+            codes = [TEST_TYPE_CODE_BY_NAME.get(name, name) for name in columns.test_types]
+            patterns = np.zeros(len(rows), dtype=np.int64)
+            for bit, bitmap in enumerate(columns.test_types.values()):
+                patterns |= bitmap[rows].astype(np.int64) << bit
+            patterns = patterns.tolist()
+            decoded = {p: [code for bit, code in enumerate(codes) if p >> bit & 1] for p in set(patterns)}
+            values[field] = [decoded[p] for p in patterns]
+        elif field == "score":
+            values[field] = np.round(np.asarray(scores, dtype=np.float64), 4).tolist()
+    return values
+
+
+def result_records(snap, rows, scores, fields):
+    """One dict per row with the requested typed fields"""
+    values = result_columns(snap, rows, scores, fields)
+    return [dict(zip(fields, row_values)) for row_values in zip(*(values[f] for f in fields))]
+
+
+def batch_records(snap, hits, fields):
+    """result_records() for several queries' (rows, scores) in one pass, split back per query"""
+    if not hits:
+        return []
+    records = result_records(snap, np.concatenate([rows for rows, _ in hits]),
+                             np.concatenate([scores for _, scores in hits]), fields)
+    bounds = np.cumsum([0] + [len(rows) for rows, _ in hits]).tolist()
+    return [records[start:end] for start, end in zip(bounds, bounds[1:])]
+
+
+def encode(fmt, payload):
+    """Serialize a response body of plain Python values as `fmt` (compact or msgpack)"""
+    if fmt == "msgpack":
+        import msgpack
+        return msgpack.packb(payload, use_bin_type=True)
+    return orjson.dumps(payload)
+
+
+def encode_arrow(columns, fields, metadata):
+    """One Arrow IPC stream holding a table of `columns` (field -> list), metadata on its schema"""
+    import pyarrow as pa
+
+    types = {
+        "query_index": pa.int32(), "rank": pa.int32(), "id": pa.int64(), "name": pa.string(), "url": pa.string(),
+        "duration_minutes": pa.int32(), "remote_testing": pa.bool_(), "adaptive_support": pa.bool_(),
+        "test_types": pa.list_(pa.string()), "score": pa.float32(),
+    }
+    schema = pa.schema([(f, types[f]) for f in fields], metadata={k: str(v) for k, v in metadata.items()})
+    table = pa.Table.from_pydict({f: columns[f] for f in fields}, schema=schema)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+class CompressResponses:
+    """ASGI middleware compressing large responses with brotli or gzip, as the client accepts.
+
+    Only responses sent as one body of at least `minimum_size` bytes are
+    compressed; streamed NDJSON goes out uncompressed, line by line, so
+    clients get each line as soon as it is ready. Brotli is preferred over
+    gzip when the brotli package is installed and the client accepts it.
+    Both run at fast settings: the point is fewer bytes on the wire, not
+    the smallest possible body at any CPU cost.
+    """
+
+    def __init__(self, app, minimum_size=4096, encodings=("br", "gzip"), gzip_level=5, brotli_quality=4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.brotli = _brotli() if "br" in encodings else None
+        self.encodings = [e for e in encodings if e != "br" or self.brotli is not None]
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def choose(self, headers):
+        for name, value in headers:
+            if name == b"accept-encoding":
+                codings = accepted(value.decode("latin-1"))
+                return next((e for e in self.encodings if e in codings), None)
+        return None
+
+    def compress(self, encoding, body):
+        if encoding == "br":
+            return self.brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level)
+
+    async def __call__(self, scope, receive, send):
+        encoding = self.choose(scope.get("headers", [])) if scope["type"] == "http" and self.encodings else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+
+        async def send_compressed(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                # Held back until the body shows whether it is worth compressing
+                start = message
+                return
+            if start is None:
+                await send(message)
+                return
+
+            headers = start["headers"]
+            body = message.get("body", b"")
+            if (message.get("more_body") or len(body) < self.minimum_size
+                    or any(name == b"content-encoding" for name, _ in headers)):
+                await send(start)
+            else:
+                body = self.compress(encoding, body)
+                headers = [(name, value) for name, value in headers if name != b"content-length"]
+                headers += [(b"content-encoding", encoding.encode()), (b"content-length", str(len(body)).encode()),
+                            (b"vary", b"Accept-Encoding")]
+                await send({**start, "headers": headers})
+                message = {**message, "body": body}
+            start = None
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,137 @@
+"""Pre-fork server: load the served snapshot once, then fork the workers.
+
+    cd api
+    python serve.py --workers 4 --port 8000
+
+The parent memory-maps the catalog, embeddings and FAISS index (INDEX_MMAP)
+before forking, so every worker reads the same page-cache pages instead of
+holding its own copy, and a hot reload in any worker maps the new files the
+same way. The PyTorch encoder is loaded up front too and shared
+copy-on-write; ONNX sessions start thread pools that do not survive a fork,
+so ONNX backends load their encoder in each worker.
+
+Workers accept on one shared socket, each with its own event loop, batcher
+and caches. A worker that dies is replaced; SIGINT/SIGTERM stop them all.
+Linux/macOS only (os.fork).
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+
+# Crash-looping workers are restarted at most this often
+RESPAWN_DELAY = 1.0
+
+
+def bind_socket(host, port, backlog):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def preload(main):
+    """Load everything the workers can share before they are forked"""
+    start = time.perf_counter()
+    if main.ENCODER_BACKEND == "sentence-transformers":
+        # No warm-up here: torch's thread pool must not be started before forking,
+        # so each worker warms up once it has started
+        main.load_assets(warm=False)
+    else:
+        # The dimension check and warm-up run in each worker once its encoder is loaded
+        with main.startup.stage("snapshot"):
+            main.reload_snapshot()
+    # Keep the collector from touching (and so un-sharing) every object loaded so far
+    gc.collect()
+    gc.freeze()
+    print(f"Preloaded snapshot {main.snapshot.version} in {time.perf_counter() - start:.2f}s")
+
+
+def run_worker(main, sock, args):
+    import uvicorn
+
+    config = uvicorn.Config(main.app, log_level=args.log_level, access_log=args.access_log, timeout_keep_alive=5)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def serve(args):
+    if args.mmap:
+        os.environ["INDEX_MMAP"] = "1"
+    import main
+
+    sock = bind_socket(args.host, args.port, args.backlog)
+    if args.preload:
+        preload(main)
+
+    workers = {}
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            code = 0
+            try:
+                run_worker(main, sock, args)
+            except BaseException as e:
+                print(f"Worker {os.getpid()} failed: {e}", file=sys.stderr)
+                code = 1
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(code)
+        workers[pid] = time.monotonic()
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    for _ in range(args.workers):
+        spawn()
+    print(f"Serving on http://{args.host}:{args.port} with {args.workers} workers "
+          f"(preload={args.preload}, mmap={args.mmap}); parent pid {os.getpid()}")
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        started = workers.pop(pid, None)
+        if started is None or stopping:
+            continue
+        print(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}; starting a new one")
+        if time.monotonic() - started < RESPAWN_DELAY:
+            time.sleep(RESPAWN_DELAY)
+        if not stopping:
+            spawn()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--no-preload", dest="preload", action="store_false",
+                        help="Load everything in each worker after forking, like uvicorn --workers")
+    parser.add_argument("--no-mmap", dest="mmap", action="store_false",
+                        help="Read embeddings and the index into each process's heap")
+    parser.add_argument("--log-level", default="warning")
+    parser.add_argument("--access-log", action="store_true")
+    args = parser.parse_args()
+
+    serve(args)
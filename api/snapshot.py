@@ -0,0 +1,141 @@
+import hashlib
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+from canonical import CanonicalTable, index_key
+from catalog import load_catalog
+from create_faiss_index import apply_search_params, load_index_metadata
+from embeddings import manifest_ids
+from filters import RowIds
+from sparse_index import SparseIndex
+
+
+class SnapshotError(Exception):
+    """Raised when artifacts on disk are inconsistent with each other"""
+
+
+class Snapshot:
+    """Everything a search reads, loaded together and never mutated.
+
+    Requests grab the current snapshot once and use it to the end, so a
+    reload only has to swap one reference.
+    """
+
+    def __init__(self, version, fingerprint, catalog, embeddings, row_ids, index, index_metadata, sparse=None,
+                 canonical=None):
+        self.version = version
+        self.fingerprint = fingerprint
+        self.catalog = catalog
+        self.embeddings = embeddings
+        self.row_ids = row_ids
+        self.index = index
+        self.index_metadata = index_metadata
+        self.sparse = sparse          # BM25 index for hybrid retrieval, None if not built
+        self.canonical = canonical    # Precomputed canonical-query results, None if not built or stale
+        self.loaded_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+
+    def stats(self):
+        return {
+            "version": self.version,
+            "loaded_at": self.loaded_at,
+            "assessments_loaded": len(self.catalog),
+            "faiss_index_size": self.index.ntotal,
+            "faiss_index_type": self.index_metadata["factory"] if self.index_metadata else type(self.index).__name__,
+            "sparse_index_terms": len(self.sparse.terms) if self.sparse else 0,
+            "canonical_queries": len(self.canonical.queries) if self.canonical else 0,
+        }
+
+
+class ArtifactPaths:
+    def __init__(self, data_path, catalog_dir, index_path, index_meta_path, embeddings_path, manifest_path,
+                 sparse_dir, canonical_dir=None):
+        self.data_path = Path(data_path)
+        self.catalog_dir = Path(catalog_dir)
+        self.index_path = Path(index_path)
+        self.index_meta_path = Path(index_meta_path)
+        self.embeddings_path = Path(embeddings_path)
+        self.manifest_path = Path(manifest_path)
+        self.sparse_dir = Path(sparse_dir)
+        self.canonical_dir = Path(canonical_dir) if canonical_dir else None
+
+    def all(self):
+        # catalog.json is written last by build_catalog.py
+        paths = [self.data_path, self.catalog_dir / "catalog.json", self.index_path, self.index_meta_path, self.embeddings_path, self.manifest_path,
+                 self.sparse_dir / "vocab.json"]
+        if self.canonical_dir is not None:
+            paths.append(self.canonical_dir / "canonical.json")
+        return paths
+
+    def fingerprint(self):
+        """(mtime, size) of every artifact; changes whenever any file is rewritten"""
+        return tuple(
+            (p.stat().st_mtime_ns, p.stat().st_size) if p.exists() else None
+            for p in self.all()
+        )
+
+
+def index_io_flags():
+    """faiss.read_index() flags that map index storage from the file instead of copying it.
+
+    IO_FLAG_MMAP only covers IVF inverted lists; IO_FLAG_MMAP_IFC (newer
+    FAISS) maps flat, HNSW and IVF storage alike, and the two can't be combined.
+    """
+    return getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+
+
+def load_snapshot(paths, dimension=None, mmap=False, version=None):
+    """Load and cross-check catalog, embeddings, ids and index into a new Snapshot.
+
+    Unless given (a bundle's version), the version is derived from the
+    artifact fingerprint, so every worker serving the same files reports
+    the same version. With `mmap`, the
+    embeddings and the index's vector storage are memory-mapped read-only,
+    so processes serving the same files share one copy in the page cache.
+    """
+    fingerprint = paths.fingerprint()
+    version = version or hashlib.sha1(repr(fingerprint).encode("utf-8")).hexdigest()[:12]
+
+    # Memory-mapped compact catalog (or the JSON if it hasn't been built)
+    catalog = load_catalog(paths.catalog_dir, paths.data_path)
+
+    # Catalog embeddings, used for exact search over small filtered subsets
+    embeddings = np.load(paths.embeddings_path, mmap_mode="r" if mmap else None)
+
+    # Stable FAISS ids of each catalog row (positional for legacy indexes)
+    ids = manifest_ids(paths.manifest_path)
+    row_ids = RowIds(ids) if ids is not None else RowIds.identity(len(catalog))
+
+    # Load FAISS index and apply the nprobe/efSearch operating point chosen at build time
+    index = faiss.read_index(str(paths.index_path), index_io_flags() if mmap else 0)
+    index_metadata = load_index_metadata(paths.index_meta_path)
+    if index_metadata:
+        apply_search_params(index, index_metadata.get("search_params"))
+
+    # BM25 postings over the same rows, for hybrid retrieval
+    sparse = SparseIndex.load(paths.sparse_dir) if (paths.sparse_dir / "vocab.json").exists() else None
+
+    # Canonical-query results, as long as they were computed against these embeddings and index
+    canonical = None
+    if paths.canonical_dir is not None and (paths.canonical_dir / "canonical.json").exists():
+        canonical = CanonicalTable.load(paths.canonical_dir)
+        if canonical.index_key != index_key(paths) or canonical.embeddings.shape[1] != index.d:
+            print(f"Canonical results in {paths.canonical_dir} were built for another index; rebuild with canonical.py")
+            canonical = None
+
+    n = len(catalog)
+    if sparse is not None and sparse.size != n:
+        raise SnapshotError(f"Row count mismatch: {n} assessments, {sparse.size} documents in the BM25 index")
+    if len(embeddings) != n or index.ntotal != n or len(row_ids.ids) != n:
+        raise SnapshotError(
+            f"Row count mismatch: {n} assessments, {len(embeddings)} embeddings, "
+            f"{len(row_ids.ids)} manifest ids, {index.ntotal} indexed vectors"
+        )
+    if embeddings.shape[1] != index.d or (dimension is not None and index.d != dimension):
+        raise SnapshotError(
+            f"Dimension mismatch: embeddings {embeddings.shape[1]}, index {index.d}, model {dimension}"
+        )
+
+    return Snapshot(version, fingerprint, catalog, embeddings, row_ids, index, index_metadata, sparse, canonical)
@@ -0,0 +1,148 @@
+import json
+import re
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+from records import iter_records, replaced_atomically, save_array
+
+BASE_DIR = Path(__file__).parent
+DATA_PATH = BASE_DIR.parent / "data_process" / "processed_dataset.jsonl"
+KEYWORDS_PATH = BASE_DIR.parent / "processing" / "processed_dataset.jsonl"
+SPARSE_INDEX_DIR = BASE_DIR / "data" / "sparse_index"
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Keeps tokens like ".net", "c++", "c#", "opq32" and "9.5" intact
+TOKEN_RE = re.compile(r"\.?[a-z0-9+#]+(?:\.[a-z0-9+#]+)*")
+
+
+def tokenize(text):
+    """Lowercased unigrams plus adjacent bigrams, so "SQL Server" and "Java 8" match as phrases"""
+    words = TOKEN_RE.findall(text.lower())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def load_keywords(path=KEYWORDS_PATH):
+    """TF-IDF keywords from processing/ keyed by URL, if that dataset is present"""
+    path = Path(path)
+    if not path.exists():
+        return {}
+    return {entry["url"]: entry.get("keywords", []) for entry in iter_records(path)}
+
+
+class SparseIndex:
+    """BM25 inverted index with array-backed (CSR) postings.
+
+    Postings for term t are doc_ids[indptr[t]:indptr[t + 1]] with their
+    precomputed BM25 impact in weights[...], so a query is a handful of
+    vectorized scatter-adds and no per-document Python work.
+    """
+
+    def __init__(self, terms, indptr, doc_ids, weights, size):
+        self.terms = terms              # term -> term id
+        self.indptr = indptr            # int64, (n_terms + 1,)
+        self.doc_ids = doc_ids          # int32, catalog rows
+        self.weights = weights          # float32, BM25 impact of term in doc
+        self.size = size                # number of documents (catalog rows)
+
+    @classmethod
+    def build(cls, documents):
+        counts = [Counter(tokenize(doc)) for doc in documents]
+        lengths = np.array([sum(c.values()) for c in counts], dtype=np.float32)
+        avg_length = lengths.mean() if len(lengths) else 0.0
+
+        postings = {}
+        for row, c in enumerate(counts):
+            for term, tf in c.items():
+                postings.setdefault(term, []).append((row, tf))
+
+        n = len(documents)
+        vocabulary = sorted(postings)
+        indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        doc_ids, weights = [], []
+        for t, term in enumerate(vocabulary):
+            rows, tfs = map(np.array, zip(*postings[term]))
+            idf = np.log(1 + (n - len(rows) + 0.5) / (len(rows) + 0.5))
+            norm = K1 * (1 - B + B * lengths[rows] / avg_length)
+            doc_ids.append(rows.astype(np.int32))
+            weights.append((idf * tfs * (K1 + 1) / (tfs + norm)).astype(np.float32))
+            indptr[t + 1] = indptr[t] + len(rows)
+
+        return cls(
+            terms={term: t for t, term in enumerate(vocabulary)},
+            indptr=indptr,
+            doc_ids=np.concatenate(doc_ids) if doc_ids else np.zeros(0, dtype=np.int32),
+            weights=np.concatenate(weights) if weights else np.zeros(0, dtype=np.float32),
+            size=n,
+        )
+
+    def save(self, directory):
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        save_array(directory / "indptr.npy", self.indptr)
+        save_array(directory / "doc_ids.npy", self.doc_ids)
+        save_array(directory / "weights.npy", self.weights)
+        # Written last: its presence marks a complete index
+        vocabulary = sorted(self.terms, key=self.terms.get)
+        with replaced_atomically(directory / "vocab.json") as tmp_path, open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"size": self.size, "k1": K1, "b": B, "terms": vocabulary}, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, directory):
+        directory = Path(directory)
+        with open(directory / "vocab.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        return cls(
+            terms={term: t for t, term in enumerate(meta["terms"])},
+            indptr=np.load(directory / "indptr.npy", mmap_mode="r"),
+            doc_ids=np.load(directory / "doc_ids.npy", mmap_mode="r"),
+            weights=np.load(directory / "weights.npy", mmap_mode="r"),
+            size=meta["size"],
+        )
+
+    def scores(self, text):
+        """BM25 score of every document for the query text"""
+        scores = np.zeros(self.size, dtype=np.float32)
+        for term in set(tokenize(text)):
+            t = self.terms.get(term)
+            if t is None:
+                continue
+            start, end = self.indptr[t], self.indptr[t + 1]
+            # A term appears at most once per document, so plain fancy-index add is safe
+            scores[self.doc_ids[start:end]] += self.weights[start:end]
+        return scores
+
+    def search(self, text, k, mask=None):
+        """Top-k (scores, rows) among documents with a positive score (and in mask)"""
+        scores = self.scores(text)
+        if mask is not None:
+            scores[~mask] = 0
+        candidates = np.flatnonzero(scores > 0)
+        if k <= 0:
+            candidates = candidates[:0]
+        elif len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        order = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return scores[order], order
+
+
+def build_sparse_index():
+    keywords = load_keywords()
+
+    # BM25 needs corpus-wide statistics, but only the document text is kept
+    documents = [
+        " ".join([entry["Assessment_name"], entry["embedding_text"], *keywords.get(entry["URL"], [])])
+        for entry in iter_records(DATA_PATH)
+    ]
+    index = SparseIndex.build(documents)
+    index.save(SPARSE_INDEX_DIR)
+    print(f"Built BM25 index with {len(index.terms)} terms and {len(index.doc_ids)} postings at {SPARSE_INDEX_DIR}")
+    return index
+
+
+if __name__ == "__main__":
+    build_sparse_index()
@@ -0,0 +1,112 @@
+"""Measure the latency/throughput trade-off of the /recommend micro-batcher.
+
+Drives the batcher in-process for each (max_batch_size, max_wait_ms) setting
+and prints p50/p99 latency, throughput and the average batch size actually
+formed.
+
+By default requests arrive open-loop at --qps, each measured from its
+scheduled arrival, so they trickle in and max_wait_ms decides how many get
+coalesced. --qps 0 switches to --concurrency closed-loop clients instead; with
+as many clients as max_batch_size, batches fill whatever the wait.
+
+    python benchmarks/batching_benchmark.py --qps 500 --requests 2000
+    python benchmarks/batching_benchmark.py --qps 0 --concurrency 64
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "api"))
+
+import main  # noqa: E402
+from batching import MicroBatcher  # noqa: E402
+
+SAMPLE_QUERIES = [
+    "Java developer with strong problem solving skills",
+    "Entry level sales associate for retail stores",
+    "Bank teller with customer service experience",
+    "Senior project manager for software delivery",
+    "Python and SQL data analyst",
+    "Call center agent with English fluency",
+    "Graduate trainee for finance roles",
+    "Frontend developer, JavaScript and CSS, under 30 minutes",
+]
+
+
+async def run_config(max_batch_size, max_wait_ms, concurrency, total_requests, workers, qps=None):
+    batcher = MicroBatcher(
+        main.search_current_snapshot,
+        max_batch_size=max_batch_size,
+        max_wait_ms=max_wait_ms,
+        max_queue_size=total_requests,
+        num_workers=workers
+    )
+    await batcher.start()
+
+    latencies = []
+    counter = iter(range(total_requests))
+
+    async def client():
+        for i in counter:
+            query = main.Query(text=SAMPLE_QUERIES[i % len(SAMPLE_QUERIES)], max_results=5)
+            start = time.perf_counter()
+            await batcher.submit(query)
+            latencies.append(time.perf_counter() - start)
+
+    async def arrival(i, due):
+        delay = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await batcher.submit(main.Query(text=SAMPLE_QUERIES[i % len(SAMPLE_QUERIES)], max_results=5))
+        latencies.append(time.perf_counter() - due)
+
+    start = time.perf_counter()
+    if qps:
+        await asyncio.gather(*(arrival(i, start + i / qps) for i in range(total_requests)))
+    else:
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    stats = batcher.stats()
+    await batcher.stop()
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "max_batch_size": max_batch_size,
+        "max_wait_ms": max_wait_ms,
+        "p50_ms": np.percentile(latencies_ms, 50),
+        "p99_ms": np.percentile(latencies_ms, 99),
+        "throughput_qps": total_requests / elapsed,
+        "avg_batch_size": stats["avg_batch_size"],
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--qps", type=float, default=500, help="Open-loop arrival rate; 0 for closed-loop clients")
+    parser.add_argument("--concurrency", type=int, default=32, help="Closed-loop clients, with --qps 0")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32, 64])
+    parser.add_argument("--wait-ms", type=float, nargs="+", default=[0, 2, 5, 10])
+    args = parser.parse_args()
+
+    main.load_assets()
+    # The sample queries repeat, so keep the caches out of the measurement
+    main.embedding_cache.max_entries = 0
+    main.result_cache.max_entries = 0
+
+    print(f"{'batch':>6} {'wait_ms':>8} {'p50_ms':>8} {'p99_ms':>8} {'qps':>9} {'avg_batch':>10}")
+    for max_batch_size in args.batch_sizes:
+        for max_wait_ms in args.wait_ms:
+            r = asyncio.run(run_config(max_batch_size, max_wait_ms, args.concurrency, args.requests, args.workers,
+                                       args.qps))
+            print(f"{r['max_batch_size']:>6} {r['max_wait_ms']:>8.1f} {r['p50_ms']:>8.2f} "
+                  f"{r['p99_ms']:>8.2f} {r['throughput_qps']:>9.1f} {r['avg_batch_size']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,336 @@
+"""Benchmark the catalog crawler offline against local HTML fixtures.
+
+Catalog and detail pages are served by a local HTTP server in a separate
+process, so no request reaches the real site. Two things are measured:
+
+- crawl: the full spider (middlewares, pipelines, feeds) per crawl mode,
+  reporting pages/s, items/s, retries and backoffs. --latency-ms and
+  --error-rate make the server behave like a remote one; --refresh crawls
+  a second time with the saved validators to time a conditional refresh.
+- parse: parse_detail on every detail fixture, with the lxml tree build
+  and each entry of SHLCatalogSpider.DETAIL_SELECTORS timed separately.
+
+Fixtures are rendered from the crawled feed in the site's markup unless
+--fixtures points at saved pages laid out as <url path>/index.html
+(listing pages as <url path>/<query>.html):
+
+    python benchmarks/crawl_benchmark.py --modes adaptive polite --latency-ms 50
+    python benchmarks/crawl_benchmark.py --skip-crawl --repeats 20
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import Process
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import numpy as np
+
+CRAWLER_DIR = Path(__file__).parent.parent / "crawler"
+RECORDS_PATH = CRAWLER_DIR / "data" / "shl_products.jsonl"
+CATALOG_PATH = "/solutions/products/product-catalog/"
+PER_PAGE = 12
+
+sys.path.insert(0, str(CRAWLER_DIR))
+os.environ.setdefault("SCRAPY_SETTINGS_MODULE", "crawler.settings")
+
+from scrapy.http import HtmlResponse  # noqa: E402
+
+from crawler.spiders.shl_spider import SHLCatalogSpider  # noqa: E402
+
+# Stats copied into the crawl report: (report key, Scrapy stats key)
+CRAWL_STATS = [
+    ("pages", "response_received_count"),
+    ("items", "item_scraped_count"),
+    ("requests", "downloader/request_count"),
+    ("retries", "retry/count"),
+    ("backoffs", "backoff/count"),
+    ("max_backoff_s", "backoff/max_delay"),
+    ("not_modified", "conditional/not_modified"),
+    ("finish_reason", "finish_reason"),
+]
+
+
+def page_padding(kb):
+    """Navigation boilerplate roughly the size of the real site's header and footer"""
+    items, size, i = [], 0, 0
+    while size < kb * 1024:
+        item = f'<li class="nav__item"><a href="/solutions/menu-{i}/">Menu entry {i}</a></li>'
+        items.append(item)
+        size += len(item)
+        i += 1
+    return f'<nav><ul class="nav">{"".join(items)}</ul></nav>'
+
+
+def render_detail(record, padding):
+    test_types = "".join(f'<span class="product-catalogue__key">{t}</span>' for t in record["test_types"])
+    remote = "-yes" if record["remote_testing"] == "Yes" else "-no"
+    adaptive = ""
+    if record["adaptive_supported"] != "No Information":
+        adaptive = f'<ul><li>Adaptive/IRT: {record["adaptive_supported"]}</li></ul>'
+    return f"""<html><body>{padding}
+<div class="content__container"><h1>{record["title"]}</h1></div>
+<div class="product-catalogue-training-calendar__row"><h4>Description</h4><p>{record["description"]}</p></div>
+<div class="product-catalogue-training-calendar__row"><h4>Job levels</h4><p>{record["job_levels"]}</p></div>
+<div class="product-catalogue-training-calendar__row"><h4>Languages</h4><p>{record["languages"]}</p></div>
+<div class="product-catalogue-training-calendar__row"><h4>Assessment length</h4><p>{record["duration_minutes"]}</p></div>
+<p class="product-catalogue__small-text">Test Type: <span class="d-flex">{test_types}</span></p>
+<p class="product-catalogue__small-text">Remote Testing: <span class="catalogue__circle {remote}"></span></p>
+{adaptive}{padding}</body></html>"""
+
+
+def render_listing(records, page, n_pages, padding):
+    rows = "".join(
+        f'<tr><td class="custom__table-heading__title"><a href="{urlsplit(r["url"]).path}">{r["title"]}</a></td></tr>'
+        for r in records
+    )
+    pages = "".join(
+        f'<li class="pagination__item"><a href="{CATALOG_PATH}?start={p * PER_PAGE}&type=1">{p + 1}</a></li>'
+        for p in range(n_pages)
+    )
+    if page + 1 < n_pages:
+        pages += f'<li class="pagination__item -next"><a href="{CATALOG_PATH}?start={(page + 1) * PER_PAGE}&type=1">Next</a></li>'
+    return f'<html><body>{padding}<table>{rows}</table><ul class="pagination">{pages}</ul>{padding}</body></html>'
+
+
+def fixture_path(root, path, query=""):
+    return Path(root) / path.strip("/") / (f"{query}.html" if query else "index.html")
+
+
+def render_fixtures(records, root, padding_kb):
+    padding = page_padding(padding_kb)
+    n_pages = -(-len(records) // PER_PAGE)
+    for page in range(n_pages):
+        query = f"start={page * PER_PAGE}&type=1" if page else ""
+        path = fixture_path(root, CATALOG_PATH, query)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(render_listing(records[page * PER_PAGE:(page + 1) * PER_PAGE], page, n_pages, padding),
+                        encoding="utf-8")
+    for record in records:
+        path = fixture_path(root, urlsplit(record["url"]).path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(render_detail(record, padding), encoding="utf-8")
+
+
+class FixtureHandler(SimpleHTTPRequestHandler):
+    """Serves fixture files, with optional per-request latency and 503s.
+
+    If-Modified-Since is answered with 304 by the base class, so refresh
+    crawls exercise the conditional fetch path.
+    """
+
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+    error_rate = 0.0
+    rng = random.Random(0)
+    lock = threading.Lock()
+
+    def translate_path(self, path):
+        parts = urlsplit(path)
+        return str(fixture_path(self.directory, parts.path, parts.query))
+
+    def do_GET(self):
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            fail = self.rng.random() < self.error_rate
+        if fail:
+            self.send_response(503)
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        super().do_GET()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(root, port, latency, error_rate):
+    FixtureHandler.latency = latency
+    FixtureHandler.error_rate = error_rate
+    server = ThreadingHTTPServer(("127.0.0.1", port), partial(FixtureHandler, directory=str(root)))
+    server.daemon_threads = True
+    server.serve_forever()
+
+
+def run_crawls(runs, start_url, overrides, log_level):
+    """Run each (name, mode, state dir) crawl in turn in one reactor; returns stats dicts"""
+    from scrapy.utils.project import get_project_settings
+    from scrapy.utils.reactor import install_reactor
+
+    install_reactor(get_project_settings()["TWISTED_REACTOR"])
+    from scrapy.crawler import CrawlerRunner
+    from twisted.internet import defer, reactor
+
+    results = []
+
+    @defer.inlineCallbacks
+    def crawl_all():
+        try:
+            for name, mode, state_dir in runs:
+                settings = get_project_settings()
+                settings.setdict({
+                    "CRAWL_MODE": mode,
+                    "LOG_LEVEL": log_level,
+                    "ROBOTSTXT_OBEY": False,
+                    "TELNETCONSOLE_ENABLED": False,
+                    "FEEDS": {str(state_dir / "changed_products.jsonl"): {"format": "jsonlines", "overwrite": True}},
+                    "CATALOG_SNAPSHOT": str(state_dir / "shl_products.jsonl"),
+                    "REMOVED_FEED": str(state_dir / "removed_products.jsonl"),
+                    "CONDITIONAL_FETCH_STATE": str(state_dir / "http_validators.json"),
+                    **overrides,
+                }, priority="cmdline")
+                runner = CrawlerRunner(settings)
+                crawler = runner.create_crawler(SHLCatalogSpider)
+                start = time.perf_counter()
+                yield runner.crawl(crawler, start_url=start_url)
+                elapsed = time.perf_counter() - start
+                stats = crawler.stats.get_stats()
+                result = {"run": name, "mode": mode, "elapsed_s": round(elapsed, 3)}
+                result.update({key: stats.get(stat, 0) for key, stat in CRAWL_STATS})
+                result["pages_per_s"] = round(result["pages"] / elapsed, 2)
+                result["items_per_s"] = round(result["items"] / elapsed, 2)
+                results.append(result)
+        finally:
+            reactor.stop()
+
+    reactor.callWhenRunning(crawl_all)
+    reactor.run()
+    return results
+
+
+def detail_fixtures(root):
+    return sorted(path for path in Path(root).rglob("index.html") if "/view/" in path.as_posix())
+
+
+def bench_parse(paths, repeats):
+    """Mean microseconds per page for the tree build, each selector and the whole parse_detail"""
+    spider = SHLCatalogSpider()
+    pages = [(f"http://fixtures{path.parent.as_posix()}/", path.read_bytes()) for path in paths]
+    timings = {name: [] for name in ["tree", *spider.DETAIL_SELECTORS, "parse_detail"]}
+
+    for _ in range(repeats):
+        for url, body in pages:
+            response = HtmlResponse(url, body=body, encoding="utf-8")
+            start = time.perf_counter_ns()
+            response.selector
+            timings["tree"].append(time.perf_counter_ns() - start)
+            for field in spider.DETAIL_SELECTORS:
+                start = time.perf_counter_ns()
+                spider.select(response, field).getall()
+                timings[field].append(time.perf_counter_ns() - start)
+
+            response = HtmlResponse(url, body=body, encoding="utf-8")
+            start = time.perf_counter_ns()
+            list(spider.parse_detail(response))
+            timings["parse_detail"].append(time.perf_counter_ns() - start)
+
+    report = {}
+    for name, samples in timings.items():
+        samples = np.array(samples) / 1000
+        report[name] = {"mean_us": round(float(samples.mean()), 1), "p99_us": round(float(np.percentile(samples, 99)), 1)}
+    report["pages_per_s"] = round(1e6 / report["parse_detail"]["mean_us"], 1)
+    report["pages"] = len(pages)
+    report["mean_page_kb"] = round(sum(len(body) for _, body in pages) / len(pages) / 1024, 1)
+    return report
+
+
+def print_crawls(results):
+    print(f"{'run':<18} {'pages':>6} {'items':>6} {'elapsed s':>10} {'pages/s':>8} {'items/s':>8} "
+          f"{'retries':>8} {'backoffs':>9} {'304s':>5}")
+    for r in results:
+        print(f"{r['run']:<18} {r['pages']:>6} {r['items']:>6} {r['elapsed_s']:>10} {r['pages_per_s']:>8} "
+              f"{r['items_per_s']:>8} {r['retries']:>8} {r['backoffs']:>9} {r['not_modified']:>5}")
+
+
+def print_parse(report):
+    print(f"\nparse_detail over {report['pages']} pages ({report['mean_page_kb']} KB average), "
+          f"{report['pages_per_s']} pages/s")
+    print(f"{'stage':<20} {'mean us':>9} {'p99 us':>9}")
+    for name, timing in report.items():
+        if isinstance(timing, dict):
+            print(f"{name:<20} {timing['mean_us']:>9} {timing['p99_us']:>9}")
+
+
+def parse_override(text):
+    key, _, value = text.partition("=")
+    try:
+        return key, json.loads(value)
+    except json.JSONDecodeError:
+        return key, value
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=Path, default=RECORDS_PATH, help="Crawled feed to render fixtures from")
+    parser.add_argument("--fixtures", type=Path, help="Saved pages to serve instead of rendered ones")
+    parser.add_argument("--padding-kb", type=int, default=40, help="Boilerplate added to each rendered page")
+    parser.add_argument("--modes", nargs="+", default=["adaptive"], help="CRAWL_MODE values to compare")
+    parser.add_argument("--max-items", type=int, default=0, help="CLOSESPIDER_ITEMCOUNT for every run")
+    parser.add_argument("--set", dest="overrides", type=parse_override, action="append", default=[],
+                        metavar="SETTING=VALUE", help="Extra Scrapy setting, e.g. --set CONCURRENT_REQUESTS_PER_DOMAIN=16")
+    parser.add_argument("--refresh", action="store_true", help="Crawl each mode again using the saved validators")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Server think time per request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with 503")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--repeats", type=int, default=5, help="Passes over the detail pages for the parse benchmark")
+    parser.add_argument("--skip-crawl", action="store_true")
+    parser.add_argument("--skip-parse", action="store_true")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--output", type=Path, help="Write the JSON report here")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="crawl-bench-") as tmp:
+        tmp = Path(tmp)
+        root = args.fixtures
+        if root is None:
+            root = tmp / "site"
+            with open(args.records, "r", encoding="utf-8") as f:
+                records = [json.loads(line) for line in f if line.strip()]
+            render_fixtures(records, root, args.padding_kb)
+            print(f"Rendered {len(records)} detail pages and {-(-len(records) // PER_PAGE)} listing pages")
+
+        report = {"config": {k: str(v) if isinstance(v, Path) else v for k, v in vars(args).items()}}
+
+        if not args.skip_crawl:
+            server = Process(target=serve, args=(root, args.port, args.latency_ms / 1000, args.error_rate),
+                             daemon=True)
+            server.start()
+            time.sleep(0.5)
+            if not server.is_alive():
+                sys.exit(f"Fixture server failed to start on port {args.port}")
+            try:
+                runs = []
+                for mode in args.modes:
+                    state_dir = tmp / f"state-{mode}"
+                    state_dir.mkdir()
+                    runs.append((mode, mode, state_dir))
+                    if args.refresh:
+                        runs.append((f"{mode} (refresh)", mode, state_dir))
+                overrides = {"CLOSESPIDER_ITEMCOUNT": args.max_items, **dict(args.overrides)}
+                start_url = f"http://127.0.0.1:{args.port}{CATALOG_PATH}"
+                report["crawl"] = run_crawls(runs, start_url, overrides, args.log_level)
+            finally:
+                server.terminate()
+            print_crawls(report["crawl"])
+
+        if not args.skip_parse:
+            report["parse"] = bench_parse(detail_fixtures(root), args.repeats)
+            print_parse(report["parse"])
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote report to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
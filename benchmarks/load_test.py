@@ -0,0 +1,318 @@
+"""Load-test /recommend and record client-side latency, throughput and errors.
+
+Runs either in-process against the ASGI app (no network, the real
+startup path) or over HTTP against a running server:
+
+    python benchmarks/load_test.py --mode asgi --concurrency 32 --duration 30
+    python benchmarks/load_test.py --mode http --url http://localhost:8000 --qps 200 --duration 60
+
+With --qps the load is open-loop: request i is due at start + i/qps and its
+latency is measured from that due time, so a stalled server is charged for
+the requests that queued up behind it. Without --qps each client sends its
+next request as soon as the previous one returns.
+
+--output writes a JSON report; --baseline compares against an earlier one
+and exits non-zero when latency, throughput or error rate regress beyond
+--tolerance.
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+import numpy as np
+
+API_DIR = Path(__file__).parent.parent / "api"
+
+# (weight, request body); filters and fusion appear in roughly the share of
+# traffic the frontend sends them
+DEFAULT_MIX = [
+    (4, {"text": "Java developer with strong problem solving skills", "max_results": 5}),
+    (4, {"text": "Entry level sales associate for retail stores", "max_results": 5}),
+    (3, {"text": "Bank teller with customer service experience", "max_results": 10}),
+    (3, {"text": "Senior project manager for software delivery", "max_results": 5}),
+    (3, {"text": "Python and SQL data analyst", "max_results": 5,
+         "filters": {"max_duration": 30}}),
+    (2, {"text": "Call center agent with English fluency", "max_results": 10,
+         "filters": {"remote_testing": True, "test_types": ["Simulations"]}}),
+    (2, {"text": "Graduate trainee for finance roles", "max_results": 5,
+         "filters": {"job_levels": ["Graduate", "Entry-Level"]}}),
+    (2, {"text": "SQL Server and .NET backend engineer", "max_results": 5,
+         "fusion": {"method": "rrf"}}),
+    (1, {"text": "Leadership personality questionnaire for executives", "max_results": 20}),
+    (1, {"text": "Frontend developer, JavaScript and CSS, under 30 minutes", "max_results": 5,
+         "filters": {"max_duration": 30}, "fusion": {"method": "weighted"}}),
+]
+
+# Percentiles reported for every run
+PERCENTILES = (50, 90, 95, 99, 99.9)
+
+# Report fields compared against a baseline: (path, direction), where
+# +1 means higher is worse
+REGRESSION_CHECKS = [
+    (("latency_ms", "p50"), 1),
+    (("latency_ms", "p95"), 1),
+    (("latency_ms", "p99"), 1),
+    (("throughput_rps",), -1),
+]
+# Absolute increase in error rate that counts as a regression
+ERROR_RATE_TOLERANCE = 0.01
+
+
+class LatencyHistogram:
+    """Log-linear latency histogram in the style of HdrHistogram.
+
+    Values (microseconds) are bucketed with a fixed relative precision of
+    1 / sub_buckets, so memory stays constant however long the run and two
+    histograms can be merged by adding counts.
+    """
+
+    def __init__(self, sub_buckets=128, max_value_us=60_000_000):
+        self.sub_buckets = sub_buckets
+        self.counts = np.zeros(self._bucket(max_value_us) + 1, dtype=np.int64)
+        self.total = 0
+        self.max = 0
+        self.sum = 0
+
+    def _bucket(self, value):
+        if value < self.sub_buckets:
+            return int(value)
+        exponent = (value // self.sub_buckets).bit_length() - 1
+        return self.sub_buckets * (exponent + 1) + int(value / 2 ** exponent) - self.sub_buckets
+
+    def _lower_bound(self, bucket):
+        if bucket < self.sub_buckets:
+            return bucket
+        exponent, offset = divmod(bucket, self.sub_buckets)
+        return (self.sub_buckets + offset) * 2 ** (exponent - 1)
+
+    def record(self, seconds):
+        value = max(0, int(seconds * 1e6))
+        self.counts[min(self._bucket(value), len(self.counts) - 1)] += 1
+        self.total += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        self.counts += other.counts
+        self.total += other.total
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def percentile(self, p):
+        """Lower bound of the bucket holding the p-th percentile, in microseconds"""
+        if not self.total:
+            return 0
+        rank = max(1, math.ceil(p / 100 * self.total))
+        bucket = int(np.searchsorted(np.cumsum(self.counts), rank))
+        return min(self._lower_bound(bucket), self.max)
+
+    def summary_ms(self):
+        summary = {f"p{p:g}": round(self.percentile(p) / 1000, 3) for p in PERCENTILES}
+        summary["max"] = round(self.max / 1000, 3)
+        summary["mean"] = round(self.sum / self.total / 1000, 3) if self.total else 0.0
+        return summary
+
+
+def load_mix(path=None):
+    if path is None:
+        return DEFAULT_MIX
+    with open(path, "r", encoding="utf-8") as f:
+        return [(item.get("weight", 1), item["body"]) for item in json.load(f)]
+
+
+def request_plan(mix, n, seed):
+    """n request bodies drawn from the weighted mix, fixed for a given seed"""
+    weights = [w for w, _ in mix]
+    bodies = [b for _, b in mix]
+    return random.Random(seed).choices(bodies, weights=weights, k=n)
+
+
+async def run_load(client, endpoint, plan, concurrency, qps=None, duration=None):
+    histogram = LatencyHistogram()
+    statuses = {}
+    errors = {}
+    next_request = iter(range(len(plan)))
+    start = time.perf_counter()
+    deadline = start + duration if duration else None
+
+    async def worker():
+        for i in next_request:
+            due = start + i / qps if qps else time.perf_counter()
+            if deadline and due >= deadline:
+                return
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                response = await client.post(endpoint, json=plan[i])
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+                # Read the body so JSON decoding cost is part of the latency
+                response.json()
+            except Exception as e:
+                errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+            histogram.record(time.perf_counter() - due)
+            # In-process (ASGITransport), a result-cache hit completes without ever
+            # suspending; yield so this worker can't hold the loop for the whole run
+            await asyncio.sleep(0)
+            if deadline and time.perf_counter() >= deadline:
+                return
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    ok = statuses.get(200, 0)
+    failed = histogram.total - ok
+    return {
+        "requests": histogram.total,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(ok / elapsed, 2) if elapsed else 0.0,
+        "error_rate": round(failed / histogram.total, 4) if histogram.total else 0.0,
+        "status_codes": {str(code): count for code, count in sorted(statuses.items())},
+        "exceptions": errors,
+        "latency_ms": histogram.summary_ms(),
+    }
+
+
+async def run_asgi(args, plan):
+    """Drive the app in-process, with startup/shutdown run as uvicorn would"""
+    sys.path.insert(0, str(API_DIR))
+    import main
+
+    main.load_assets()
+    await main.start_batcher()
+    if args.no_cache:
+        main.embedding_cache.max_entries = 0
+        main.result_cache.max_entries = 0
+    try:
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as client:
+            return await run_phases(client, args, plan)
+    finally:
+        await main.stop_batcher()
+
+
+async def run_http(args, plan):
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+        return await run_phases(client, args, plan)
+
+
+async def run_phases(client, args, plan):
+    if args.warmup:
+        await run_load(client, args.endpoint, plan[:args.warmup], args.concurrency)
+    return await run_load(client, args.endpoint, plan[args.warmup:], args.concurrency, args.qps, args.duration)
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline, tolerance):
+    """Rows of (metric, baseline, current, change, regressed)"""
+    rows = []
+    for path, direction in REGRESSION_CHECKS:
+        old, new = baseline["result"], report["result"]
+        for key in path:
+            old, new = old[key], new[key]
+        change = (new - old) / old if old else 0.0
+        rows.append((".".join(path), old, new, change, direction * change > tolerance))
+    old, new = baseline["result"]["error_rate"], report["result"]["error_rate"]
+    rows.append(("error_rate", old, new, new - old, new - old > ERROR_RATE_TOLERANCE))
+    return rows
+
+
+def print_result(result):
+    latency = result["latency_ms"]
+    print(f"requests={result['requests']} elapsed={result['elapsed_s']}s "
+          f"throughput={result['throughput_rps']} req/s error_rate={result['error_rate']:.2%}")
+    print("latency ms: " + " ".join(f"{name}={value}" for name, value in latency.items()))
+    if result["exceptions"] or set(result["status_codes"]) - {"200"}:
+        print(f"status codes: {result['status_codes']} exceptions: {result['exceptions']}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["asgi", "http"], default="asgi")
+    parser.add_argument("--url", default="http://localhost:8000", help="Server for --mode http")
+    parser.add_argument("--endpoint", default="/recommend")
+    parser.add_argument("--concurrency", type=int, default=16, help="Requests in flight at most")
+    parser.add_argument("--qps", type=float, help="Target arrival rate (open loop); default is closed loop")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--duration", type=float, help="Stop after this many seconds")
+    parser.add_argument("--warmup", type=int, default=50, help="Requests sent before measuring")
+    parser.add_argument("--mix", type=Path, help='JSON list of {"weight", "body"} replacing the default mix')
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-cache", action="store_true", help="Disable the API caches (asgi mode only)")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--output", type=Path, help="Write the JSON report here")
+    parser.add_argument("--baseline", type=Path, help="Earlier report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="Allowed relative worsening of latency/throughput vs the baseline")
+    args = parser.parse_args()
+
+    # With a duration, plan enough requests to keep the target rate busy
+    n = args.requests
+    if args.duration and args.qps:
+        n = max(n, int(args.duration * args.qps) + 1)
+    elif args.duration:
+        n = max(n, 1_000_000)
+    plan = request_plan(load_mix(args.mix), n + args.warmup, args.seed)
+
+    # Read before the run: --output may overwrite the same file
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    runner = run_asgi if args.mode == "asgi" else run_http
+    result = asyncio.run(runner(args, plan))
+    print_result(result)
+
+    report = {
+        "revision": git_revision(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {
+            "mode": args.mode,
+            "endpoint": args.endpoint,
+            "concurrency": args.concurrency,
+            "qps": args.qps,
+            "requests": args.requests,
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "mix": str(args.mix) if args.mix else "default",
+            "seed": args.seed,
+            "no_cache": args.no_cache,
+        },
+        "result": result,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote report to {args.output}")
+
+    if baseline is not None:
+        if baseline.get("config") != report["config"]:
+            print("Warning: baseline was recorded with a different configuration")
+        rows = compare(report, baseline, args.tolerance)
+        print(f"\n{'metric':<18} {'baseline':>10} {'current':>10} {'change':>8}")
+        for name, old, new, change, regressed in rows:
+            print(f"{name:<18} {old:>10} {new:>10} {change:>+8.1%}" + ("  REGRESSION" if regressed else ""))
+        regressions = [row[0] for row in rows if row[4]]
+        if regressions:
+            print(f"Regressed vs {baseline.get('revision') or args.baseline}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,101 @@
+"""Measure serialization cost and payload size of each /recommend/batch response format.
+
+Searches a batch of sample queries once, then for every format the server
+can produce here (display JSON, compact JSON, MessagePack, Arrow) times
+hydrating and serializing the results exactly as the endpoint does, and
+the gzip/brotli compression the middleware would add on top. Search time
+is left out: it is the same whatever the format.
+
+    python benchmarks/response_formats_benchmark.py --queries 200 --max-results 10 --fields id,name,url,score
+"""
+import argparse
+import gzip
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "api"))
+
+import main  # noqa: E402
+from responses import AVAILABLE_FORMATS, encode, parse_fields  # noqa: E402
+
+SAMPLE_QUERIES = [
+    "Java developer with strong problem solving skills",
+    "Entry level sales associate for retail stores",
+    "Bank teller with customer service experience",
+    "Senior project manager for software delivery",
+    "Python and SQL data analyst",
+    "Call center agent with English fluency",
+    "Graduate trainee for finance roles",
+    "Frontend developer, JavaScript and CSS, under 30 minutes",
+]
+
+
+def response_body(fmt, snap, queries, hits, fields):
+    """The body /recommend/batch sends for these results in `fmt`"""
+    if fmt == "arrow":
+        return main.arrow_batch(snap, hits, fields, {"snapshot_version": snap.version})
+    results = [
+        {"query": query.text, "results": query_results}
+        for query, query_results in zip(queries, main.hydrate(snap, hits, fmt, fields))
+    ]
+    if fmt == "json":
+        return json.dumps({"snapshot_version": snap.version, "results": results}, ensure_ascii=False).encode("utf-8")
+    return encode(fmt, {"snapshot_version": snap.version, "results": results})
+
+
+def compressors():
+    available = {"gzip": lambda body: gzip.compress(body, compresslevel=5)}
+    try:
+        import brotli
+        available["br"] = lambda body: brotli.compress(body, quality=4)
+    except ImportError:
+        print("brotli is not installed; skipping br")
+    return available
+
+
+def best_ms(fn, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000, result
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=100, help="Queries in the batch")
+    parser.add_argument("--max-results", type=int, default=10)
+    parser.add_argument("--fields", help="Typed fields for the non-JSON formats (default: all but id and score)")
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    main.load_assets(warm=False)
+    snap = main.snapshot
+    fields = parse_fields(args.fields)
+    queries = [main.Query(text=SAMPLE_QUERIES[i % len(SAMPLE_QUERIES)], max_results=args.max_results)
+               for i in range(args.queries)]
+    hits = main.search_queries(queries, snap, check_result_cache=False)
+    missing = [fmt for fmt in main.MEDIA_TYPES if fmt not in AVAILABLE_FORMATS]
+    if missing:
+        print(f"Not installed here, skipped: {', '.join(missing)}")
+
+    codings = compressors()
+    print(f"{args.queries} queries x {args.max_results} results; typed fields: {','.join(fields)}")
+    header = f"{'format':<8} {'serialize_ms':>12} {'bytes':>9}"
+    for coding in codings:
+        header += f" {coding + '_ms':>9} {coding + '_bytes':>9}"
+    print(header)
+    for fmt in AVAILABLE_FORMATS:
+        ms, body = best_ms(lambda: response_body(fmt, snap, queries, hits, fields), args.repeats)
+        line = f"{fmt:<8} {ms:>12.2f} {len(body):>9}"
+        for compress in codings.values():
+            compress_ms, compressed = best_ms(lambda: compress(body), args.repeats)
+            line += f" {compress_ms:>9.2f} {len(compressed):>9}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main_cli()
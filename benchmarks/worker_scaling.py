@@ -0,0 +1,170 @@
+"""Measure memory per worker and throughput scaling of the pre-fork server.
+
+For each worker count, starts api/serve.py, drives /recommend with the
+load-test mix, then reads rss/pss/uss of the parent and of every worker
+from /proc. Configurations:
+
+    prefork   snapshot (and PyTorch encoder) loaded once, then forked; index
+              and embeddings memory-mapped
+    isolated  --no-preload --no-mmap: every worker loads its own copy, as
+              with uvicorn --workers
+
+    python benchmarks/worker_scaling.py --workers 1 2 4 8 --configs prefork isolated --duration 20
+
+pss is the number to compare: shared pages are split between the processes
+mapping them, so the sum over processes is the real footprint. The load
+generator runs on this host too and competes for the same cores.
+"""
+import argparse
+import asyncio
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from load_test import load_mix, request_plan, run_load
+
+API_DIR = Path(__file__).parent.parent / "api"
+sys.path.insert(0, str(API_DIR))
+
+from telemetry import process_memory  # noqa: E402
+
+CONFIGS = {
+    "prefork": [],
+    "isolated": ["--no-preload", "--no-mmap"],
+}
+MB = 1024 * 1024
+
+
+def child_pids(pid):
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children", "r") as f:
+            return [int(p) for p in f.read().split()]
+    except OSError:
+        return []
+
+
+def wait_ready(url, proc, n_workers, timeout):
+    """Block until n_workers distinct workers have answered the health check"""
+    seen = set()
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"serve.py exited with status {proc.returncode}")
+        try:
+            # A new connection per probe, so probes spread over the workers
+            response = httpx.get(url + "/", timeout=5)
+            if response.status_code == 200:
+                seen.add(response.json()["worker_pid"])
+                if len(seen) >= n_workers:
+                    return time.monotonic()
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.05)
+    raise RuntimeError(f"Only {len(seen)} of {n_workers} workers ready after {timeout}s")
+
+
+async def drive(url, plan, args):
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=args.timeout) as client:
+        await run_load(client, "/recommend", plan[:args.warmup], args.concurrency)
+        return await run_load(client, "/recommend", plan[args.warmup:], args.concurrency, duration=args.duration)
+
+
+def memory_mb(pid):
+    memory = process_memory(pid) or {}
+    return {kind: round(value / MB, 1) for kind, value in memory.items()}
+
+
+def measure(config, n_workers, plan, args):
+    url = f"http://127.0.0.1:{args.port}"
+    command = [sys.executable, "serve.py", "--workers", str(n_workers), "--port", str(args.port),
+               "--host", "127.0.0.1", *CONFIGS[config]]
+    with tempfile.TemporaryFile() as log:
+        start = time.monotonic()
+        proc = subprocess.Popen(command, cwd=API_DIR, stdout=log, stderr=subprocess.STDOUT)
+        try:
+            ready = wait_ready(url, proc, n_workers, args.startup_timeout)
+            result = asyncio.run(drive(url, plan, args))
+            # Read after the load, once every worker has touched what it serves from
+            workers = [memory_mb(pid) for pid in child_pids(proc.pid)]
+            parent = memory_mb(proc.pid)
+        except Exception:
+            log.seek(0)
+            print(log.read().decode("utf-8", "replace")[-2000:], file=sys.stderr)
+            raise
+        finally:
+            proc.terminate()
+            try:
+                proc.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+
+    def mean(kind):
+        return round(sum(w.get(kind, 0) for w in workers) / len(workers), 1) if workers else 0.0
+
+    return {
+        "config": config,
+        "workers": n_workers,
+        "startup_s": round(ready - start, 2),
+        "throughput_rps": result["throughput_rps"],
+        "error_rate": result["error_rate"],
+        "latency_ms": result["latency_ms"],
+        "parent_mb": parent,
+        "worker_mean_mb": {"rss": mean("rss"), "pss": mean("pss"), "uss": mean("uss")},
+        "total_pss_mb": round(parent.get("pss", 0) + sum(w.get("pss", 0) for w in workers), 1),
+    }
+
+
+def print_report(rows):
+    print(f"\n{'config':<10} {'workers':>7} {'req/s':>8} {'speedup':>8} {'p50 ms':>7} {'p99 ms':>7} "
+          f"{'rss/w':>7} {'pss/w':>7} {'uss/w':>7} {'total pss':>10} {'start s':>8}")
+    first = {}
+    for r in rows:
+        # Relative to the first (smallest) worker count run for this config
+        base = first.setdefault(r["config"], r)
+        speedup = r["throughput_rps"] / base["throughput_rps"] if base["throughput_rps"] else 0.0
+        m = r["worker_mean_mb"]
+        print(f"{r['config']:<10} {r['workers']:>7} {r['throughput_rps']:>8} {speedup:>7.2f}x "
+              f"{r['latency_ms']['p50']:>7} {r['latency_ms']['p99']:>7} {m['rss']:>7} {m['pss']:>7} {m['uss']:>7} "
+              f"{r['total_pss_mb']:>10} {r['startup_s']:>8}")
+    print("Memory in MB; rss/pss/uss are means per worker, total pss includes the parent")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--configs", nargs="+", choices=sorted(CONFIGS), default=["prefork", "isolated"])
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=20.0, help="Measured seconds per run")
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--mix", type=Path, help='JSON list of {"weight", "body"} replacing the default mix')
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--startup-timeout", type=float, default=300.0)
+    parser.add_argument("--output", type=Path, help="Write the JSON report here")
+    args = parser.parse_args()
+
+    plan = request_plan(load_mix(args.mix), 1_000_000, args.seed)
+    rows = []
+    for config in args.configs:
+        for n_workers in args.workers:
+            print(f"{config}: {n_workers} worker(s)...")
+            rows.append(measure(config, n_workers, plan, args))
+    print_report(rows)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"created_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "config": vars(args) | {"mix": str(args.mix)},
+                       "runs": rows}, f, indent=2, default=str)
+        print(f"Wrote report to {args.output}")
+
+
+if __name__ == "__main__":
+    main_cli()
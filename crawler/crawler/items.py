@@ -6,7 +6,16 @@
 import scrapy
 
 
-class CrawlerItem(scrapy.Item):
-    # define the fields for your item here like:
-    # name = scrapy.Field()
-    pass
+class AssessmentItem(scrapy.Item):
+    """One product catalog page, as written to data/shl_products.jsonl"""
+    title = scrapy.Field()
+    url = scrapy.Field()
+    description = scrapy.Field()
+    job_levels = scrapy.Field()
+    languages = scrapy.Field()
+    duration_minutes = scrapy.Field()
+    test_types = scrapy.Field()
+    remote_testing = scrapy.Field()
+    adaptive_supported = scrapy.Field()
+    # sha256 of the normalized fields other than url; set by NormalizePipeline
+    content_hash = scrapy.Field()
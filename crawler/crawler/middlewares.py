@@ -3,7 +3,14 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
 from scrapy import signals
+from scrapy.exceptions import IgnoreRequest, NotConfigured
 
 # useful for handling different item types with a single interface
 from itemadapter import is_item, ItemAdapter
@@ -101,3 +108,160 @@ class CrawlerDownloaderMiddleware:
 
     def spider_opened(self, spider):
         spider.logger.info("Spider opened: %s" % spider.name)
+
+
+# Sent with url= when a conditional request finds the page unchanged, so the
+# pipeline can keep the previous record instead of treating the page as gone
+page_unchanged = object()
+
+
+class ConditionalFetchMiddleware:
+    """HTTP cache of validators keyed by URL, for cheap refresh crawls.
+
+    Requests with meta["conditional"] carry If-None-Match / If-Modified-Since
+    from the last crawl. A 304, or a 200 whose body hashes the same as last
+    time (servers that ignore validators), is dropped here with
+    IgnoreRequest, so unchanged detail pages are neither parsed nor re-yielded.
+    Validators persist in CONDITIONAL_FETCH_STATE as
+    {url: {"etag", "last_modified", "body_hash", "fetched_at"}}.
+    """
+
+    def __init__(self, state_path, stats, crawler_signals):
+        self.state_path = Path(state_path)
+        self.stats = stats
+        self.signals = crawler_signals
+        self.entries = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool("CONDITIONAL_FETCH_ENABLED", True):
+            raise NotConfigured
+        middleware = cls(settings.get("CONDITIONAL_FETCH_STATE", "data/http_validators.json"),
+                         crawler.stats, crawler.signals)
+        # Validators are only useful while the records they vouch for still exist
+        if Path(settings.get("CATALOG_SNAPSHOT", "data/shl_products.jsonl")).exists():
+            middleware.load()
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        return middleware
+
+    def load(self):
+        if self.state_path.exists():
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    def process_request(self, request, spider):
+        if not request.meta.get("conditional"):
+            return None
+        entry = self.entries.get(request.url)
+        if entry:
+            if entry.get("etag"):
+                request.headers.setdefault("If-None-Match", entry["etag"])
+            if entry.get("last_modified"):
+                request.headers.setdefault("If-Modified-Since", entry["last_modified"])
+        return None
+
+    def process_response(self, request, response, spider):
+        if not request.meta.get("conditional"):
+            return response
+        if response.status == 304 and request.url in self.entries:
+            self.entries[request.url]["fetched_at"] = int(time.time())
+            self._unchanged(request, "not_modified")
+        if response.status != 200:
+            return response
+
+        body_hash = hashlib.sha256(response.body).hexdigest()
+        previous = self.entries.get(request.url)
+        self.entries[request.url] = {
+            "etag": self._header(response, b"ETag"),
+            "last_modified": self._header(response, b"Last-Modified"),
+            "body_hash": body_hash,
+            "fetched_at": int(time.time()),
+        }
+        if previous and previous.get("body_hash") == body_hash:
+            self._unchanged(request, "same_body")
+        self.stats.inc_value("conditional/downloaded")
+        return response
+
+    def _unchanged(self, request, reason):
+        self.stats.inc_value(f"conditional/{reason}")
+        self.signals.send_catch_log(signal=page_unchanged, url=request.url)
+        raise IgnoreRequest(f"Unchanged since last crawl ({reason}): {request.url}")
+
+    @staticmethod
+    def _header(response, name):
+        value = response.headers.get(name)
+        return value.decode("latin-1") if value else None
+
+    def spider_closed(self, spider):
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.state_path.with_name(self.state_path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.state_path)
+
+
+class BackoffMiddleware:
+    """Exponential backoff for a domain whose requests keep failing.
+
+    Sees responses before ConditionalFetchMiddleware and RetryMiddleware.
+    Each retryable status or download
+    error raises the download slot's delay to
+    RETRY_BACKOFF_BASE * 2 ** (failures - 1) seconds, or to the server's
+    Retry-After if that is longer, capped at RETRY_BACKOFF_MAX. The next
+    successful response restores the delay the slot had before, and
+    AutoThrottle (when enabled) carries on from there.
+    """
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.base = settings.getfloat("RETRY_BACKOFF_BASE", 1.0)
+        self.max_delay = settings.getfloat("RETRY_BACKOFF_MAX", 60.0)
+        self.retry_http_codes = {int(code) for code in settings.getlist("RETRY_HTTP_CODES")}
+        self.failures = {}     # slot key -> consecutive failures
+        self.saved_delay = {}  # slot key -> delay before backing off
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("RETRY_ENABLED"):
+            raise NotConfigured
+        return cls(crawler)
+
+    def process_response(self, request, response, spider):
+        if response.status in self.retry_http_codes:
+            self._back_off(request, response.headers.get(b"Retry-After"))
+        elif response.status < 400:
+            self._recover(request)
+        return response
+
+    def process_exception(self, request, exception, spider):
+        if not isinstance(exception, IgnoreRequest):
+            self._back_off(request)
+        return None
+
+    def _slot(self, request):
+        key = request.meta.get("download_slot")
+        return key, self.crawler.engine.downloader.slots.get(key)
+
+    def _back_off(self, request, retry_after=None):
+        key, slot = self._slot(request)
+        if slot is None:
+            return
+        failures = self.failures[key] = self.failures.get(key, 0) + 1
+        self.saved_delay.setdefault(key, slot.delay)
+        delay = self.base * 2 ** (failures - 1)
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass  # HTTP-date form; the exponential delay stands
+        slot.delay = min(max(slot.delay, delay), self.max_delay)
+        self.stats.inc_value("backoff/count")
+        self.stats.max_value("backoff/max_delay", slot.delay)
+
+    def _recover(self, request):
+        key, slot = self._slot(request)
+        if self.failures.pop(key, None) is not None and slot is not None:
+            slot.delay = self.saved_delay.pop(key, slot.delay)
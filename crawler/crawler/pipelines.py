@@ -3,11 +3,203 @@
 # Don't forget to add your pipeline to the ITEM_PIPELINES setting
 # See: https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+from urllib.parse import urlsplit, urlunsplit
+
+from scrapy import signals
+from scrapy.exceptions import DropItem
 
 # useful for handling different item types with a single interface
 from itemadapter import ItemAdapter
 
+from crawler.middlewares import page_unchanged
+
+REQUIRED_FIELDS = ("title", "url", "description")
+TEXT_FIELDS = (
+    "title", "description", "job_levels", "languages",
+    "duration_minutes", "remote_testing", "adaptive_supported",
+)
+# Fields that describe the page itself; the URL is its identity, not content
+CONTENT_FIELDS = TEXT_FIELDS + ("test_types",)
+
+# Sent with url= when a page is dropped for repeating another URL's content, so
+# change tracking knows the page still exists and doesn't report it removed
+duplicate_content = object()
+
+
+def canonical_url(url):
+    """Detail page URL without query, fragment or case differences in the host"""
+    parts = urlsplit(url.strip())
+    path = parts.path if parts.path.endswith("/") else parts.path + "/"
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, "", ""))
+
+
+def content_hash(item):
+    adapter = ItemAdapter(item)
+    content = {field: adapter.get(field) for field in CONTENT_FIELDS}
+    return hashlib.sha256(json.dumps(content, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def read_jsonl(path):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class NormalizePipeline:
+    """Clean up whitespace and separators, validate, and stamp the content hash"""
 
-class CrawlerPipeline:
     def process_item(self, item, spider):
+        adapter = ItemAdapter(item)
+        for field in TEXT_FIELDS:
+            value = adapter.get(field)
+            if isinstance(value, str):
+                adapter[field] = re.sub(r"\s+", " ", value).strip()
+        for field in ("job_levels", "languages"):
+            if adapter.get(field):
+                adapter[field] = adapter[field].rstrip(", ")
+
+        # Single-letter codes, upper case, first occurrence wins
+        codes = (str(t).strip().upper() for t in adapter.get("test_types") or [])
+        adapter["test_types"] = list(dict.fromkeys(code for code in codes if code))
+
+        if adapter.get("url"):
+            adapter["url"] = canonical_url(adapter["url"])
+
+        missing = [field for field in REQUIRED_FIELDS if not adapter.get(field)]
+        if missing:
+            raise DropItem(f"Missing {', '.join(missing)} in {adapter.get('url') or 'item'}")
+
+        adapter["content_hash"] = content_hash(item)
         return item
+
+
+class DedupPipeline:
+    """Drop items whose URL or content was already seen in this crawl"""
+
+    def __init__(self, signals=None):
+        self.signals = signals
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.signals)
+
+    def open_spider(self, spider):
+        self.urls = set()
+        self.hashes = set()
+
+    def process_item(self, item, spider):
+        adapter = ItemAdapter(item)
+        if adapter["url"] in self.urls:
+            raise DropItem(f"Duplicate URL {adapter['url']}")
+        if adapter["content_hash"] in self.hashes:
+            if self.signals is not None:
+                self.signals.send_catch_log(signal=duplicate_content, url=adapter["url"])
+            raise DropItem(f"Duplicate content at {adapter['url']}")
+        self.urls.add(adapter["url"])
+        self.hashes.add(adapter["content_hash"])
+        return item
+
+
+class ChangeTrackingPipeline:
+    """Maintain the full catalog snapshot and pass on only new or changed items.
+
+    Items that reach the feed exporter (FEEDS, data/changed_products.jsonl)
+    are exactly the ones downstream processing has to redo. The snapshot at
+    CATALOG_SNAPSHOT is rewritten at the end of every crawl from the previous
+    snapshot plus this crawl's items. Pages the conditional fetch middleware
+    found unchanged, and pages dropped as duplicates of another URL's
+    content, keep their previous record; on a crawl that finished normally,
+    previously known URLs that were not reached at all are removed and
+    listed in REMOVED_FEED.
+    """
+
+    def __init__(self, snapshot_path, removed_path, stats):
+        self.snapshot_path = Path(snapshot_path)
+        self.removed_path = Path(removed_path)
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        pipeline = cls(
+            crawler.settings.get("CATALOG_SNAPSHOT", "data/shl_products.jsonl"),
+            crawler.settings.get("REMOVED_FEED", "data/removed_products.jsonl"),
+            crawler.stats,
+        )
+        crawler.signals.connect(pipeline.page_unchanged, signal=page_unchanged)
+        crawler.signals.connect(pipeline.duplicate_content, signal=duplicate_content)
+        crawler.signals.connect(pipeline.spider_closed, signal=signals.spider_closed)
+        return pipeline
+
+    def open_spider(self, spider):
+        self.previous = {}
+        if self.snapshot_path.exists():
+            for record in read_jsonl(self.snapshot_path):
+                record.setdefault("content_hash", content_hash(record))
+                self.previous[record["url"]] = record
+        self.current = {}
+        self.unchanged = set()
+        self.duplicates = set()
+
+    def page_unchanged(self, url):
+        self.unchanged.add(canonical_url(url))
+
+    def duplicate_content(self, url):
+        self.duplicates.add(canonical_url(url))
+        self.stats.inc_value("catalog/duplicate")
+
+    def process_item(self, item, spider):
+        adapter = ItemAdapter(item)
+        url = adapter["url"]
+        self.current[url] = adapter.asdict()
+        old = self.previous.get(url)
+        if old is not None and old["content_hash"] == adapter["content_hash"]:
+            # Fetched again (no validators, or only markup changed) but the content is the same
+            self.stats.inc_value("catalog/unchanged")
+            raise DropItem(f"Unchanged {url}")
+        self.stats.inc_value("catalog/changed" if old is not None else "catalog/new")
+        return item
+
+    def spider_closed(self, spider, reason):
+        snapshot = dict(self.previous)
+        snapshot.update(self.current)
+
+        missing = self.unchanged - snapshot.keys()
+        if missing:
+            spider.logger.warning(
+                f"{len(missing)} pages were not modified but have no record in {self.snapshot_path}; "
+                "recrawl with CONDITIONAL_FETCH_ENABLED=False to restore them"
+            )
+
+        # A crawl cut short (item cap, shutdown) says nothing about pages it never reached
+        removed = []
+        if reason == "finished":
+            seen = self.current.keys() | self.unchanged | self.duplicates
+            removed = sorted(url for url in self.previous if url not in seen)
+            for url in removed:
+                del snapshot[url]
+            self._write(self.removed_path, ({"url": url, "removed": True} for url in removed))
+        self.stats.set_value("catalog/removed", len(removed))
+
+        count = self._write(self.snapshot_path, snapshot.values())
+        spider.logger.info(
+            f"Catalog snapshot: {count} items, {len(self.current)} scraped, "
+            f"{len(self.unchanged)} not modified, {len(removed)} removed"
+        )
+
+    @staticmethod
+    def _write(path, records):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        count = 0
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                count += 1
+        os.replace(tmp_path, path)
+        return count
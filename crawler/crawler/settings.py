@@ -50,9 +50,14 @@ ROBOTSTXT_OBEY = True
 
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
-#DOWNLOADER_MIDDLEWARES = {
-#    "crawler.middlewares.CrawlerDownloaderMiddleware": 543,
-#}
+# Conditional re-fetch sits below HttpCompressionMiddleware (590) so it
+# hashes decompressed bodies
+DOWNLOADER_MIDDLEWARES = {
+    "crawler.middlewares.ConditionalFetchMiddleware": 580,
+    # Sees every response, including the 304s the conditional fetch then
+    # drops, before RetryMiddleware (550) reschedules failures
+    "crawler.middlewares.BackoffMiddleware": 585,
+}
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
@@ -62,23 +67,62 @@ ROBOTSTXT_OBEY = True
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
-#ITEM_PIPELINES = {
-#    "crawler.pipelines.CrawlerPipeline": 300,
-#}
+ITEM_PIPELINES = {
+    "crawler.pipelines.NormalizePipeline": 100,
+    "crawler.pipelines.DedupPipeline": 200,
+    "crawler.pipelines.ChangeTrackingPipeline": 300,
+}
 
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
-#AUTOTHROTTLE_ENABLED = True
+# AutoThrottle is switched on per crawl mode below.
 # The initial download delay
-#AUTOTHROTTLE_START_DELAY = 5
+AUTOTHROTTLE_START_DELAY = 0.5
 # The maximum download delay to be set in case of high latencies
-#AUTOTHROTTLE_MAX_DELAY = 60
+AUTOTHROTTLE_MAX_DELAY = 30
 # The average number of requests Scrapy should be sending in parallel to
 # each remote server
-#AUTOTHROTTLE_TARGET_CONCURRENCY = 1.0
+AUTOTHROTTLE_TARGET_CONCURRENCY = 4.0
 # Enable showing throttling stats for every response received:
 #AUTOTHROTTLE_DEBUG = False
 
+# Crawl modes: named setting profiles applied by the spider on top of this
+# file. Pick one with `-s CRAWL_MODE=polite`; any other `-s` option still
+# overrides the profile.
+#   adaptive: AutoThrottle paces each domain from observed latency, with at
+#             most CONCURRENT_REQUESTS_PER_DOMAIN requests in flight
+#   polite:   the original fixed one-second delay, one request at a time
+CRAWL_MODE = "adaptive"
+CRAWL_MODES = {
+    "adaptive": {
+        "AUTOTHROTTLE_ENABLED": True,
+        "DOWNLOAD_DELAY": 0,
+        "CONCURRENT_REQUESTS": 32,
+        "CONCURRENT_REQUESTS_PER_DOMAIN": 8,
+    },
+    "polite": {
+        "AUTOTHROTTLE_ENABLED": False,
+        "DOWNLOAD_DELAY": 1,
+        "CONCURRENT_REQUESTS_PER_DOMAIN": 1,
+    },
+}
+
+# Stop after this many scraped items or downloaded pages (0 = no cap). Only
+# new or changed items count as scraped, and a capped crawl never records
+# removals.
+CLOSESPIDER_ITEMCOUNT = 500
+CLOSESPIDER_PAGECOUNT = 0
+
+# Retry transient failures; BackoffMiddleware slows the whole domain down
+# (honouring Retry-After) before the retry goes out, and resets the delay
+# after the next success
+RETRY_ENABLED = True
+RETRY_TIMES = 3
+RETRY_HTTP_CODES = [500, 502, 503, 504, 522, 524, 408, 429]
+RETRY_BACKOFF_BASE = 1.0
+RETRY_BACKOFF_MAX = 60.0
+DOWNLOAD_TIMEOUT = 30
+
 # Enable and configure HTTP caching (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html#httpcache-middleware-settings
 #HTTPCACHE_ENABLED = True
@@ -90,3 +134,18 @@ ROBOTSTXT_OBEY = True
 # Set settings whose default value is deprecated to a future-proof value
 TWISTED_REACTOR = "twisted.internet.asyncioreactor.AsyncioSelectorReactor"
 FEED_EXPORT_ENCODING = "utf-8"
+
+# Stream items as JSON Lines: each item is appended as it is scraped, so the
+# feed never has to be held (or re-parsed) as one JSON document.
+# Only new or changed items reach the feed; ChangeTrackingPipeline keeps the
+# full catalog in CATALOG_SNAPSHOT and lists dropped pages in REMOVED_FEED
+FEEDS = {
+    "data/changed_products.jsonl": {"format": "jsonlines", "encoding": "utf8", "overwrite": True},
+}
+CATALOG_SNAPSHOT = "data/shl_products.jsonl"
+REMOVED_FEED = "data/removed_products.jsonl"
+
+# ETag / Last-Modified / body hash per detail URL from the previous crawl;
+# set CONDITIONAL_FETCH_ENABLED = False to download every page again
+CONDITIONAL_FETCH_ENABLED = True
+CONDITIONAL_FETCH_STATE = "data/http_validators.json"
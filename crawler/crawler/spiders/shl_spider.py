@@ -1,81 +1,110 @@
 import scrapy
+from w3lib.url import canonicalize_url
+
+from crawler.items import AssessmentItem
+from crawler.pipelines import canonical_url
 
 class SHLCatalogSpider(scrapy.Spider):
     name = "shl_catalog"
     start_urls = ["https://www.shl.com/solutions/products/product-catalog/"]
-    custom_settings = {
-        'CLOSESPIDER_ITEMCOUNT': 500,  # adjust as needed
-        'DOWNLOAD_DELAY': 1,            # be polite to the server
-        
+
+    # Read from each detail page by parse_detail; benchmarks/crawl_benchmark.py
+    # times every entry separately
+    DETAIL_SELECTORS = {
+        'title': ('css', 'div.content__container h1::text'),
+        'description': ('xpath', '//div[h4[text()="Description"]]/p/text()'),
+        'job_levels': ('xpath', '//div[h4[text()="Job levels"]]/p/text()'),
+        'languages': ('xpath', '//div[h4[text()="Languages"]]/p/text()'),
+        'duration_minutes': ('xpath', '//div[h4[text()="Assessment length"]]/p/text()'),
+        # Test types (C, P, A, B codes)
+        'test_types': ('xpath', '//p[contains(@class, "product-catalogue__small-text")][contains(., "Test Type")]'
+                                '/span//span[@class="product-catalogue__key"]/text()'),
+        'remote_testing': ('xpath', '//p[contains(., "Remote Testing")]/span[contains(@class, "-yes")]'),
+        'adaptive_supported': ('xpath', '//li[contains(., "Adaptive") or contains(., "IRT")]/text()'),
     }
 
+    @classmethod
+    def update_settings(cls, settings):
+        """Apply the CRAWL_MODE profile; explicit -s options still take precedence"""
+        super().update_settings(settings)
+        mode = settings.get('CRAWL_MODE')
+        modes = settings.getdict('CRAWL_MODES')
+        if mode not in modes:
+            raise ValueError(f"Unknown CRAWL_MODE {mode!r}, expected one of {sorted(modes)}")
+        settings.setdict(modes[mode], priority='spider')
+
+    def __init__(self, start_url=None, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # `-a start_url=...` points the crawl at a mirror or local fixtures
+        if start_url:
+            self.start_urls = [start_url]
+        # Listing pages link to each other in several ways ("Next" and every
+        # page number), and detail pages appear on more than one listing;
+        # queue each only once
+        self.seen_pages = set()
+        self.seen_details = set()
+
     def parse(self, response):
+        self.seen_pages.add(canonicalize_url(response.url))
+
         # Extract product links from listing page (both categories)
         links = response.css('a.custom__table-heading__title-link::attr(href)').getall()
         links += response.css('td.custom__table-heading__title a::attr(href)').getall()
-        for href in set(links):
-            yield response.follow(href, callback=self.parse_detail)
+        for href in links:
+            url = canonical_url(response.urljoin(href))
+            if url not in self.seen_details:
+                self.seen_details.add(url)
+                # Refresh crawls only re-parse detail pages that changed
+                yield response.follow(url, callback=self.parse_detail, meta={'conditional': True})
+
+        # "Next" plus the numbered links cover every page; the numbered ones
+        # repeat across pages, so skip anything already queued
+        pages = response.css('li.-next a::attr(href)').getall()
+        pages += response.css('ul.pagination li a::attr(href)').getall()
+        for href in pages:
+            url = canonicalize_url(response.urljoin(href))
+            if url not in self.seen_pages:
+                self.seen_pages.add(url)
+                yield response.follow(url, callback=self.parse)
 
-        # Follow "Next" pagination link
-        next_page = response.css('li.-next a::attr(href)').get()
-        if next_page:
-            yield response.follow(next_page, callback=self.parse)
-        # Also follow numbered pagination links to ensure coverage
-        for page in response.css('ul.pagination li a::attr(href)').getall():
-            yield response.follow(page, callback=self.parse)
+    def select(self, response, field):
+        kind, query = self.DETAIL_SELECTORS[field]
+        return response.css(query) if kind == 'css' else response.xpath(query)
 
     def parse_detail(self, response):
         # Title and URL
-        title = response.css('div.content__container h1::text').get(default='').strip()
+        title = self.select(response, 'title').get(default='').strip()
         url = response.url
 
         # Description
-        description = response.xpath(
-            '//div[h4[text()="Description"]]/p/text()'
-        ).get(default='No description available').strip()
+        description = self.select(response, 'description').get(default='No description available').strip()
 
         # Job levels and languages
-        job_levels = response.xpath(
-            '//div[h4[text()="Job levels"]]/p/text()'
-        ).get(default='Not available').strip()
-        languages = response.xpath(
-            '//div[h4[text()="Languages"]]/p/text()'
-        ).get(default='Not available').strip()
+        job_levels = self.select(response, 'job_levels').get(default='Not available').strip()
+        languages = self.select(response, 'languages').get(default='Not available').strip()
 
         # Assessment length
-        duration = response.xpath(
-            '//div[h4[text()="Assessment length"]]/p/text()'
-        ).get(default='').strip()
+        duration = self.select(response, 'duration_minutes').get(default='').strip()
 
-        # Test types (C, P, A, B codes)
-        test_type_spans = response.xpath(
-            '//p[contains(@class, "product-catalogue__small-text")][contains(., "Test Type")]/span//span[@class="product-catalogue__key"]/text()'
-        ).getall()
-        test_types = [t.strip() for t in test_type_spans if t.strip()]
+        test_types = [t.strip() for t in self.select(response, 'test_types').getall() if t.strip()]
 
         # Remote testing support
-        remote = 'Yes' if response.xpath(
-            '//p[contains(., "Remote Testing")]/span[contains(@class, "-yes")]'
-        ) else 'No'
+        remote = 'Yes' if self.select(response, 'remote_testing') else 'No'
 
         # Adaptive/IRT support
-        adaptive_raw = response.xpath(
-            '//li[contains(., "Adaptive") or contains(., "IRT")]/text()'
-        ).get()
+        adaptive_raw = self.select(response, 'adaptive_supported').get()
         adaptive_supported = (
             adaptive_raw.split(':')[-1].strip() if adaptive_raw and ':' in adaptive_raw else 'No Information'
         )
 
-        yield {
-            'title': title,
-            'url': url,
-            'description': description,
-            'job_levels': job_levels,
-            'languages': languages,
-            'duration_minutes': duration,
-            'test_types': test_types,
-            'remote_testing': remote,
-            'adaptive_supported': adaptive_supported,
-        }
-
-    
\ No newline at end of file
+        yield AssessmentItem(
+            title=title,
+            url=url,
+            description=description,
+            job_levels=job_levels,
+            languages=languages,
+            duration_minutes=duration,
+            test_types=test_types,
+            remote_testing=remote,
+            adaptive_supported=adaptive_supported,
+        )
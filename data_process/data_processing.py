@@ -1,10 +1,15 @@
+import argparse
 import json
+import os
 import re
 from pathlib import Path
 
 DATA_DIR = Path(__file__).parent
-RAW_FILE = DATA_DIR.parent / "crawler" / "data" / "shl_products.json"
-PROCESSED_JSON = DATA_DIR / "processed_dataset.json"
+RAW_FILE = DATA_DIR.parent / "crawler" / "data" / "shl_products.jsonl"
+# Written by each crawl: new or changed items, and tombstones for removed pages
+CHANGED_FILE = DATA_DIR.parent / "crawler" / "data" / "changed_products.jsonl"
+REMOVED_FILE = DATA_DIR.parent / "crawler" / "data" / "removed_products.jsonl"
+PROCESSED_JSONL = DATA_DIR / "processed_dataset.jsonl"
 
 # Test type mapping
 TEST_TYPE_LABELS = {
@@ -85,14 +90,58 @@ def process_entry(entry):
     
     return processed
 
-def main():
-    with open(RAW_FILE, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    
-    processed = [process_entry(e) for e in data]
-    
-    with open(PROCESSED_JSON, "w", encoding="utf-8") as f:
-        json.dump(processed, f, indent=2, ensure_ascii=False)
+def read_records(path):
+    """Stream one JSON object per line"""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def process_entries(entries):
+    """Lazily process entries so only one is held in memory at a time"""
+    for entry in entries:
+        yield process_entry(entry)
+
+def apply_changes(processed, changed, removed):
+    """Merge the crawl's changes into the existing processed stream.
+
+    Records keep their position, replaced in place when changed; new ones
+    are appended at the end. Only the changed entries are held in memory.
+    """
+    for record in processed:
+        url = record["URL"]
+        if url in removed:
+            continue
+        yield changed.pop(url, record)
+    yield from changed.values()
+
+def write_processed(records):
+    # Written beside the output and renamed, so readers never see a partial file
+    tmp_path = PROCESSED_JSONL.with_name(PROCESSED_JSONL.name + ".tmp")
+    count = 0
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for processed in records:
+            f.write(json.dumps(processed, ensure_ascii=False) + "\n")
+            count += 1
+    os.replace(tmp_path, PROCESSED_JSONL)
+    return count
+
+def main(changes=False):
+    if changes and PROCESSED_JSONL.exists():
+        changed = {p["URL"]: p for p in process_entries(read_records(CHANGED_FILE))} if CHANGED_FILE.exists() else {}
+        removed = {r["url"].strip() for r in read_records(REMOVED_FILE)} if REMOVED_FILE.exists() else set()
+        n_changed, n_removed = len(changed), len(removed)
+        count = write_processed(apply_changes(read_records(PROCESSED_JSONL), changed, removed))
+        print(f"Applied {n_changed} changed and {n_removed} removed entries; {count} entries in {PROCESSED_JSONL}")
+        return
+
+    count = write_processed(process_entries(read_records(RAW_FILE)))
+    print(f"Processed {count} entries into {PROCESSED_JSONL}")
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description="Build processed_dataset.jsonl from the crawled catalog")
+    parser.add_argument("--changes", action="store_true",
+                        help=f"Only apply {CHANGED_FILE.name} and {REMOVED_FILE.name} from the last crawl")
+    args = parser.parse_args()
+
+    main(args.changes)
@@ -1,32 +1,97 @@
-def recall_at_k(relevant, retrieved, k):
-    retrieved_at_k = set(retrieved[:k])
-    if not relevant:
+import numpy as np
+
+# Metrics reported by evaluate(), in display order
+METRICS = ("recall", "precision", "map", "ndcg", "mrr")
+
+
+def relevance_matrix(relevant, retrieved, depth):
+    """(n_queries, depth) bool matrix; [q, i] is True when result i of query q is relevant.
+
+    This is the only per-item Python work; every metric below is computed
+    from it with array operations, for all queries and all K at once.
+    """
+    rel = np.zeros((len(retrieved), depth), dtype=bool)
+    for q, (truth, ranked) in enumerate(zip(relevant, retrieved)):
+        truth = set(truth)
+        hits = [i for i, item in enumerate(ranked[:depth]) if item in truth]
+        rel[q, hits] = True
+    return rel
+
+
+def evaluate(rel, n_relevant, ks):
+    """Per-query Recall/Precision/MAP/nDCG/MRR at each cutoff in ks.
+
+    rel is a relevance_matrix(), n_relevant the number of ground-truth items
+    per query. Returns {metric: (n_queries, len(ks)) array}; queries without
+    ground truth score 0.
+    """
+    ks = np.asarray(ks, dtype=np.int64)
+    depth = int(ks.max())
+    if rel.shape[1] < depth:
+        # Fewer results than the largest cutoff: the missing ranks are misses
+        rel = np.pad(rel, ((0, 0), (0, depth - rel.shape[1])))
+    rel = rel[:, :depth]
+    n_relevant = np.asarray(n_relevant, dtype=np.float64)[:, None]
+    has_truth = n_relevant > 0
+    cut = ks - 1
+
+    ranks = np.arange(1, depth + 1)
+    hits = np.cumsum(rel, axis=1)
+    hits_at_k = hits[:, cut]
+
+    # AP@k: precision at each relevant rank, summed up to k, over min(|relevant|, k)
+    ap_sum = np.cumsum(np.where(rel, hits / ranks, 0.0), axis=1)[:, cut]
+    ap_norm = np.minimum(n_relevant, ks)
+
+    # Binary-gain nDCG; the ideal ranking puts all relevant items first
+    discounts = 1.0 / np.log2(ranks + 1)
+    dcg = np.cumsum(rel * discounts, axis=1)[:, cut]
+    ideal_dcg = np.concatenate([[0.0], np.cumsum(discounts)])[ap_norm.astype(np.int64)]
+
+    first_hit = np.where(rel.any(axis=1), rel.argmax(axis=1) + 1, depth + 1)[:, None]
+
+    def safe_div(num, den):
+        return np.divide(num, den, out=np.zeros(np.broadcast(num, den).shape), where=has_truth & (den > 0))
+
+    return {
+        "recall": safe_div(hits_at_k, n_relevant),
+        "precision": np.where(has_truth, hits_at_k / ks, 0.0),
+        "map": safe_div(ap_sum, ap_norm),
+        "ndcg": safe_div(dcg, ideal_dcg),
+        "mrr": np.where(has_truth & (first_hit <= ks), 1.0 / first_hit, 0.0),
+    }
+
+
+def summarize(scores):
+    """Mean over queries: {metric: (len(ks),) array}"""
+    return {name: values.mean(axis=0) if len(values) else np.zeros(values.shape[1])
+            for name, values in scores.items()}
+
+
+def _single(metric, relevant, retrieved, k):
+    if k <= 0:
         return 0.0
-    return len(retrieved_at_k.intersection(relevant)) / len(relevant)
+    rel = relevance_matrix([relevant], [retrieved], k)
+    return float(evaluate(rel, [len(set(relevant))], [k])[metric][0, 0])
+
+
+def recall_at_k(relevant, retrieved, k):
+    return _single("recall", relevant, retrieved, k)
 
 def precision_at_k(relevant, retrieved, k):
-    retrieved_at_k = retrieved[:k]
-    if k == 0:
-        return 0.0
-    num_relevant = sum(1 for item in retrieved_at_k if item in relevant)
-    return num_relevant / k
+    return _single("precision", relevant, retrieved, k)
 
 def average_precision(relevant, retrieved, k):
-    if not relevant:
+    return _single("map", relevant, retrieved, k)
+
+def ndcg_at_k(relevant, retrieved, k):
+    return _single("ndcg", relevant, retrieved, k)
+
+def mean_average_precision(ground_truth, predictions, k):
+    """MAP@k; ground_truth maps each query to its relevant ids, predictions to its ranked ids"""
+    if not ground_truth or k <= 0:
         return 0.0
-    ap = 0.0
-    num_hits = 0
-    for i in range(1, k + 1):
-        if retrieved[i - 1] in relevant:
-            num_hits += 1
-            ap += num_hits / i
-    return ap / min(len(relevant), k)
-
-def mean_average_precision(queries, predictions, k):
-    map_total = 0.0
-    num_queries = len(queries)
-    for query in queries:
-        relevant = set()  # Populate with ground truth relevant assessment IDs for this query
-        retrieved = predictions.get(query, [])
-        map_total += average_precision(relevant, retrieved, k)
-    return map_total / num_queries if num_queries else 0.0
+    queries = list(ground_truth)
+    rel = relevance_matrix([ground_truth[q] for q in queries], [predictions.get(q, []) for q in queries], k)
+    n_relevant = [len(set(ground_truth[q])) for q in queries]
+    return float(summarize(evaluate(rel, n_relevant, [k]))["map"][0])
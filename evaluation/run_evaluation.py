@@ -0,0 +1,167 @@
+"""Score the recommender on the labeled benchmark queries, with latency alongside.
+
+Each configuration is an (encoder backend, index spec) pair. The index is
+rebuilt in memory from the served embeddings for each spec, the labeled
+queries are run through the same search path as the API, and the script
+prints Recall/Precision/MAP/nDCG/MRR at every K next to batch throughput
+and single-query p50/p99 latency.
+
+    python evaluation/run_evaluation.py --indexes flat hnsw ivf --encoders sentence-transformers onnx-int8
+
+--diversify adds an MMR variant of every configuration, with the mean number
+of distinct test types per result list next to the quality metrics.
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "api"))
+
+import main  # noqa: E402
+from create_faiss_index import apply_search_params, build_index, factory_string, parse_search_params  # noqa: E402
+from diversify import Diversify  # noqa: E402
+from fusion import Fusion  # noqa: E402
+from metrics import METRICS, evaluate, relevance_matrix, summarize  # noqa: E402
+from snapshot import Snapshot  # noqa: E402
+
+BENCHMARK_PATH = Path(__file__).parent / "benchmark_queries.json"
+
+
+def load_benchmark(path=BENCHMARK_PATH):
+    """Labeled queries: [{"query": str, "relevant": [url, ...], "filters": {...}?}, ...]"""
+    with open(path, "r", encoding="utf-8") as f:
+        benchmark = json.load(f)
+    if not benchmark:
+        raise SystemExit(f"No labeled queries in {path}")
+    return benchmark
+
+
+def index_snapshot(base, spec, search_params=None):
+    """Copy of the served snapshot with its FAISS index rebuilt as `spec`"""
+    n, dimension = base.embeddings.shape
+    factory = factory_string(spec, dimension, n)
+    embeddings = np.ascontiguousarray(base.embeddings, dtype=np.float32)
+    index = build_index(embeddings, factory, base.row_ids.ids)
+    apply_search_params(index, search_params)
+    metadata = {"spec": spec, "factory": factory, "search_params": search_params or {}}
+    return Snapshot(f"eval-{spec}", base.fingerprint, base.catalog, base.embeddings, base.row_ids, index,
+                    metadata, base.sparse)
+
+
+def run_config(snap, benchmark, ks, hybrid=False, diversify=None, repeats=3):
+    queries = [
+        main.Query(text=item["query"], max_results=max(ks), filters=item.get("filters"),
+                   fusion=Fusion() if hybrid else None, diversify=diversify)
+        for item in benchmark
+    ]
+
+    # Whole benchmark as one batch, as /recommend/batch would run it
+    batch_times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        results = main.hydrate(snap, main.search_queries(queries, snap, check_result_cache=False), "json", None)
+        batch_times.append(time.perf_counter() - start)
+
+    # One query at a time, as unbatched /recommend calls would run
+    latencies = []
+    for _ in range(repeats):
+        for q in queries:
+            start = time.perf_counter()
+            main.hydrate(snap, main.search_queries([q], snap, check_result_cache=False), "json", None)
+            latencies.append(time.perf_counter() - start)
+
+    retrieved = [[r["URL"] for r in rows] for rows in results]
+    relevant = [item["relevant"] for item in benchmark]
+    rel = relevance_matrix(relevant, retrieved, max(ks))
+    quality = summarize(evaluate(rel, [len(set(r)) for r in relevant], ks))
+
+    test_types = [
+        len({t.strip() for r in rows for t in r.get("Test Types", "").split(",") if t.strip()}) for rows in results
+    ]
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "quality": {name: dict(zip(map(str, ks), np.round(values, 4).tolist())) for name, values in quality.items()},
+        "distinct_test_types": round(float(np.mean(test_types)), 2),
+        "latency": {
+            "p50_ms": round(float(np.percentile(latencies_ms, 50)), 3),
+            "p99_ms": round(float(np.percentile(latencies_ms, 99)), 3),
+            "batch_qps": round(len(queries) / min(batch_times), 1),
+        },
+    }
+
+
+def print_report(report, ks):
+    width = max(len("config"), *(len(r["config"]) for r in report))
+    print(f"{'config':<{width}} {'p50_ms':>8} {'p99_ms':>8} {'batch_qps':>10} {'test_types':>10}")
+    for r in report:
+        latency = r["latency"]
+        print(f"{r['config']:<{width}} {latency['p50_ms']:>8.2f} {latency['p99_ms']:>8.2f} {latency['batch_qps']:>10.1f} "
+              f"{r['distinct_test_types']:>10.2f}")
+
+    for name in METRICS:
+        print(f"\n{name + '@k':<{width}}" + "".join(f" {k:>7}" for k in ks))
+        for r in report:
+            print(f"{r['config']:<{width}}" + "".join(f" {r['quality'][name][str(k)]:>7.3f}" for k in ks))
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--benchmark", type=Path, default=BENCHMARK_PATH)
+    parser.add_argument("--indexes", nargs="+", default=["flat"],
+                        help="Index specs to rebuild and score (flat, ivf, ivfpq, hnsw, sq8); "
+                             "'served' uses the index on disk as is")
+    parser.add_argument("--encoders", nargs="+", default=[main.ENCODER_BACKEND],
+                        help="Encoder backends (sentence-transformers, onnx, onnx-int8)")
+    parser.add_argument("--param", action="append", default=[],
+                        help="Search parameter applied to every index, e.g. --param nprobe=8")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5, 10, 20])
+    parser.add_argument("--hybrid", action="store_true", help="Also score BM25 + dense fusion (RRF)")
+    parser.add_argument("--diversify", type=float, nargs="?", const=0.7, metavar="LAMBDA",
+                        help="Also score MMR diversification (default lambda 0.7)")
+    parser.add_argument("--cover-test-types", action="store_true", help="With --diversify, cover test types too")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", type=Path, help="Write the report as JSON")
+    args = parser.parse_args()
+
+    ks = sorted(set(args.k))
+    benchmark = load_benchmark(args.benchmark)
+    search_params = parse_search_params(args.param)
+
+    main.load_assets()
+    # Every configuration must pay the full encode + search cost
+    main.embedding_cache.max_entries = 0
+    main.result_cache.max_entries = 0
+    base = main.snapshot
+
+    modes = [False, True] if args.hybrid and base.sparse is not None else [False]
+    diversify_modes = [None]
+    if args.diversify is not None:
+        diversify_modes.append(Diversify(mmr_lambda=args.diversify, cover_test_types=args.cover_test_types))
+    report = []
+    for encoder in args.encoders:
+        main.ENCODER_BACKEND = encoder
+        main.model = main.load_encoder(main.bundle_dir())
+        for spec in args.indexes:
+            snap = base if spec == "served" else index_snapshot(base, spec, search_params)
+            for hybrid in modes:
+                for diversify in diversify_modes:
+                    config = f"{encoder}/{spec}" + ("+bm25" if hybrid else "") + ("+mmr" if diversify else "")
+                    print(f"Evaluating {config} on {len(benchmark)} queries")
+                    result = run_config(snap, benchmark, ks, hybrid=hybrid, diversify=diversify, repeats=args.repeats)
+                    report.append({"config": config, "encoder": encoder, "index": spec, "hybrid": hybrid,
+                                   "diversify": diversify.model_dump() if diversify else None, **result})
+
+    print_report(report, ks)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"queries": len(benchmark), "k": ks, "configs": report}, f, indent=2)
+        print(f"Wrote report to {args.output}")
+
+
+if __name__ == "__main__":
+    main_cli()
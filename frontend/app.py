@@ -16,7 +16,8 @@ if st.button("Get Recommendations"):
         with st.spinner("Fetching recommendations…"):
             resp = requests.post(
                 API_URL,
-                json={"text": query, "max_results": num_results},
+                # Whole job descriptions are searched chunk by chunk instead of truncated
+                json={"text": query, "max_results": num_results, "chunking": {}},
                 timeout=10
             )
         if resp.status_code == 200:
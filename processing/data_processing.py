@@ -1,19 +1,29 @@
+import argparse
+import hashlib
 import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
 from pathlib import Path
-from transformers import pipeline
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.feature_extraction import _stop_words
-import torch
-import nltk
-from nltk.corpus import stopwords
 import logging
 from tqdm import tqdm
 
 # Configuration
 DATA_DIR = Path(__file__).parent
-RAW_FILE = DATA_DIR.parent / "crawler" / "data" / "shl_products.json"
-PROCESSED_JSON = DATA_DIR / "processed_assessments.json"
-PROCESSED_JSON.parent.mkdir(parents=True, exist_ok=True)
+RAW_FILE = DATA_DIR.parent / "crawler" / "data" / "shl_products.jsonl"
+PROCESSED_JSONL = DATA_DIR / "processed_dataset.jsonl"
+# Append-only checkpoint of finished summaries, one JSON object per line
+SUMMARIES_JSONL = DATA_DIR / "summaries.jsonl"
+PROCESSED_JSONL.parent.mkdir(parents=True, exist_ok=True)
+
+SUMMARY_MODEL = "sshleifer/distilbart-cnn-12-6"
+SUMMARY_BATCH_SIZE = 8      # Texts per summarizer forward pass
+CHUNK_SIZE = 32             # Entries per worker task and per checkpoint append
+TFIDF_MAX_FEATURES = 5000   # Corpus-wide vocabulary for keyword extraction
+MAX_TFIDF_KEYWORDS = 8
 
 # Test type mapping
 TEST_TYPE_LABELS = {
@@ -37,121 +47,226 @@ logging.basicConfig(
     ]
 )
 
-def initialize_models():
-    """Initialize NLP models with error handling"""
+# Per-process summarizer, created once by init_worker()
+_summarizer = None
+
+def load_stop_words():
     try:
+        import nltk
+        from nltk.corpus import stopwords
         nltk.download('stopwords', quiet=True)
-        stop_words = set(stopwords.words('english'))
-    except:
-        stop_words = set(_stop_words.ENGLISH_STOP_WORDS)
+        return set(stopwords.words('english'))
+    except Exception:
+        return set(_stop_words.ENGLISH_STOP_WORDS)
 
-    device = 0 if torch.cuda.is_available() else -1
-    
-    try:
-        summarizer = pipeline(
-            "summarization",
-            model="sshleifer/distilbart-cnn-12-6",
-            device=device,
-            torch_dtype=torch.float16 if device == 0 else torch.float32
-        )
-        tfidf = TfidfVectorizer(
-            stop_words=list(stop_words),
-            ngram_range=(1, 2),
-            max_features=100
-        )
-        return summarizer, tfidf
-    except Exception as e:
-        logging.error(f"Model initialization failed: {e}")
-        return None, None
+def init_worker(device=-1, num_threads=None):
+    """Load the summarizer once per process"""
+    global _summarizer
+    import torch
+    from transformers import pipeline
+
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    _summarizer = pipeline(
+        "summarization",
+        model=SUMMARY_MODEL,
+        device=device,
+        torch_dtype=torch.float16 if device == 0 else torch.float32
+    )
+
+def fallback_summary(text):
+    return text[:150] + "..." if len(text) > 150 else text
 
-def generate_summary(text, summarizer):
-    """Generate assessment summary with fallback"""
+def summarize_chunk(chunk, batch_size=SUMMARY_BATCH_SIZE):
+    """Summarize [(key, text), ...] in batched forward passes; returns [(key, summary, ok), ...]"""
+    keys, texts = zip(*chunk)
     try:
-        result = summarizer(
-            text,
+        results = _summarizer(
+            list(texts),
             max_length=60,
             min_length=30,
             do_sample=False,
-            truncation=True
+            truncation=True,
+            batch_size=batch_size
         )
-        return result[0]['summary_text']
+        return [(key, result['summary_text'], True) for key, result in zip(keys, results)]
     except Exception as e:
-        logging.warning(f"Summarization failed: {e}")
-        return text[:150] + "..." if len(text) > 150 else text
+        logging.warning(f"Summarization failed for a chunk of {len(chunk)}: {e}")
+        return [(key, fallback_summary(text), False) for key, text in chunk]
 
-def extract_keywords(text, tfidf, entry):
-    """Extract keywords with test type context"""
+def entry_context(entry):
+    return " | ".join(str(v) for k, v in entry.items() if k not in ['summarization', 'keywords', 'content_hash'])
+
+def context_key(context):
+    """Checkpoint key: changes whenever the text or the summary model changes"""
+    return hashlib.sha1(f"{SUMMARY_MODEL}\n{context}".encode("utf-8")).hexdigest()
+
+def tfidf_keywords(contexts, stop_words):
+    """Top TF-IDF terms of every context from one fit over the whole corpus"""
+    tfidf = TfidfVectorizer(
+        stop_words=list(stop_words),
+        ngram_range=(1, 2),
+        max_features=TFIDF_MAX_FEATURES
+    )
+    matrix = tfidf.fit_transform(contexts).tocsr()
+    features = tfidf.get_feature_names_out()
+
+    all_keywords = []
+    for row in range(matrix.shape[0]):
+        # Read straight from the sparse row instead of densifying it
+        start, end = matrix.indptr[row], matrix.indptr[row + 1]
+        scores, columns = matrix.data[start:end], matrix.indices[start:end]
+        order = scores.argsort()[::-1][:MAX_TFIDF_KEYWORDS]
+        all_keywords.append([features[columns[i]] for i in order if scores[i] > 0.1])
+    return all_keywords
+
+def extract_keywords(entry, top_kws):
+    """Keywords with test type context"""
     keywords = []
-    
+
     # Add test type labels first
     if 'test_types' in entry:
         keywords.extend(TEST_TYPE_LABELS.get(t, t) for t in entry['test_types'])
-    
+
     # Add duration if available
     if 'duration_minutes' in entry:
         keywords.append(f"{entry['duration_minutes']} minutes")
-    
-    # TF-IDF keywords if text available
-    if text.strip():
-        try:
-            tfidf_matrix = tfidf.fit_transform([text])
-            features = tfidf.get_feature_names_out()
-            scores = tfidf_matrix.toarray()[0]
-            top_kws = [features[i] for i in scores.argsort()[::-1] if scores[i] > 0.1][:8]
-            keywords.extend(kw for kw in top_kws if kw not in keywords)
-        except Exception as e:
-            logging.warning(f"TF-IDF failed: {e}")
-    
+
+    keywords.extend(kw for kw in top_kws if kw not in keywords)
     return [kw for kw in keywords if kw and len(kw) > 2]
 
-def process_entry(entry, summarizer, tfidf):
-    """Process a single assessment entry"""
-    context = " | ".join(str(v) for k,v in entry.items() if k not in ['summarization', 'keywords'])
-    
-    return {
-        **entry,
-        'summarization': generate_summary(context, summarizer),
-        'keywords': extract_keywords(context, tfidf, entry),
-        'test_types_full': [TEST_TYPE_LABELS.get(t, t) for t in entry.get('test_types', [])]
-    }
-
-def main():
+def read_records(path):
+    """Stream one JSON object per line"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def load_checkpoint(path=SUMMARIES_JSONL):
+    """Summaries already produced, keyed by context_key(); a torn last line is ignored"""
+    done = {}
+    if not path.exists():
+        return done
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            done[record["key"]] = record["summarization"]
+    return done
+
+def summarize_all(contexts, done, workers=1, chunk_size=CHUNK_SIZE, batch_size=SUMMARY_BATCH_SIZE):
+    """Summarize every context not in `done`, appending each finished chunk to the checkpoint.
+
+    Returns {key: summary}; summaries that fell back to truncation are used
+    but not checkpointed, so a later run retries them.
+    """
+    import torch
+
+    device = 0 if torch.cuda.is_available() else -1
+    if device == 0:
+        workers = 1  # One process owns the GPU
+
+    pending = {}
+    for context in contexts:
+        key = context_key(context)
+        if key not in done:
+            pending[key] = context
+    summaries = dict(done)
+    logging.info(f"{len(done)} summaries from checkpoint, {len(pending)} to generate with {workers} worker(s)")
+    if not pending:
+        return summaries, 0
+
+    # Similar lengths in a batch pad less
+    items = sorted(pending.items(), key=lambda item: len(item[1]))
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+
+    def record(results, checkpoint):
+        for key, summary, ok in results:
+            summaries[key] = summary
+            if ok:
+                checkpoint.write(json.dumps({"key": key, "summarization": summary}, ensure_ascii=False) + "\n")
+        checkpoint.flush()
+
+    with open(SUMMARIES_JSONL, 'a', encoding='utf-8') as checkpoint, tqdm(total=len(items), desc="Summarizing") as bar:
+        if workers == 1:
+            init_worker(device)
+            for chunk in chunks:
+                record(summarize_chunk(chunk, batch_size), checkpoint)
+                bar.update(len(chunk))
+        else:
+            # Split the cores between workers instead of letting each grab all of them
+            num_threads = max(1, (os.cpu_count() or 1) // workers)
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_worker,
+                initargs=(device, num_threads)
+            ) as pool:
+                futures = {pool.submit(summarize_chunk, chunk, batch_size): len(chunk) for chunk in chunks}
+                for future in as_completed(futures):
+                    record(future.result(), checkpoint)
+                    bar.update(futures[future])
+
+    return summaries, len(items)
+
+def main(workers=1, chunk_size=CHUNK_SIZE, batch_size=SUMMARY_BATCH_SIZE, restart=False):
     logging.info("Starting assessment processing")
-    
-    # Load models
-    summarizer, tfidf = initialize_models()
-    if not summarizer:
-        logging.error("Critical model initialization failure")
-        return
+    start_time = time.perf_counter()
 
-    # Load data
+    # First pass keeps only the text of each entry, which TF-IDF needs as a whole
     try:
-        with open(RAW_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        logging.info(f"Loaded {len(data)} assessments")
+        contexts = [entry_context(entry) for entry in read_records(RAW_FILE)]
+        logging.info(f"Loaded {len(contexts)} assessments")
     except Exception as e:
         logging.error(f"Failed to load data: {e}")
         return
 
-    # Process data
-    processed = []
-    for entry in tqdm(data, desc="Processing"):
-        try:
-            processed.append(process_entry(entry, summarizer, tfidf))
-        except Exception as e:
-            logging.error(f"Failed to process entry: {e}")
-            processed.append({**entry, 'error': str(e)})
-
-        # Periodic save
-        if len(processed) % 10 == 0:
-            with open(PROCESSED_JSON, 'w', encoding='utf-8') as f:
-                json.dump(processed, f, indent=2)
-
-    # Final save
-    with open(PROCESSED_JSON, 'w', encoding='utf-8') as f:
-        json.dump(processed, f, indent=2)
-    logging.info(f"Saved processed data to {PROCESSED_JSON}")
+    # Keywords: one corpus-wide fit and transform, so IDF reflects the whole catalog
+    keywords = tfidf_keywords(contexts, load_stop_words())
+    keywords_time = time.perf_counter() - start_time
+
+    # Summaries: batched, spread over worker processes, resumable
+    if restart and SUMMARIES_JSONL.exists():
+        SUMMARIES_JSONL.unlink()
+    summarize_start = time.perf_counter()
+    try:
+        summaries, generated = summarize_all(contexts, load_checkpoint(), workers, chunk_size, batch_size)
+    except Exception as e:
+        logging.error(f"Summarization failed, rerun to resume from {SUMMARIES_JSONL}: {e}")
+        return
+    summarize_time = time.perf_counter() - summarize_start
+
+    # Second pass streams entries back in and writes each one out as JSON Lines
+    tmp_path = PROCESSED_JSONL.with_name(PROCESSED_JSONL.name + ".tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for entry, context, top_kws in zip(read_records(RAW_FILE), contexts, keywords):
+            processed = {
+                **entry,
+                'summarization': summaries[context_key(context)],
+                'keywords': extract_keywords(entry, top_kws),
+                'test_types_full': [TEST_TYPE_LABELS.get(t, t) for t in entry.get('test_types', [])]
+            }
+            f.write(json.dumps(processed, ensure_ascii=False) + "\n")
+    os.replace(tmp_path, PROCESSED_JSONL)
+
+    n = len(contexts)
+    total_time = time.perf_counter() - start_time
+    logging.info(f"Saved processed data to {PROCESSED_JSONL}")
+    logging.info(
+        f"Keywords: {n} entries in {keywords_time:.2f}s ({n / max(keywords_time, 1e-9):.1f} entries/s); "
+        f"summaries: {generated} generated in {summarize_time:.2f}s "
+        f"({generated / max(summarize_time, 1e-9):.2f} entries/s); "
+        f"total {total_time:.2f}s ({n / max(total_time, 1e-9):.2f} entries/s)"
+    )
 
 if __name__ == "__main__":
-    
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Summarize and extract keywords for the crawled assessments")
+    parser.add_argument("--workers", type=int, default=1, help="Summarizer processes (CPU only)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Entries per task and checkpoint write")
+    parser.add_argument("--batch-size", type=int, default=SUMMARY_BATCH_SIZE, help="Texts per summarizer pass")
+    parser.add_argument("--restart", action="store_true", help=f"Discard {SUMMARIES_JSONL.name} and start over")
+    args = parser.parse_args()
+
+    main(args.workers, args.chunk_size, args.batch_size, args.restart)